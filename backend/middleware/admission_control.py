@@ -0,0 +1,92 @@
+"""
+Admission Control Middleware
+Bounds concurrent registrations and sheds excess load with 503 + Retry-After
+"""
+
+import os
+import asyncio
+from fastapi import Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+from services.metrics_service import metrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+admission_in_flight = metrics.gauge(
+    'pymetra_admission_in_flight',
+    'Admitted requests currently being processed',
+    ['route']
+)
+admission_queued = metrics.gauge(
+    'pymetra_admission_queued',
+    'Requests waiting for an admission slot',
+    ['route']
+)
+admission_admitted_total = metrics.counter(
+    'pymetra_admission_admitted_total',
+    'Requests admitted by admission control',
+    ['route']
+)
+admission_shed_total = metrics.counter(
+    'pymetra_admission_shed_total',
+    'Requests rejected with 503 by admission control',
+    ['route', 'reason']
+)
+
+class AdmissionControlMiddleware(BaseHTTPMiddleware):
+    """Limit concurrent requests on expensive routes, queue a bounded number and shed the rest.
+
+    Rejection happens before the request body is read, so shed uploads are
+    never buffered.
+    """
+    
+    def __init__(self, app, paths=("/api/register-agent",), max_concurrency: int = None,
+                 max_queue: int = None, queue_timeout: float = None, retry_after: int = None):
+        super().__init__(app)
+        self.paths = set(paths)
+        self.max_concurrency = max_concurrency or int(os.getenv('REGISTRATION_MAX_CONCURRENCY', '16'))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('REGISTRATION_MAX_QUEUE', '32'))
+        self.queue_timeout = queue_timeout or float(os.getenv('REGISTRATION_QUEUE_TIMEOUT_SECONDS', '10'))
+        self.retry_after = retry_after or int(os.getenv('REGISTRATION_RETRY_AFTER_SECONDS', '5'))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._queued = 0
+    
+    async def dispatch(self, request: Request, call_next):
+        route = request.url.path
+        if request.method != "POST" or route not in self.paths:
+            return await call_next(request)
+        
+        if self._slots.locked():
+            if self._queued >= self.max_queue:
+                return self._shed(route, "queue_full")
+            
+            self._queued += 1
+            admission_queued.inc(route=route)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                return self._shed(route, "queue_timeout")
+            finally:
+                self._queued -= 1
+                admission_queued.dec(route=route)
+        else:
+            await self._slots.acquire()
+        
+        admission_admitted_total.inc(route=route)
+        admission_in_flight.inc(route=route)
+        try:
+            return await call_next(request)
+        finally:
+            admission_in_flight.dec(route=route)
+            self._slots.release()
+    
+    def _shed(self, route: str, reason: str):
+        """Fast-fail with 503 and Retry-After"""
+        logger.warning(f"AdmissionControl: shedding {route} ({reason}, {self._queued} queued)")
+        admission_shed_total.inc(route=route, reason=reason)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Servicio saturado. Inténtalo de nuevo en unos segundos"},
+            headers={"Retry-After": str(self.retry_after)}
+        )
@@ -0,0 +1,39 @@
+"""
+Request Metrics Middleware
+Counts requests by route and status, tracks latency and in-flight requests
+"""
+
+import time
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
+from fastapi import Request
+from services.metrics_service import http_requests_total, http_request_duration, http_requests_in_flight
+import logging
+
+logger = logging.getLogger(__name__)
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record per-route request metrics, labelled by route template to keep cardinality bounded"""
+    
+    def _route_template(self, request: Request) -> str:
+        for route in request.app.routes:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return getattr(route, 'path', request.url.path)
+        return 'unmatched'
+    
+    async def dispatch(self, request: Request, call_next):
+        method = request.method
+        route = self._route_template(request)
+        status = 500
+        started = time.monotonic()
+        http_requests_in_flight.inc(method=method, route=route)
+        
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            http_requests_in_flight.dec(method=method, route=route)
+            http_request_duration.observe(time.monotonic() - started, method=method, route=route)
+            http_requests_total.inc(method=method, route=route, status=str(status))
@@ -40,15 +40,16 @@ async def migrate_cvs_to_drive():
     logger.info("✅ Google APIs authenticated")
     
     try:
-        # Get all registrations
-        registrations = await db_service.get_all_registrations(limit=1000)
-        logger.info(f"📋 Found {len(registrations)} registrations")
+        logger.info(f"📋 Found {await db_service.get_registrations_count()} registrations")
+        total = 0
         
         migrated_count = 0
         failed_count = 0
         already_in_drive = 0
         
-        for registration in registrations:
+        # Every registration, one keyset page at a time
+        async for registration in db_service.iter_registrations():
+            total += 1
             logger.info(f"🔍 Processing: {registration.full_name} ({registration.email})")
             
             # Skip if already has drive_id
@@ -64,16 +65,13 @@ async def migrate_cvs_to_drive():
                     logger.info(f"  📄 Found local CV: {cv_path}")
                     
                     try:
-                        # Read file content
-                        with open(cv_path, 'rb') as f:
-                            cv_content = f.read()
-                        
-                        # Upload to Google Drive
+                        # Upload to Google Drive straight from disk
                         logger.info(f"  ☁️  Uploading to Google Drive...")
                         drive_result = await google_service.upload_to_drive(
-                            cv_content, 
+                            cv_path, 
                             registration.cv_filename, 
-                            registration.email
+                            registration.email,
+                            registration_id=registration.id
                         )
                         
                         if drive_result:
@@ -105,7 +103,7 @@ async def migrate_cvs_to_drive():
         logger.info(f"✅ Migrated successfully: {migrated_count}")
         logger.info(f"✅ Already in Drive: {already_in_drive}")
         logger.info(f"❌ Failed migrations: {failed_count}")
-        logger.info(f"📊 Total processed: {len(registrations)}")
+        logger.info(f"📊 Total processed: {total}")
         
         return migrated_count > 0
         
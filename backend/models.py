@@ -11,6 +11,9 @@ class AgentRegistration(BaseModel):
     main_sector: str
     cv_filename: Optional[str] = None
     cv_file_path: Optional[str] = None
+    cv_sha256: Optional[str] = None
+    cv_drive_id: Optional[str] = None
+    cv_drive_link: Optional[str] = None
     language: str = "es"
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: str = "pending"
@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, Response
-from fastapi.responses import HTMLResponse, FileResponse
-from services.database_service import DatabaseService
+from fastapi import APIRouter, HTTPException, Request, File, UploadFile, Form, Query
+from fastapi.responses import HTMLResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from services.database_service import DatabaseService, REGISTRATIONS_PAGE_MAX
 from services.export_service import ExportService
+from services.file_service import FileService
+from services.import_service import ImportService, ImportFileError
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
 import logging
 import os
+import asyncio
+import aiofiles
 from datetime import datetime
+from typing import Optional
 
 # Add the backend directory to the path and load env
 sys.path.append(str(Path(__file__).parent.parent))
@@ -21,6 +27,14 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 # Initialize services
 db_service = DatabaseService()
 export_service = ExportService()
+import_service = ImportService(db_service, FileService())
+
+async def _registrations_listing(limit: int, cursor: Optional[str]):
+    """One keyset page of registrations; returns (registrations, next_cursor)"""
+    try:
+        return await db_service.get_registrations_page(limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación no válido")
 
 # Note: Authentication is now handled by AdminAuthMiddleware at application level
 
@@ -35,7 +49,7 @@ async def admin_dashboard():
         # Check Google APIs authentication status
         from services.google_apis_service import GoogleAPIsService
         google_service = GoogleAPIsService()
-        is_google_authenticated = google_service.is_authenticated()
+        is_google_authenticated = await google_service.is_authenticated_async()
         
         auth_status_html = ""
         if is_google_authenticated:
@@ -266,11 +280,9 @@ async def admin_dashboard():
 async def export_csv():
     """Export all registrations to CSV"""
     try:
-        registrations = await db_service.get_all_registrations(limit=1000)
-        csv_content = export_service.export_to_csv(registrations)
-        
-        return Response(
-            content=csv_content,
+        # Streamed page by page, so exports are not bounded by memory
+        return StreamingResponse(
+            export_service.iter_csv(db_service.iter_registrations()),
             media_type="text/csv",
             headers={"Content-Disposition": "attachment; filename=pymetra_registrations.csv"}
         )
@@ -280,14 +292,18 @@ async def export_csv():
         raise HTTPException(status_code=500, detail="Error exporting CSV")
 
 @router.get("/export/google-sheets-data")
-async def export_google_sheets_data():
-    """Get data in format ready for Google Sheets"""
+async def export_google_sheets_data(
+    limit: int = Query(REGISTRATIONS_PAGE_MAX, ge=1, le=REGISTRATIONS_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """Get one page of data in format ready for Google Sheets; follow ``next_cursor`` for the rest"""
     try:
-        registrations = await db_service.get_all_registrations(limit=1000)
+        registrations, next_cursor = await _registrations_listing(limit, cursor)
         sheets_data = export_service.export_to_google_sheets_format(registrations)
         
         return {
             "total_records": len(registrations),
+            "next_cursor": next_cursor,
             "headers": sheets_data[0],
             "data": sheets_data[1:] if len(sheets_data) > 1 else [],
             "instructions": [
@@ -299,10 +315,44 @@ async def export_google_sheets_data():
             ]
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Google Sheets export error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error preparing Google Sheets data")
 
+@router.post("/import-registrations")
+async def import_registrations(
+    rows: UploadFile = File(...),
+    cvs: Optional[UploadFile] = File(None),
+    notify: bool = Form(False)
+):
+    """Bulk import agents from a CSV or NDJSON file plus an optional zip of CVs.
+
+    Rows use the registration field names (full_name, email, geographic_area,
+    main_sector, language, cv_filename); cv_filename refers to a file in the zip.
+    Sheets is updated with one append per batch; notify=true also emails each agent's data.
+    """
+    try:
+        results = await import_service.import_registrations(
+            rows.file,
+            rows.filename or "",
+            cvs.file if cvs else None,
+            notify
+        )
+        
+        from routes.registration import outbox_worker
+        outbox_worker.notify()
+        
+        return results
+        
+    except ImportFileError as e:
+        logger.warning(f"Bulk import rejected: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Archivo de importación no válido: {str(e)}")
+    except Exception as e:
+        logger.error(f"Bulk import error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error importando registros")
+
 @router.get("/test-integrations")
 async def test_integrations():
     """Test all integrations: SMTP, Google APIs, etc."""
@@ -331,9 +381,13 @@ async def test_integrations():
         
         # Test 2: Google APIs authentication
         results["tests"]["google_auth"] = {
-            "authenticated": google_service.is_authenticated()
+            "authenticated": await google_service.is_authenticated_async()
         }
         
+        # Google API executor pool usage
+        from services.google_executor import google_api_executor
+        results["tests"]["google_executor"] = google_api_executor.stats()
+        
         # Test 3: Database connection
         try:
             count = await db_service.get_registrations_count()
@@ -353,9 +407,123 @@ async def test_integrations():
         logger.error(f"Test integrations error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/outbox-status")
+async def outbox_status():
+    """Outbox job counts by integration and status"""
+    try:
+        return {"jobs": await db_service.get_job_counts()}
+    except Exception as e:
+        logger.error(f"Outbox status error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Error obteniendo estado del outbox")
+
+@router.get("/index-status")
+async def index_status():
+    """Build status of the MongoDB indexes provisioned at startup"""
+    from routes.registration import index_manager
+    return index_manager.status()
+
+CV_DOWNLOAD_CHUNK_SIZE = int(os.getenv('CV_DOWNLOAD_CHUNK_SIZE', str(64 * 1024)))
+
+def _parse_byte_range(range_header: Optional[str], size: int):
+    """Resolve a Range header to an inclusive (start, end) pair.
+
+    Returns None when the whole file should be sent (no header, an invalid
+    range-spec such as ``bytes=5-3``, or a form we do not serve such as
+    multiple ranges) and raises 416 when a valid range cannot be satisfied.
+    """
+    if not range_header or not range_header.startswith('bytes=') or ',' in range_header:
+        return None
+    
+    unsatisfiable = HTTPException(
+        status_code=416,
+        detail="Rango no válido",
+        headers={"Content-Range": f"bytes */{size}"}
+    )
+    first, _, last = range_header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                raise unsatisfiable
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    
+    if last and end < start:
+        # Invalid range-spec: the header is ignored (RFC 9110 14.2)
+        return None
+    if start >= size:
+        raise unsatisfiable
+    return start, min(end, size - 1)
+
+def _ranged_response(request: Request, size: int, iter_content, filename: str, background=None):
+    """Stream ``iter_content(start, end)`` honoring the request's Range header"""
+    byte_range = _parse_byte_range(request.headers.get('range'), size)
+    start, end = byte_range or (0, size - 1)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f"attachment; filename={filename}"
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return StreamingResponse(
+        iter_content(start, end) if size else iter(()),
+        status_code=206 if byte_range else 200,
+        media_type='application/octet-stream',
+        headers=headers,
+        background=background
+    )
+
+async def _open_local_file(path: Path):
+    """Open a local file before the response starts, returning (handle, size), or None if it is gone.
+
+    The open handle keeps reading the file even if it is removed meanwhile,
+    e.g. evicted from the Drive cache by a concurrent fill.
+    """
+    try:
+        handle = await aiofiles.open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    return handle, os.fstat(handle.fileno()).st_size
+
+async def _iter_local_file(handle, start: int, end: int):
+    """Read bytes ``start``..``end`` (inclusive) of an open local file in chunks, then close it"""
+    try:
+        await handle.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await handle.read(min(CV_DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await handle.close()
+
+async def _local_file_response(request: Request, opened, filename: str):
+    """Ranged response streaming a file opened by ``_open_local_file``"""
+    handle, size = opened
+    try:
+        return _ranged_response(
+            request,
+            size,
+            lambda start, end: _iter_local_file(handle, start, end),
+            filename,
+            # Also closes the handle when there was nothing to stream
+            background=BackgroundTask(handle.close)
+        )
+    except HTTPException:
+        await handle.close()
+        raise
+
 @router.get("/download-cv/{registration_id}")
-async def download_cv(registration_id: str):
-    """Download CV file by registration ID"""
+async def download_cv(registration_id: str, request: Request):
+    """Download CV file by registration ID, streamed with HTTP Range support"""
     try:
         # Get registration from database
         registration = await db_service.get_registration(registration_id)
@@ -365,25 +533,31 @@ async def download_cv(registration_id: str):
         # Check if CV file exists locally
         if hasattr(registration, 'cv_file_path') and registration.cv_file_path:
             cv_path = Path(registration.cv_file_path)
-            if cv_path.exists():
-                return FileResponse(
-                    path=cv_path,
-                    filename=registration.cv_filename,
-                    media_type='application/octet-stream'
-                )
+            opened = await _open_local_file(cv_path)
+            if opened:
+                return await _local_file_response(request, opened, registration.cv_filename or cv_path.name)
         
-        # If not local, try to download from Google Drive
+        # If not local, serve it from the Drive cache or stream it from Google Drive
         from services.google_apis_service import GoogleAPIsService
+        from services.drive_cache import drive_cv_cache
         google_service = GoogleAPIsService()
         
-        if google_service.is_authenticated() and hasattr(registration, 'cv_drive_id') and registration.cv_drive_id:
-            # Download from Google Drive
-            drive_content = await google_service.download_from_drive(registration.cv_drive_id)
-            if drive_content:
-                return Response(
-                    content=drive_content,
-                    media_type='application/octet-stream',
-                    headers={"Content-Disposition": f"attachment; filename={registration.cv_filename}"}
+        if await google_service.is_authenticated_async() and hasattr(registration, 'cv_drive_id') and registration.cv_drive_id:
+            drive_id = registration.cv_drive_id
+            cached_path = await drive_cv_cache.get(drive_id, google_service)
+            # Evicted before it could be opened: stream from Drive instead
+            opened = await _open_local_file(cached_path) if cached_path else None
+            if opened:
+                return await _local_file_response(request, opened, registration.cv_filename)
+            
+            # Too large for the cache or the fill failed
+            size = await google_service.get_drive_file_size(drive_id)
+            if size is not None:
+                return _ranged_response(
+                    request,
+                    size,
+                    lambda start, end: google_service.iter_drive_content(drive_id, start, end),
+                    registration.cv_filename
                 )
         
         raise HTTPException(status_code=404, detail="CV no encontrado")
@@ -404,17 +578,18 @@ async def migrate_cvs_to_drive():
         google_service = GoogleAPIsService()
         
         # Check authentication
-        if not google_service.is_authenticated():
+        if not await google_service.is_authenticated_async():
             raise HTTPException(status_code=401, detail="Google APIs not authenticated")
         
-        # Get all registrations
-        registrations = await db_service.get_all_registrations(limit=1000)
+        total = 0
         
         migrated_count = 0
         failed_count = 0
         already_in_drive = 0
         
-        for registration in registrations:
+        # Every registration, one keyset page at a time
+        async for registration in db_service.iter_registrations():
+            total += 1
             # Skip if already has drive_id
             if hasattr(registration, 'cv_drive_id') and registration.cv_drive_id:
                 already_in_drive += 1
@@ -425,15 +600,12 @@ async def migrate_cvs_to_drive():
                 cv_path = Path(registration.cv_file_path)
                 if cv_path.exists():
                     try:
-                        # Read file content
-                        with open(cv_path, 'rb') as f:
-                            cv_content = f.read()
-                        
-                        # Upload to Google Drive
+                        # Upload to Google Drive straight from disk
                         drive_result = await google_service.upload_to_drive(
-                            cv_content, 
+                            cv_path, 
                             registration.cv_filename, 
-                            registration.email
+                            registration.email,
+                            registration_id=registration.id
                         )
                         
                         if drive_result:
@@ -459,7 +631,7 @@ async def migrate_cvs_to_drive():
             "migrated": migrated_count,
             "already_in_drive": already_in_drive, 
             "failed": failed_count,
-            "total": len(registrations)
+            "total": total
         }
         
     except HTTPException:
@@ -509,49 +681,60 @@ async def get_cv_info(registration_id: str):
         raise HTTPException(status_code=500, detail="Error obteniendo información CV")
 
 @router.get("/list-cvs")
-async def list_all_cvs():
-    """List all CVs with download information"""
+async def list_all_cvs(
+    limit: int = Query(REGISTRATIONS_PAGE_MAX, ge=1, le=REGISTRATIONS_PAGE_MAX),
+    cursor: Optional[str] = None
+):
+    """List CVs with download information, one page of registrations at a time; follow ``next_cursor`` for the rest"""
     try:
-        registrations = await db_service.get_all_registrations(limit=1000)
-        
-        cvs_info = []
-        for reg in registrations:
-            cv_info = {
-                "registration_id": reg.id,
-                "filename": reg.cv_filename,
-                "user_name": reg.full_name,
-                "user_email": reg.email,
-                "timestamp": reg.timestamp.strftime('%d/%m/%Y %H:%M'),
-                "has_local_file": False,
-                "has_drive_file": False,
-                "local_path": None,
-                "drive_link": None
-            }
-            
-            # Check local file
-            if hasattr(reg, 'cv_file_path') and reg.cv_file_path:
-                cv_path = Path(reg.cv_file_path)
-                if cv_path.exists():
-                    cv_info["has_local_file"] = True
-                    cv_info["local_path"] = str(cv_path)
-            
-            # Check drive file
-            if hasattr(reg, 'cv_drive_link') and reg.cv_drive_link:
-                cv_info["has_drive_file"] = True
-                cv_info["drive_link"] = reg.cv_drive_link
-            
-            if cv_info["filename"]:  # Only include if has CV
-                cvs_info.append(cv_info)
+        registrations, next_cursor = await _registrations_listing(limit, cursor)
+        # Checking every local file is blocking disk I/O
+        cvs_info = await asyncio.to_thread(_cv_listing, registrations)
         
         return {
             "total_cvs": len(cvs_info),
+            "next_cursor": next_cursor,
             "cvs": cvs_info
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"List CVs error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error listando CVs")
 
+def _cv_listing(registrations) -> list:
+    """Download information of the registrations that have a CV"""
+    cvs_info = []
+    for reg in registrations:
+        cv_info = {
+            "registration_id": reg.id,
+            "filename": reg.cv_filename,
+            "user_name": reg.full_name,
+            "user_email": reg.email,
+            "timestamp": reg.timestamp.strftime('%d/%m/%Y %H:%M'),
+            "has_local_file": False,
+            "has_drive_file": False,
+            "local_path": None,
+            "drive_link": None
+        }
+        
+        # Check local file
+        if hasattr(reg, 'cv_file_path') and reg.cv_file_path:
+            cv_path = Path(reg.cv_file_path)
+            if cv_path.exists():
+                cv_info["has_local_file"] = True
+                cv_info["local_path"] = str(cv_path)
+        
+        # Check drive file
+        if hasattr(reg, 'cv_drive_link') and reg.cv_drive_link:
+            cv_info["has_drive_file"] = True
+            cv_info["drive_link"] = reg.cv_drive_link
+        
+        if cv_info["filename"]:  # Only include if has CV
+            cvs_info.append(cv_info)
+    return cvs_info
+
 @router.post("/execute-migration")
 async def execute_migration():
     """Execute actual CV migration to Google Drive"""
@@ -563,15 +746,14 @@ async def execute_migration():
         google_service = GoogleAPIsService()
         
         # Check authentication
-        if not google_service.is_authenticated():
+        if not await google_service.is_authenticated_async():
             return {
                 "success": False,
                 "error": "Google APIs not authenticated",
                 "solution": "Visit /api/auth/google/login to authenticate"
             }
         
-        # Get all registrations
-        registrations = await db_service.get_all_registrations(limit=1000)
+        total = 0
         
         migrated_count = 0
         already_in_drive = 0
@@ -579,7 +761,9 @@ async def execute_migration():
         errors = 0
         error_details = []
         
-        for registration in registrations:
+        # Every registration, one keyset page at a time
+        async for registration in db_service.iter_registrations():
+            total += 1
             try:
                 # Skip if already migrated
                 if hasattr(registration, 'cv_drive_id') and registration.cv_drive_id:
@@ -596,14 +780,12 @@ async def execute_migration():
                     no_local_file += 1
                     continue
                 
-                # Read and upload file
-                with open(cv_path, 'rb') as f:
-                    cv_content = f.read()
-                
+                # Upload file in place
                 drive_result = await google_service.upload_to_drive(
-                    cv_content,
+                    cv_path,
                     registration.cv_filename or cv_path.name,
-                    registration.email
+                    registration.email,
+                    registration_id=registration.id
                 )
                 
                 if drive_result:
@@ -629,7 +811,7 @@ async def execute_migration():
                 "already_in_drive": already_in_drive,
                 "no_local_file": no_local_file,
                 "errors": errors,
-                "total_processed": len(registrations),
+                "total_processed": total,
                 "error_details": error_details[:5]  # First 5 errors
             },
             "message": f"Migration completed: {migrated_count} CVs migrated to Google Drive"
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
 from services.oauth_service import OAuthService
+from services.google_executor import google_api_executor
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
@@ -152,7 +153,7 @@ async def google_callback(
 async def auth_status():
     """Check authentication status"""
     try:
-        is_authenticated = oauth_service.is_authenticated()
+        is_authenticated = await google_api_executor.run(oauth_service.is_authenticated, label='auth')
         
         return {
             "authenticated": is_authenticated,
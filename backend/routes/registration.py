@@ -1,6 +1,10 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException, BackgroundTasks
+from fastapi import APIRouter, File, UploadFile, Form, Header, HTTPException, BackgroundTasks, Query
 from pydantic import EmailStr
+from typing import Optional
+import os
 import sys
+import hashlib
+from datetime import datetime, timedelta
 from pathlib import Path
 from dotenv import load_dotenv
 import asyncio
@@ -12,20 +16,53 @@ ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
 from models import AgentRegistration, AgentRegistrationResponse
-from services.database_service import DatabaseService
-from services.file_service import FileService
+from services.database_service import DatabaseService, REGISTRATIONS_PAGE_MAX
+from services.file_service import FileService, FileTooLargeError, InvalidFileContentError, MAX_CV_SIZE
 from services.email_service import EmailService
 from services.google_apis_service import GoogleAPIsService
+from services.outbox_service import OutboxWorker, REGISTRATION_JOB_TYPES, REGISTRATION_JOB_DEPENDENCIES
+from services.index_manager import IndexManager
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["registration"])
 
+# How long a submission is remembered for replaying retries and double-clicks
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+
+# An in-progress submission older than this is considered abandoned and may be retried
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', '120'))
+
+def idempotency_key_for(email: str, client_key: Optional[str] = None, cv_sha256: Optional[str] = None) -> str:
+    """Key a submission by the client's Idempotency-Key, or by email plus CV hash"""
+    if client_key:
+        material = f"client:{email.lower()}:{client_key}"
+    else:
+        material = f"content:{email.lower()}:{cv_sha256}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def reservation_abandoned(record: dict) -> bool:
+    """Whether an in-progress record outlived its lease (its request died)"""
+    return (record.get("status") == "in_progress" and record.get("created_at") is not None
+            and record["created_at"] < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS))
+
+def replay_submission(record: dict) -> AgentRegistrationResponse:
+    """Return the original response of a repeated submission"""
+    if record.get("status") == "completed" and record.get("response"):
+        logger.info(f"Idempotent replay of registration {record['response']['registration_id']}")
+        return AgentRegistrationResponse(**record["response"])
+    raise HTTPException(
+        status_code=409,
+        detail="Este registro ya se está procesando"
+    )
+
 # Initialize services
 db_service = DatabaseService()
 file_service = FileService()
 email_service = EmailService()
 google_service = GoogleAPIsService()
+outbox_worker = OutboxWorker(db_service, google_service, email_service)
+index_manager = IndexManager(db_service, IDEMPOTENCY_TTL_SECONDS)
 
 @router.post("/register-agent", response_model=AgentRegistrationResponse)
 async def register_agent(
@@ -35,13 +72,21 @@ async def register_agent(
     geographicArea: str = Form(...),
     mainSector: str = Form(...),
     language: str = Form(default="es"),
-    cv: UploadFile = File(...)
+    cv: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(default=None)
 ):
     logger.info(f"=== REGISTRATION START ===")
     logger.info(f"User: {fullName} ({email})")
     logger.info(f"File: {cv.filename} ({cv.content_type})")
     
+    reserved_key = None
     try:
+        # A client-supplied key can be answered before reading the upload
+        if idempotency_key:
+            record = await db_service.get_idempotency_record(idempotency_key_for(email, client_key=idempotency_key))
+            if record and not reservation_abandoned(record):
+                return replay_submission(record)
+        
         # Validate file type
         allowed_types = [
             'application/pdf',
@@ -56,16 +101,31 @@ async def register_agent(
                 detail="Tipo de archivo no válido. Solo se permiten PDF, DOC, DOCX"
             )
             
-        # Validate file size (5MB limit)
-        cv_content = await cv.read()
-        logger.info(f"CV size: {len(cv_content)} bytes")
-        
-        if len(cv_content) > 5 * 1024 * 1024:
-            logger.error(f"File too large: {len(cv_content)} bytes")
+        # Stream the CV to disk, aborting as soon as it crosses the 5MB limit
+        try:
+            stored_cv = await file_service.save_cv_upload(cv, email, MAX_CV_SIZE)
+        except FileTooLargeError as size_error:
+            logger.error(f"File too large: {str(size_error)}")
             raise HTTPException(
                 status_code=400,
                 detail="El archivo es demasiado grande. Máximo 5MB"
             )
+        except InvalidFileContentError as content_error:
+            logger.error(f"Invalid file content: {str(content_error)}")
+            raise HTTPException(
+                status_code=400,
+                detail="Tipo de archivo no válido. Solo se permiten PDF, DOC, DOCX"
+            )
+        cv_file_path = stored_cv["path"]
+        logger.info(f"CV saved locally: {cv_file_path} ({stored_cv['size']} bytes)")
+        
+        # Reserve the submission; repeats get the original response
+        key = idempotency_key_for(email, client_key=idempotency_key, cv_sha256=stored_cv["sha256"])
+        record = await db_service.reserve_idempotency_key(key, IDEMPOTENCY_LEASE_SECONDS)
+        if record:
+            os.remove(cv_file_path)
+            return replay_submission(record)
+        reserved_key = key
         
         # Create registration object
         registration = AgentRegistration(
@@ -74,99 +134,38 @@ async def register_agent(
             geographic_area=geographicArea,
             main_sector=mainSector,
             language=language,
-            cv_filename=cv.filename
+            cv_filename=cv.filename,
+            cv_file_path=cv_file_path,
+            cv_sha256=stored_cv["sha256"]
         )
         logger.info(f"Registration object created: {registration.id}")
         
-        # Save CV file locally
-        cv_file_path = await file_service.save_cv_file(cv_content, cv.filename, email)
-        logger.info(f"CV saved locally: {cv_file_path}")
-        
-        if cv_file_path:
-            registration.cv_file_path = cv_file_path
-        
-        # Save to database
-        registration_id = await db_service.save_registration(registration)
-        logger.info(f"Saved to MongoDB: {registration_id}")
-        
-        # Initialize result tracking
-        google_sheets_saved = False
-        google_drive_uploaded = False
-        google_email_sent = False
-        smtp_email_sent = False
-        
-        # Check Google APIs authentication
-        is_google_authenticated = google_service.is_authenticated()
-        logger.info(f"Google APIs authenticated: {is_google_authenticated}")
-        
-        if is_google_authenticated:
-            logger.info("=== STARTING GOOGLE APIS INTEGRATION ===")
-            
-            try:
-                # Test 1: Save to Google Sheets
-                logger.info("Attempting Google Sheets save...")
-                google_sheets_saved = await google_service.save_to_sheets(registration)
-                logger.info(f"Google Sheets result: {google_sheets_saved}")
-                
-                # Test 2: Upload CV to Google Drive
-                logger.info("Attempting Google Drive upload...")
-                drive_result = await google_service.upload_to_drive(cv_content, cv.filename, email)
-                google_drive_uploaded = drive_result is not None
-                logger.info(f"Google Drive result: {drive_result}")
-                
-                # Test 3: Send Gmail notification
-                logger.info("Attempting Gmail API notification...")
-                google_email_sent = await google_service.send_gmail_notification(registration, drive_result)
-                logger.info(f"Gmail API result: {google_email_sent}")
-                
-                logger.info("=== GOOGLE APIS INTEGRATION COMPLETE ===")
-                
-            except Exception as google_error:
-                logger.error(f"=== GOOGLE APIs ERROR ===")
-                logger.error(f"Error type: {type(google_error).__name__}")
-                logger.error(f"Error message: {str(google_error)}")
-                logger.error(f"Error details: {repr(google_error)}")
-        else:
-            logger.warning("Google APIs not authenticated - skipping Google integration")
-        
-        # ALWAYS attempt SMTP email as backup
-        logger.info("=== STARTING SMTP EMAIL BACKUP ===")
-        try:
-            # Send email synchronously for debugging
-            smtp_result = await email_service.send_registration_notification(registration, cv_file_path)
-            smtp_email_sent = smtp_result
-            logger.info(f"SMTP email result: {smtp_email_sent}")
-        except Exception as smtp_error:
-            logger.error(f"=== SMTP EMAIL ERROR ===")
-            logger.error(f"SMTP Error type: {type(smtp_error).__name__}")
-            logger.error(f"SMTP Error message: {str(smtp_error)}")
-            logger.error(f"SMTP Error details: {repr(smtp_error)}")
+        # Save registration plus one outbox job per integration; the outbox
+        # worker runs Sheets, Drive, Gmail and SMTP in the background
+        registration_id = await db_service.save_registration_with_jobs(
+            registration,
+            REGISTRATION_JOB_TYPES,
+            REGISTRATION_JOB_DEPENDENCIES
+        )
+        logger.info(f"Saved to MongoDB with outbox jobs: {registration_id}")
+        outbox_worker.notify()
         
-        # Final status
         logger.info("=== REGISTRATION COMPLETE ===")
-        logger.info(f"Google Sheets: {google_sheets_saved}")
-        logger.info(f"Google Drive: {google_drive_uploaded}")
-        logger.info(f"Gmail API: {google_email_sent}")
-        logger.info(f"SMTP Email: {smtp_email_sent}")
-        
-        # Determine message
-        if google_sheets_saved and google_drive_uploaded:
-            message = "Registro completado - Datos en Google Sheets y Drive"
-        elif smtp_email_sent:
-            message = "Registro completado - Revisa tu email para los datos"
-        else:
-            message = "Registro completado - Datos guardados localmente"
         
-        return AgentRegistrationResponse(
-            message=message,
+        response = AgentRegistrationResponse(
+            message="Registro completado - Procesando notificaciones",
             registration_id=registration_id,
-            email_sent=google_email_sent or smtp_email_sent,
-            cv_saved=google_drive_uploaded or (cv_file_path is not None)
+            email_sent=False,
+            cv_saved=cv_file_path is not None
         )
+        await db_service.complete_idempotency_key(reserved_key, response.dict())
+        return response
         
     except HTTPException:
         raise
     except Exception as e:
+        if reserved_key:
+            await db_service.release_idempotency_key(reserved_key)
         logger.error(f"=== CRITICAL REGISTRATION ERROR ===")
         logger.error(f"Error: {str(e)}")
         logger.error(f"Type: {type(e).__name__}")
@@ -179,6 +178,10 @@ async def get_registrations_count():
     return {"total_registrations": count}
 
 @router.get("/registrations")
-async def get_registrations(limit: int = 50):
-    registrations = await db_service.get_all_registrations(limit)
-    return {"registrations": registrations}
\ No newline at end of file
+async def get_registrations(limit: int = Query(50, ge=1, le=REGISTRATIONS_PAGE_MAX), cursor: Optional[str] = None):
+    """Registrations newest first; pass ``next_cursor`` back as ``cursor`` for the next page"""
+    try:
+        registrations, next_cursor = await db_service.get_registrations_page(limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Cursor de paginación no válido")
+    return {"registrations": registrations, "next_cursor": next_cursor}
\ No newline at end of file
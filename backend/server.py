@@ -1,21 +1,56 @@
 from fastapi import FastAPI, APIRouter
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from starlette.middleware.trustedhost import TrustedHostMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from contextlib import asynccontextmanager
 import os
 import logging
 from pathlib import Path
-from routes.registration import router as registration_router
+from routes.registration import router as registration_router, outbox_worker, db_service, email_service, index_manager
 from routes.admin import router as admin_router
 from routes.auth import router as auth_router
 from middleware.admin_auth import AdminAuthMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.admission_control import AdmissionControlMiddleware
+from services.metrics_service import metrics
+from services.google_executor import google_api_executor
+from services.google_http_pool import google_http_pool
+from services.oauth_service import OAuthService
+from services.token_refresher import TokenRefresher
+from services.digest_service import DigestScheduler
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+token_refresher = TokenRefresher(OAuthService())
+digest_scheduler = DigestScheduler(db_service, outbox_worker)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build missing MongoDB indexes in the background; status at /admin/index-status
+    await index_manager.start()
+    
+    # Keep the Google access token fresh ahead of expiry
+    await token_refresher.start()
+    
+    # Drain registration side effects (Sheets, Drive, Gmail, SMTP) in the background
+    await outbox_worker.start()
+    
+    # Close notification digest windows (NOTIFICATION_MODE=digest only)
+    await digest_scheduler.start()
+    yield
+    await index_manager.stop()
+    await digest_scheduler.stop()
+    await outbox_worker.stop()
+    await token_refresher.stop()
+    email_service.close()
+    google_api_executor.shutdown()
+    google_http_pool.close()
+
 # Create the main app
-app = FastAPI(title="Pymetra Registration API", version="1.0.0")
+app = FastAPI(title="Pymetra Registration API", version="1.0.0", lifespan=lifespan)
 
 # Add custom admin authentication middleware (before other middleware)
 app.add_middleware(AdminAuthMiddleware)
@@ -23,6 +58,12 @@ app.add_middleware(AdminAuthMiddleware)
 # Trust proxy headers (for proper authentication behind proxy/ingress)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
+# Bound concurrent registrations; shed bursts with 503 + Retry-After
+app.add_middleware(AdmissionControlMiddleware)
+
+# Request counts, latency and in-flight gauges per route
+app.add_middleware(MetricsMiddleware)
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -42,6 +83,11 @@ app.include_router(auth_router)
 async def health_check():
     return {"status": "healthy", "service": "Pymetra Registration API"}
 
+# Prometheus scrape endpoint
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
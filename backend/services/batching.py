@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class BatchCoalescer:
+    """Coalesces items submitted by concurrent callers into batched calls.
+
+    A batch is flushed when it reaches ``max_items`` or when its oldest item
+    has waited ``max_delay`` seconds. ``flush_fn`` receives the items and
+    returns one result per item (or raises, failing the whole batch); each
+    ``submit`` call resolves with its own item's result. Cancelling ``submit``
+    withdraws the item if its batch has not started flushing, so a caller
+    that gives up (e.g. on a deadline) and retries does not write it twice.
+    """
+    
+    def __init__(self, name: str, flush_fn: Callable[[List], Awaitable[List]], max_items: int, max_delay: float):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._pending = []
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        self._flushes = set()
+    
+    async def submit(self, item):
+        """Queue ``item`` and wait for the result of the batch it lands in"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((item, future))
+        
+        if len(self._pending) >= self.max_items:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_after_delay())
+        
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._withdraw(future)
+            raise
+    
+    def _withdraw(self, future):
+        """Drop a cancelled caller's item unless its batch is already being flushed"""
+        for index, (_, pending_future) in enumerate(self._pending):
+            if pending_future is future:
+                del self._pending[index]
+                break
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+    
+    def flush(self):
+        """Flush pending items now instead of waiting for the batch to fill"""
+        if self._pending:
+            self._start_flush()
+    
+    async def close(self):
+        """Flush whatever is pending and wait for in-progress flushes"""
+        while self._pending or self._flushes:
+            self.flush()
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+    
+    async def _flush_after_delay(self):
+        await asyncio.sleep(self.max_delay)
+        self._timer = None
+        if self._pending:
+            self._start_flush()
+    
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        task = asyncio.create_task(self._flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+    
+    async def _flush(self):
+        # One flush at a time keeps batches in submission order. The batch is
+        # taken once the previous flush is done, so items queued meanwhile
+        # (a burst) go out together instead of as many small batches
+        async with self._flush_lock:
+            batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+            if not batch:
+                return
+            if self._pending and self._timer is None:
+                self._timer = asyncio.create_task(self._flush_after_delay())
+            
+            started = time.monotonic()
+            try:
+                results = await self.flush_fn([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+                logger.info(f"{self.name}: flushed {len(batch)} items in {(time.monotonic() - started) * 1000:.0f}ms")
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(batch)} items failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
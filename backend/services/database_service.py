@@ -12,11 +12,44 @@ ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
 
 from models import AgentRegistration
-from typing import List, Optional
+from services.metrics_service import timed_stage
+from typing import AsyncIterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import uuid
+import json
+import base64
+import binascii
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Outbox jobs stored on a registration until they are copied to registration_jobs
+EMBEDDED_JOBS_FIELD = "pending_outbox_jobs"
+
+# Newest first; id breaks ties between registrations with the same timestamp
+REGISTRATION_ORDER = [("timestamp", -1), ("id", -1)]
+
+# Largest page a listing endpoint may ask for
+REGISTRATIONS_PAGE_MAX = int(os.environ.get('REGISTRATIONS_PAGE_MAX', '500'))
+
+
+def encode_registration_cursor(registration: AgentRegistration) -> str:
+    """Opaque continuation token pointing just after ``registration``"""
+    position = {"t": registration.timestamp.isoformat(), "i": registration.id}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_registration_cursor(cursor: str) -> Tuple[datetime, str]:
+    """(timestamp, id) of a continuation token; raises ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+        return datetime.fromisoformat(position["t"]), str(position["i"])
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise ValueError("Invalid registration cursor")
+
 class DatabaseService:
     def __init__(self):
         # Use os.environ.get() with fallbacks to prevent KeyError crashes
@@ -42,7 +75,397 @@ class DatabaseService:
         except Exception as e:
             logger.error(f"Failed to save registration: {str(e)}")
             raise
+    
+    def _new_job(self, job_type: str, status: str = "pending", registration_id: Optional[str] = None,
+                 depends_on: Optional[str] = None, registration_ids: Optional[List[str]] = None) -> dict:
+        now = datetime.utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "registration_id": registration_id,
+            "type": job_type,
+            "status": status,
+            "depends_on": depends_on,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "lease_expires_at": None,
+            "last_error": None,
+            "result": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        if registration_ids is not None:
+            job["registration_ids"] = registration_ids
+        return job
+    
+    def _registration_jobs(self, registration_id: str, job_types: List[str], blocked_by: dict) -> List[dict]:
+        return [self._new_job(
+            job_type,
+            status="blocked" if job_type in blocked_by and blocked_by[job_type] in job_types else "pending",
+            registration_id=registration_id,
+            depends_on=blocked_by.get(job_type)
+        ) for job_type in job_types]
+    
+    @timed_stage('mongo_insert')
+    async def save_registration_with_jobs(self, registration: AgentRegistration, job_types: List[str],
+                                          blocked_by: Optional[dict] = None) -> str:
+        """Save a registration together with one pending outbox job per integration.
+
+        ``blocked_by`` maps a job type to the job type it waits for (e.g. gmail
+        waits for drive); those jobs are created as ``blocked`` and released by
+        ``release_blocked_jobs`` once their dependency settles.
+
+        The jobs are embedded in the registration document, so one atomic
+        insert records both, then copied to ``registration_jobs``. If the copy
+        fails the registration is still saved and ``enqueue_embedded_jobs``
+        creates its jobs later.
+        """
+        jobs = self._registration_jobs(registration.id, job_types, blocked_by or {})
+        doc = registration.dict()
+        doc[EMBEDDED_JOBS_FIELD] = jobs
+        
+        try:
+            await self.db.agent_registrations.insert_one(doc)
+        except Exception as e:
+            logger.error(f"Failed to save registration with jobs: {str(e)}")
+            raise
+        
+        enqueued = await self._enqueue_jobs_of(registration.id, jobs)
+        logger.info(f"Registration saved with ID: {registration.id} "
+                    f"({len(jobs)} outbox jobs{'' if enqueued else ', left for recovery'})")
+        return registration.id
+    
+    async def _enqueue_jobs_of(self, registration_id: str, jobs: List[dict]) -> bool:
+        """Copy a registration's embedded jobs to the outbox, skipping ones already there"""
+        return await self._enqueue_embedded([registration_id], jobs)
+    
+    async def _enqueue_embedded(self, registration_ids: List[str], jobs: List[dict]) -> bool:
+        """Copy jobs embedded in ``registration_ids`` to the outbox (once per job id) and
+        drop them from the registrations"""
+        try:
+            if jobs:
+                existing = set(await self.db.registration_jobs.distinct(
+                    "id", {"id": {"$in": [job["id"] for job in jobs]}}
+                ))
+                missing = list({job["id"]: dict(job) for job in jobs if job["id"] not in existing}.values())
+                if missing:
+                    await self.db.registration_jobs.insert_many(missing)
+            await self.db.agent_registrations.update_many(
+                {"id": {"$in": registration_ids}},
+                {"$unset": {EMBEDDED_JOBS_FIELD: ""}}
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Failed to enqueue outbox jobs of {len(registration_ids)} registrations: {str(e)}")
+            return False
+    
+    async def enqueue_embedded_jobs(self, older_than_seconds: float) -> int:
+        """Create the outbox jobs of registrations saved more than ``older_than_seconds``
+        ago whose jobs never reached the outbox; returns how many registrations were recovered"""
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+        recovered = 0
+        cursor = self.db.agent_registrations.find(
+            {EMBEDDED_JOBS_FIELD: {"$exists": True}, "timestamp": {"$lt": cutoff}},
+            {"id": 1, EMBEDDED_JOBS_FIELD: 1}
+        )
+        async for doc in cursor:
+            if await self._enqueue_jobs_of(doc["id"], doc[EMBEDDED_JOBS_FIELD]):
+                recovered += 1
+        return recovered
+    
+    @timed_stage('mongo_bulk_insert')
+    async def save_registrations_bulk(self, registrations: List[AgentRegistration], job_types: List[str],
+                                      batch_job_types: List[str], blocked_by: Optional[dict] = None) -> List[Optional[str]]:
+        """Insert many registrations at once with their outbox jobs.
+
+        ``job_types`` get one job per saved registration, ``batch_job_types``
+        one job covering all of them (e.g. a single Sheets append). Returns the
+        insert error for each registration, None when it was saved; a failed
+        batch is reported per registration instead of raising.
+
+        As in ``save_registration_with_jobs`` the jobs are embedded in the
+        registration documents, so a registration is never saved without them
+        and ``enqueue_embedded_jobs`` recovers jobs whose copy failed. Every
+        document carries the batch jobs under the same ids; they reach the
+        outbox once, from whichever registration is enqueued first.
+        """
+        errors = [None] * len(registrations)
+        if not registrations:
+            return errors
+        
+        blocked_by = blocked_by or {}
+        registration_ids = [registration.id for registration in registrations]
+        batch_jobs = [self._new_job(job_type, registration_ids=registration_ids) for job_type in batch_job_types]
+        jobs_by_registration = {}
+        docs = []
+        for registration in registrations:
+            jobs_by_registration[registration.id] = self._registration_jobs(registration.id, job_types, blocked_by)
+            doc = registration.dict()
+            doc[EMBEDDED_JOBS_FIELD] = jobs_by_registration[registration.id] + batch_jobs
+            docs.append(doc)
+        
+        try:
+            await self.db.agent_registrations.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                errors[write_error["index"]] = write_error.get("errmsg", "write error")
+        except Exception as e:
+            logger.error(f"Bulk registration insert failed: {str(e)}")
+            errors = await self._unsaved_errors(registration_ids, str(e))
+        
+        saved_ids = [registration_id for registration_id, error in zip(registration_ids, errors) if error is None]
+        if not saved_ids:
+            return errors
+        
+        jobs = [job for registration_id in saved_ids for job in jobs_by_registration[registration_id]]
+        jobs += [dict(job, registration_ids=saved_ids) for job in batch_jobs]
+        enqueued = await self._enqueue_embedded(saved_ids, jobs)
+        logger.info(f"Bulk saved {len(saved_ids)}/{len(registrations)} registrations "
+                    f"({len(jobs)} outbox jobs{'' if enqueued else ', left for recovery'})")
+        return errors
+    
+    async def _unsaved_errors(self, registration_ids: List[str], error: str) -> List[Optional[str]]:
+        """``error`` for each registration that is not in the database after an interrupted insert"""
+        try:
+            saved = set(await self.db.agent_registrations.distinct("id", {"id": {"$in": registration_ids}}))
+        except Exception as e:
+            logger.error(f"Could not check which registrations were saved: {str(e)}")
+            saved = set()
+        return [None if registration_id in saved else error for registration_id in registration_ids]
+    
+    async def claim_next_job(self, lease_seconds: int, exclude_types: Optional[List[str]] = None) -> Optional[dict]:
+        """Atomically claim the oldest runnable outbox job (or one whose lease expired)"""
+        now = datetime.utcnow()
+        query = {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "running", "lease_expires_at": {"$lt": now}}
+        ]}
+        if exclude_types:
+            query["type"] = {"$nin": exclude_types}
+        try:
+            return await self.db.registration_jobs.find_one_and_update(
+                query,
+                {
+                    "$set": {
+                        "status": "running",
+                        "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                        "updated_at": now
+                    },
+                    "$inc": {"attempts": 1}
+                },
+                sort=[("next_attempt_at", 1)],
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.error(f"Failed to claim outbox job: {str(e)}")
+            return None
+    
+    async def claim_registration_jobs(self, registration_id: str, lease_seconds: int,
+                                      claimed_types: List[str], exclude_types: Optional[List[str]] = None) -> List[dict]:
+        """Claim the remaining runnable jobs of a registration, plus blocked jobs
+        whose dependency is among ``claimed_types``, so they run as one fan-out"""
+        now = datetime.utcnow()
+        claimed = []
+        query = {"registration_id": registration_id, "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "blocked", "depends_on": {"$in": claimed_types}}
+        ]}
+        if exclude_types:
+            query["type"] = {"$nin": exclude_types}
+        try:
+            async for candidate in self.db.registration_jobs.find(query, {"id": 1, "status": 1}):
+                job = await self.db.registration_jobs.find_one_and_update(
+                    {"id": candidate["id"], "status": candidate["status"]},
+                    {
+                        "$set": {
+                            "status": "running",
+                            "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                            "updated_at": now
+                        },
+                        "$inc": {"attempts": 1}
+                    },
+                    return_document=ReturnDocument.AFTER
+                )
+                if job:
+                    claimed.append(job)
+        except Exception as e:
+            logger.error(f"Failed to claim registration jobs: {str(e)}")
+        return claimed
+    
+    async def claim_jobs(self, job_type: str, limit: int, lease_seconds: int) -> List[dict]:
+        """Claim up to ``limit`` runnable jobs of one type, oldest first, to settle with one batched call"""
+        now = datetime.utcnow()
+        runnable = {"type": job_type, "$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "running", "lease_expires_at": {"$lt": now}}
+        ]}
+        claim_id = str(uuid.uuid4())
+        try:
+            candidates = self.db.registration_jobs.find(runnable, {"id": 1}).sort("next_attempt_at", 1).limit(limit)
+            job_ids = [candidate["id"] async for candidate in candidates]
+            if not job_ids:
+                return []
+            # The runnable filter is re-checked per document, so jobs claimed
+            # elsewhere in the meantime are left out
+            await self.db.registration_jobs.update_many(
+                {**runnable, "id": {"$in": job_ids}},
+                {
+                    "$set": {
+                        "status": "running",
+                        "lease_expires_at": now + timedelta(seconds=lease_seconds),
+                        "claim_id": claim_id,
+                        "updated_at": now
+                    },
+                    "$inc": {"attempts": 1}
+                }
+            )
+            return await self.db.registration_jobs.find({"claim_id": claim_id}).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Failed to claim {job_type} jobs: {str(e)}")
+            return []
+    
+    async def complete_job(self, job_id: str, result: Optional[dict] = None, elapsed_ms: Optional[int] = None):
+        """Mark an outbox job as done"""
+        await self.db.registration_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "status": "done",
+                "result": result,
+                "last_error": None,
+                "last_elapsed_ms": elapsed_ms,
+                "lease_expires_at": None,
+                "updated_at": datetime.utcnow()
+            }}
+        )
+    
+    async def fail_job(self, job_id: str, error: str, retry_at: Optional[datetime] = None,
+                       elapsed_ms: Optional[int] = None):
+        """Record a failed attempt; reschedule it if ``retry_at`` is given, otherwise give up"""
+        update = {
+            "status": "pending" if retry_at else "failed",
+            "last_error": error,
+            "last_elapsed_ms": elapsed_ms,
+            "lease_expires_at": None,
+            "updated_at": datetime.utcnow()
+        }
+        if retry_at:
+            update["next_attempt_at"] = retry_at
+        await self.db.registration_jobs.update_one({"id": job_id}, {"$set": update})
+    
+    async def reblock_job(self, job_id: str):
+        """Return a claimed job to ``blocked`` without counting the attempt"""
+        await self.db.registration_jobs.update_one(
+            {"id": job_id},
+            {
+                "$set": {"status": "blocked", "lease_expires_at": None, "updated_at": datetime.utcnow()},
+                "$inc": {"attempts": -1}
+            }
+        )
+    
+    async def release_blocked_jobs(self, registration_id: str, depends_on: str) -> int:
+        """Make jobs waiting on ``depends_on`` runnable"""
+        now = datetime.utcnow()
+        result = await self.db.registration_jobs.update_many(
+            {"registration_id": registration_id, "status": "blocked", "depends_on": depends_on},
+            {"$set": {"status": "pending", "next_attempt_at": now, "updated_at": now}}
+        )
+        return result.modified_count
+    
+    async def get_job_counts(self) -> dict:
+        """Count outbox jobs grouped by type and status"""
+        try:
+            counts = {}
+            cursor = self.db.registration_jobs.aggregate([
+                {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+            ])
+            async for doc in cursor:
+                counts.setdefault(doc["_id"]["type"], {})[doc["_id"]["status"]] = doc["count"]
+            return counts
+        except Exception as e:
+            logger.error(f"Failed to count outbox jobs: {str(e)}")
+            return {}
             
+    async def create_digest_job(self, entry_type: str, digest_type: str) -> Optional[dict]:
+        """Gather settled ``entry_type`` jobs not yet in a digest into one new
+        ``digest_type`` batch job; returns it, or None if there was nothing to send"""
+        job = self._new_job(digest_type, registration_ids=[])
+        stamped = await self.db.registration_jobs.update_many(
+            {"type": entry_type, "status": "done", "digest_job_id": None},
+            {"$set": {"digest_job_id": job["id"], "updated_at": job["created_at"]}}
+        )
+        if not stamped.modified_count:
+            return None
+        
+        job["registration_ids"] = await self.db.registration_jobs.distinct(
+            "registration_id", {"type": entry_type, "digest_job_id": job["id"]}
+        )
+        await self.db.registration_jobs.insert_one(job)
+        logger.info(f"Digest job {job['id']} created for {len(job['registration_ids'])} registrations")
+        return job
+    
+    async def release_orphaned_digest_entries(self, entry_type: str) -> int:
+        """Unassign entries stamped by a create_digest_job that never inserted its job"""
+        digest_ids = await self.db.registration_jobs.distinct(
+            "digest_job_id", {"type": entry_type, "digest_job_id": {"$ne": None}}
+        )
+        existing = set(await self.db.registration_jobs.distinct("id", {"id": {"$in": digest_ids}}))
+        orphaned = [digest_id for digest_id in digest_ids if digest_id not in existing]
+        if not orphaned:
+            return 0
+        result = await self.db.registration_jobs.update_many(
+            {"type": entry_type, "digest_job_id": {"$in": orphaned}},
+            {"$set": {"digest_job_id": None, "updated_at": datetime.utcnow()}}
+        )
+        return result.modified_count
+    
+    async def get_latest_job(self, job_type: str) -> Optional[dict]:
+        """Most recently created outbox job of a type"""
+        return await self.db.registration_jobs.find_one({"type": job_type}, sort=[("created_at", -1)])
+    
+    async def get_idempotency_record(self, key: str) -> Optional[dict]:
+        try:
+            return await self.db.registration_idempotency.find_one({"_id": key})
+        except Exception as e:
+            logger.error(f"Failed to get idempotency record: {str(e)}")
+            return None
+    
+    async def reserve_idempotency_key(self, key: str, lease_seconds: int) -> Optional[dict]:
+        """Reserve ``key`` for a new submission; returns the existing record if it is already taken.
+
+        An ``in_progress`` reservation older than ``lease_seconds`` belongs to a
+        request that died before completing or releasing it, and is taken over.
+        """
+        now = datetime.utcnow()
+        try:
+            await self.db.registration_idempotency.insert_one({
+                "_id": key,
+                "status": "in_progress",
+                "response": None,
+                "created_at": now
+            })
+            return None
+        except DuplicateKeyError:
+            taken_over = await self.db.registration_idempotency.find_one_and_update(
+                {"_id": key, "status": "in_progress", "created_at": {"$lt": now - timedelta(seconds=lease_seconds)}},
+                {"$set": {"created_at": now}}
+            )
+            if taken_over:
+                logger.warning(f"Took over idempotency key {key[:12]}... abandoned since {taken_over['created_at']}")
+                return None
+            return await self.db.registration_idempotency.find_one({"_id": key}) or {"status": "in_progress"}
+    
+    async def complete_idempotency_key(self, key: str, response: dict):
+        await self.db.registration_idempotency.update_one(
+            {"_id": key},
+            {"$set": {"status": "completed", "response": response}}
+        )
+    
+    async def release_idempotency_key(self, key: str):
+        """Drop a reservation whose submission failed so it can be retried"""
+        try:
+            await self.db.registration_idempotency.delete_one({"_id": key, "status": "in_progress"})
+        except Exception as e:
+            logger.error(f"Failed to release idempotency key: {str(e)}")
+    
     async def get_registration(self, registration_id: str) -> Optional[AgentRegistration]:
         try:
             doc = await self.db.agent_registrations.find_one({"id": registration_id})
@@ -53,9 +476,17 @@ class DatabaseService:
             logger.error(f"Failed to get registration: {str(e)}")
             return None
             
+    async def get_registrations_by_ids(self, registration_ids: List[str]) -> List[AgentRegistration]:
+        try:
+            cursor = self.db.agent_registrations.find({"id": {"$in": registration_ids}}).sort("timestamp", 1)
+            return [AgentRegistration(**doc) async for doc in cursor]
+        except Exception as e:
+            logger.error(f"Failed to get registrations by id: {str(e)}")
+            return []
+            
     async def get_all_registrations(self, limit: int = 100) -> List[AgentRegistration]:
         try:
-            cursor = self.db.agent_registrations.find().limit(limit).sort("timestamp", -1)
+            cursor = self.db.agent_registrations.find().sort(REGISTRATION_ORDER).limit(limit)
             registrations = []
             async for doc in cursor:
                 registrations.append(AgentRegistration(**doc))
@@ -64,6 +495,39 @@ class DatabaseService:
             logger.error(f"Failed to get registrations: {str(e)}")
             return []
             
+    async def get_registrations_page(self, limit: int = 50,
+                                     cursor: Optional[str] = None) -> Tuple[List[AgentRegistration], Optional[str]]:
+        """One page of registrations, newest first, and the cursor of the next page (None on the last).
+
+        Pages seek on the (timestamp, id) index from the cursor instead of
+        skipping, so deep pages cost the same as the first. Raises ValueError
+        for a malformed cursor.
+        """
+        query = {}
+        if cursor:
+            timestamp, registration_id = decode_registration_cursor(cursor)
+            query = {"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "id": {"$lt": registration_id}}
+            ]}
+        
+        docs = self.db.agent_registrations.find(query).sort(REGISTRATION_ORDER).limit(limit + 1)
+        registrations = [AgentRegistration(**doc) async for doc in docs]
+        if len(registrations) > limit:
+            registrations = registrations[:limit]
+            return registrations, encode_registration_cursor(registrations[-1])
+        return registrations, None
+    
+    async def iter_registrations(self, batch_size: int = 500) -> AsyncIterator[AgentRegistration]:
+        """Every registration, newest first, fetched one keyset page at a time"""
+        cursor = None
+        while True:
+            registrations, cursor = await self.get_registrations_page(batch_size, cursor)
+            for registration in registrations:
+                yield registration
+            if not cursor:
+                break
+    
     async def get_registrations_count(self) -> int:
         try:
             return await self.db.agent_registrations.count_documents({})
@@ -0,0 +1,142 @@
+import os
+import asyncio
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+from dotenv import load_dotenv
+from models import AgentRegistration
+from services.outbox_service import NOTIFICATION_MODE, JOB_DIGEST, JOB_DIGEST_ENTRY
+from services.notification_templates import notification_templates, TIMESTAMP_FORMAT
+from services.mime_stream import SPOOL_MAX_MEMORY, StreamedMIMEMessage, cv_link
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# "links" only links CVs (Drive or download route), "zip" also bundles local CVs into one attachment
+DIGEST_CV_DELIVERY = os.getenv('DIGEST_CV_DELIVERY', 'links')
+DIGEST_MAX_ATTACHMENT_BYTES = int(os.getenv('DIGEST_MAX_ATTACHMENT_BYTES', str(20 * 1024 * 1024)))
+
+
+def _bundle_cvs(registrations: List[AgentRegistration]):
+    """Zip local CVs up to DIGEST_MAX_ATTACHMENT_BYTES into a spooled file.
+
+    Returns (rewound zip file or None, bundled registration ids).
+    """
+    bundle = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    bundled = set()
+    total = 0
+    with zipfile.ZipFile(bundle, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for index, registration in enumerate(registrations, start=1):
+            path = registration.cv_file_path
+            if not path or not os.path.exists(path):
+                continue
+            size = os.path.getsize(path)
+            if total + size > DIGEST_MAX_ATTACHMENT_BYTES:
+                continue
+            safe_email = registration.email.replace("@", "_").replace(".", "_")
+            archive.write(path, arcname=f"{index:03d}_{safe_email}_{registration.cv_filename or Path(path).name}")
+            bundled.add(registration.id)
+            total += size
+    
+    if not bundled:
+        bundle.close()
+        return None, bundled
+    bundle.seek(0)
+    return bundle, bundled
+
+
+def build_digest_message(registrations: List[AgentRegistration], sender_email: Optional[str],
+                         recipient_email: str) -> StreamedMIMEMessage:
+    """Summary email for a digest window; CVs as links or a zip attachment.
+
+    The zip is encoded into the message as it is written; close the returned
+    message to release it.
+    """
+    registrations = sorted(registrations, key=lambda registration: registration.timestamp)
+    attachment, bundled = _bundle_cvs(registrations) if DIGEST_CV_DELIVERY == 'zip' else (None, set())
+
+    timestamps = [registration.timestamp for registration in registrations]
+    period = f"{min(timestamps).strftime(TIMESTAMP_FORMAT)} - {max(timestamps).strftime(TIMESTAMP_FORMAT)}"
+    links = {registration.id: cv_link(registration) for registration in registrations if registration.id not in bundled}
+
+    subject, body_text = notification_templates.digest(registrations, period, attached_ids=bundled, links=links)
+    
+    headers = [('To', recipient_email), ('Subject', subject)]
+    if sender_email:
+        headers.insert(0, ('From', sender_email))
+    message = StreamedMIMEMessage(headers, body_text)
+    if attachment:
+        message.attach(attachment, 'cvs.zip', 'application/zip')
+    return message
+
+
+class DigestScheduler:
+    """Closes a digest window every DIGEST_WINDOW_MINUTES when NOTIFICATION_MODE=digest.
+
+    Registrations whose digest entry has settled are moved into a single
+    ``digest`` outbox job, which the outbox worker sends (with retries) as one
+    summary email. Windows are anchored on the last digest job, so restarts
+    do not shorten or skip them.
+    """
+
+    def __init__(self, db_service, outbox_worker):
+        self.db_service = db_service
+        self.outbox_worker = outbox_worker
+        self.enabled = NOTIFICATION_MODE == 'digest'
+        self.window = timedelta(minutes=float(os.getenv('DIGEST_WINDOW_MINUTES', '60')))
+        self.retry_seconds = float(os.getenv('DIGEST_RETRY_SECONDS', '60'))
+        self._task = None
+
+    async def start(self):
+        """Start the window loop (no-op in immediate mode)"""
+        if not self.enabled:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Digest notifications enabled, window {self.window}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _next_window_end(self) -> datetime:
+        latest = await self.db_service.get_latest_job(JOB_DIGEST)
+        if latest:
+            return latest["created_at"] + self.window
+        return datetime.utcnow() + self.window
+
+    async def _run(self):
+        try:
+            released = await self.db_service.release_orphaned_digest_entries(JOB_DIGEST_ENTRY)
+            if released:
+                logger.warning(f"Requeued {released} digest entries from an interrupted digest")
+            window_end = await self._next_window_end()
+        except Exception as e:
+            logger.error(f"Digest scheduler could not read its state: {str(e)}")
+            window_end = datetime.utcnow() + self.window
+
+        while True:
+            delay = (window_end - datetime.utcnow()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                job = await self.db_service.create_digest_job(JOB_DIGEST_ENTRY, JOB_DIGEST)
+                if job:
+                    self.outbox_worker.notify()
+                else:
+                    logger.info("Digest window closed with no new registrations")
+                window_end = datetime.utcnow() + self.window
+            except Exception as e:
+                logger.error(f"Failed to close digest window: {str(e)}")
+                window_end = datetime.utcnow() + timedelta(seconds=self.retry_seconds)
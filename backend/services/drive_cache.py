@@ -0,0 +1,151 @@
+import os
+import re
+import uuid
+import asyncio
+import aiofiles
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+from dotenv import load_dotenv
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+drive_cache_requests = metrics.counter(
+    'pymetra_drive_cache_requests_total',
+    'Drive CV cache lookups by result',
+    ('result',)
+)
+drive_cache_bytes = metrics.gauge(
+    'pymetra_drive_cache_bytes',
+    'Bytes currently held in the Drive CV cache'
+)
+drive_cache_evictions = metrics.counter(
+    'pymetra_drive_cache_evictions_total',
+    'CVs evicted from the Drive CV cache'
+)
+
+
+class DriveCVCache:
+    """Read-through disk cache of Drive-hosted CVs keyed by ``cv_drive_id``.
+
+    Files are filled atomically (written to a ``.part`` file then renamed) and
+    evicted least recently used first once DRIVE_CACHE_MAX_BYTES is exceeded.
+    Recency survives restarts through the files' mtime.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.cache_dir = Path(cache_dir or os.getenv('DRIVE_CACHE_DIR', 'uploads/drive_cache'))
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('DRIVE_CACHE_MAX_BYTES', str(256 * 1024 * 1024))
+        )
+        self._entries = OrderedDict()  # drive_id -> size, least recently used first
+        self._fill_locks = {}
+        self._loaded = False
+
+    def _path(self, drive_id: str) -> Path:
+        return self.cache_dir / re.sub(r'[^A-Za-z0-9_-]', '_', drive_id)
+
+    def _load(self):
+        """Index files left by a previous run, dropping interrupted fills"""
+        if self._loaded:
+            return
+        self._loaded = True
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        files = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix == '.part':
+                path.unlink(missing_ok=True)
+            elif path.is_file():
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+        self._evict()
+
+    def _evict(self):
+        total = sum(self._entries.values())
+        while total > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            (self.cache_dir / name).unlink(missing_ok=True)
+            total -= size
+            drive_cache_evictions.inc()
+            logger.info(f"Evicted {name} from Drive CV cache ({size} bytes)")
+        drive_cache_bytes.set(total)
+
+    def _touch(self, name: str) -> Optional[Path]:
+        path = self.cache_dir / name
+        if name not in self._entries:
+            return None
+        if not path.exists():
+            # Removed behind our back
+            del self._entries[name]
+            self._evict()
+            return None
+        self._entries.move_to_end(name)
+        os.utime(path)
+        return path
+
+    async def get(self, drive_id: str, google_service) -> Optional[Path]:
+        """Local path of the CV, downloading it from Drive on a miss.
+
+        Returns None when the file cannot be fetched or is larger than the
+        whole cache budget; callers then stream from Drive directly.
+        """
+        self._load()
+        name = self._path(drive_id).name
+        path = self._touch(name)
+        if path:
+            drive_cache_requests.inc(result='hit')
+            return path
+
+        lock = self._fill_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            # Another request may have filled it while we waited
+            path = self._touch(name)
+            if path:
+                drive_cache_requests.inc(result='hit')
+                return path
+
+            drive_cache_requests.inc(result='miss')
+            try:
+                return await self._fill(drive_id, name, google_service)
+            finally:
+                self._fill_locks.pop(name, None)
+
+    async def _fill(self, drive_id: str, name: str, google_service) -> Optional[Path]:
+        size = await google_service.get_drive_file_size(drive_id)
+        if size is None or size > self.max_bytes:
+            return None
+
+        path = self.cache_dir / name
+        part_path = self.cache_dir / f"{name}.{uuid.uuid4().hex}.part"
+        try:
+            written = 0
+            async with aiofiles.open(part_path, 'wb') as f:
+                if size:
+                    async for chunk in google_service.iter_drive_content(drive_id, 0, size - 1):
+                        await f.write(chunk)
+                        written += len(chunk)
+            if written != size:
+                raise Exception(f"expected {size} bytes, got {written}")
+            os.replace(part_path, path)
+        except Exception as e:
+            logger.error(f"Error caching Drive file {drive_id}: {str(e)}")
+            part_path.unlink(missing_ok=True)
+            return None
+
+        self._entries[name] = size
+        self._evict()
+        logger.info(f"Cached Drive file {drive_id} ({size} bytes)")
+        return path if name in self._entries else None
+
+
+# Shared by every download route
+drive_cv_cache = DriveCVCache()
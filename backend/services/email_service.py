@@ -1,11 +1,16 @@
 import smtplib
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dotenv import load_dotenv
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
 from typing import Optional
+from services.metrics_service import timed_stage
+from services.smtp_pool import SMTPConnectionPool, SMTPSendCancelled
+from services.digest_service import build_digest_message
+from services.mime_stream import StreamedMIMEMessage, attachment_fits, cv_link
+from services.notification_templates import notification_templates
 import logging
 
 # Load environment variables
@@ -21,79 +26,127 @@ class EmailService:
         self.sender_email = os.getenv('GMAIL_SENDER_EMAIL')
         self.sender_password = os.getenv('GMAIL_APP_PASSWORD')
         self.recipient_email = os.getenv('RECIPIENT_EMAIL', 'joan@pymetra.com')
+        self.smtp_pool = SMTPConnectionPool(
+            self.smtp_server, self.smtp_port, self.sender_email, self.sender_password
+        )
+        self.send_timeout = float(os.getenv('SMTP_SEND_TIMEOUT_SECONDS', '120'))
+        # One thread per pooled session so blocking smtplib never runs on the event loop
+        self._executor = ThreadPoolExecutor(max_workers=self.smtp_pool.size, thread_name_prefix='smtp')
+    
+    def close(self):
+        """Wait for in-flight emails and close pooled SMTP sessions"""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.smtp_pool.close()
         
+    @timed_stage('smtp')
     async def send_registration_notification(self, registration_data, cv_file_path: Optional[str] = None):
+        """Send the notification without blocking the event loop.
+
+        Building the message and talking SMTP run on a dedicated executor.
+        The whole send is bounded by SMTP_SEND_TIMEOUT_SECONDS; on timeout or
+        cancellation a send that has not reached the server yet is dropped.
+        """
         logger.info(f"=== SMTP EMAIL SERVICE START ===")
         logger.info(f"Sender: {self.sender_email}")
         logger.info(f"Recipient: {self.recipient_email}")
         logger.info(f"CV file: {cv_file_path}")
         logger.info(f"SMTP Server: {self.smtp_server}:{self.smtp_port}")
         
+        # Verify credentials
+        if not self.sender_email or not self.sender_password:
+            logger.error("SMTP credentials missing")
+            logger.error(f"Sender email: {self.sender_email}")
+            logger.error(f"Password exists: {bool(self.sender_password)}")
+            return False
+        
+        return await self._run_send(self._send_notification, registration_data, cv_file_path)
+    
+    @timed_stage('smtp')
+    async def send_digest_notification(self, registrations) -> bool:
+        """Send one summary email for a digest window"""
+        if not self.sender_email or not self.sender_password:
+            logger.error("SMTP credentials missing")
+            return False
+        
+        return await self._run_send(self._send_digest, registrations)
+    
+    async def _run_send(self, send, *args) -> bool:
+        """Run a blocking ``send(*args, cancelled)`` on the SMTP executor with a timeout"""
+        cancelled = threading.Event()
         try:
-            # Verify credentials
-            if not self.sender_email or not self.sender_password:
-                logger.error("SMTP credentials missing")
-                logger.error(f"Sender email: {self.sender_email}")
-                logger.error(f"Password exists: {bool(self.sender_password)}")
-                return False
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(self._executor, send, *args, cancelled),
+                timeout=self.send_timeout
+            )
+        except asyncio.TimeoutError:
+            cancelled.set()
+            logger.error(f"❌ SMTP send timed out after {self.send_timeout}s")
+            return False
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    
+    def _send_digest(self, registrations, cancelled: threading.Event) -> bool:
+        try:
+            with build_digest_message(registrations, self.sender_email, self.recipient_email) as message:
+                self._send_streamed(message, cancelled)
+            logger.info(f"✅ Digest of {len(registrations)} registrations sent to {self.recipient_email}")
+            return True
+        except SMTPSendCancelled:
+            logger.warning("SMTP digest cancelled before reaching the server")
+            return False
+        except Exception as e:
+            logger.error(f"❌ SMTP digest error: {str(e)}")
+            return False
+    
+    def _send_streamed(self, message: StreamedMIMEMessage, cancelled: threading.Event):
+        """Spool the message (attachments encoded from disk) and stream it through DATA"""
+        with message.spool() as spooled:
+            self.smtp_pool.send_stream(self.sender_email, [self.recipient_email], spooled, cancelled)
+    
+    def _send_notification(self, registration_data, cv_file_path: Optional[str], cancelled: threading.Event) -> bool:
+        """Blocking part of send_registration_notification, run on the SMTP executor"""
+        try:
+            # CVs above EMAIL_ATTACHMENT_MAX_BYTES are linked instead of attached;
+            # with nowhere to link to they are still attached, streamed from disk
+            cv_exists = bool(cv_file_path) and os.path.exists(cv_file_path)
+            link = None if attachment_fits(cv_file_path) else cv_link(registration_data)
+            cv_attached = cv_exists and not link
+            subject, body = notification_templates.registration(
+                registration_data, cv_attached=cv_attached, cv_link=link
+            )
             
             # Create message
-            message = MIMEMultipart()
-            message['From'] = self.sender_email
-            message['To'] = self.recipient_email
-            message['Subject'] = f'Nuevo registro Pymetra - {registration_data.full_name}'
-            
-            # Email body in Spanish
-            body = f"""
-Nuevo agente registrado en Pymetra:
-
-Información del agente:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-• Nombre: {registration_data.full_name}
-• Email: {registration_data.email}
-• Zona geográfica: {registration_data.geographic_area}
-• Sector principal: {registration_data.main_sector}
-• Idioma: {registration_data.language}
-• Fecha de registro: {registration_data.timestamp.strftime('%d/%m/%Y %H:%M')}
-
-El CV se encuentra adjunto a este correo.
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de registro automático Pymetra
-            """
+            message = StreamedMIMEMessage(
+                [('From', self.sender_email), ('To', self.recipient_email), ('Subject', subject)],
+                body
+            )
             
-            message.attach(MIMEText(body, 'plain', 'utf-8'))
-            logger.info("Email body attached")
-            
-            # Attach CV if exists
-            if cv_file_path and os.path.exists(cv_file_path):
-                logger.info(f"Attaching CV: {cv_file_path}")
-                with open(cv_file_path, 'rb') as f:
-                    attachment = MIMEApplication(f.read())
-                    attachment.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename="{os.path.basename(cv_file_path)}"'
-                    )
-                    message.attach(attachment)
-                logger.info("CV attachment added")
-            else:
+            # Attach CV if exists; it is base64-encoded from disk while sending
+            if cv_attached:
+                if attachment_fits(cv_file_path):
+                    logger.info(f"Attaching CV: {cv_file_path}")
+                else:
+                    logger.info(f"CV above the attachment limit but not in Drive and PUBLIC_BASE_URL unset, "
+                                f"attaching anyway: {cv_file_path}")
+                message.attach(cv_file_path, os.path.basename(cv_file_path))
+            elif link:
+                logger.info(f"CV too large to attach, linking {link}")
+            elif cv_file_path:
                 logger.warning(f"CV file not found: {cv_file_path}")
+            else:
+                logger.info("Registration has no CV")
+            
+            # Send email over a pooled, already authenticated session
+            logger.info("Sending message...")
+            self._send_streamed(message, cancelled)
             
-            # Send email
-            logger.info("Connecting to SMTP server...")
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                logger.info("Starting TLS...")
-                server.starttls()
-                
-                logger.info("Logging in to SMTP...")
-                server.login(self.sender_email, self.sender_password)
-                
-                logger.info("Sending message...")
-                server.send_message(message)
-                
             logger.info(f"✅ Email sent successfully to {self.recipient_email}")
             return True
             
+        except SMTPSendCancelled:
+            logger.warning("SMTP send cancelled before reaching the server")
+            return False
         except smtplib.SMTPAuthenticationError as auth_error:
             logger.error(f"❌ SMTP Authentication failed: {str(auth_error)}")
             logger.error("Check Gmail App Password configuration")
@@ -1,6 +1,6 @@
 import csv
 import io
-from typing import List
+from typing import AsyncIterable, AsyncIterator, List
 from models import AgentRegistration
 from datetime import datetime
 import logging
@@ -11,41 +11,42 @@ class ExportService:
     def __init__(self):
         pass
     
+    CSV_HEADERS = [
+        'ID',
+        'Nombre Completo',
+        'Email', 
+        'Zona Geográfica',
+        'Sector Principal',
+        'Nombre CV',
+        'Ruta CV',
+        'Idioma',
+        'Fecha Registro',
+        'Estado'
+    ]
+    
+    def registration_to_csv_row(self, reg: AgentRegistration) -> List:
+        """CSV row for one registration, in CSV_HEADERS order"""
+        return [
+            reg.id,
+            reg.full_name,
+            reg.email,
+            reg.geographic_area,
+            reg.main_sector,
+            reg.cv_filename or '',
+            reg.cv_file_path or '',
+            reg.language,
+            reg.timestamp.strftime('%d/%m/%Y %H:%M:%S'),
+            reg.status
+        ]
+    
     def export_to_csv(self, registrations: List[AgentRegistration]) -> str:
         """Export registrations to CSV format"""
         try:
             output = io.StringIO()
             writer = csv.writer(output)
-            
-            # CSV Headers
-            headers = [
-                'ID',
-                'Nombre Completo',
-                'Email', 
-                'Zona Geográfica',
-                'Sector Principal',
-                'Nombre CV',
-                'Ruta CV',
-                'Idioma',
-                'Fecha Registro',
-                'Estado'
-            ]
-            writer.writerow(headers)
-            
-            # Data rows
+            writer.writerow(self.CSV_HEADERS)
             for reg in registrations:
-                writer.writerow([
-                    reg.id,
-                    reg.full_name,
-                    reg.email,
-                    reg.geographic_area,
-                    reg.main_sector,
-                    reg.cv_filename or '',
-                    reg.cv_file_path or '',
-                    reg.language,
-                    reg.timestamp.strftime('%d/%m/%Y %H:%M:%S'),
-                    reg.status
-                ])
+                writer.writerow(self.registration_to_csv_row(reg))
             
             csv_content = output.getvalue()
             output.close()
@@ -57,6 +58,41 @@ class ExportService:
             logger.error(f"Failed to export to CSV: {str(e)}")
             raise
     
+    async def iter_csv(self, registrations: AsyncIterable[AgentRegistration],
+                       rows_per_chunk: int = 500) -> AsyncIterator[str]:
+        """CSV export written in chunks of ``rows_per_chunk`` rows as registrations arrive"""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(self.CSV_HEADERS)
+        count = 0
+        try:
+            async for reg in registrations:
+                writer.writerow(self.registration_to_csv_row(reg))
+                count += 1
+                if count % rows_per_chunk == 0:
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate()
+            yield output.getvalue()
+            logger.info(f"Exported {count} registrations to CSV")
+        except Exception as e:
+            logger.error(f"Failed to export to CSV after {count} rows: {str(e)}")
+            raise
+        finally:
+            output.close()
+    
+    def registration_to_sheets_row(self, reg: AgentRegistration) -> List:
+        """Google Sheets row for one registration (columns A:G)"""
+        return [
+            reg.full_name,
+            reg.email,
+            reg.geographic_area,
+            reg.main_sector,
+            reg.timestamp.strftime('%d/%m/%Y %H:%M'),
+            reg.language.upper(),
+            reg.status.title()
+        ]
+    
     def export_to_google_sheets_format(self, registrations: List[AgentRegistration]) -> List[List]:
         """Export registrations in format ready for Google Sheets"""
         try:
@@ -73,15 +109,7 @@ class ExportService:
             
             # Data rows
             for reg in registrations:
-                data.append([
-                    reg.full_name,
-                    reg.email,
-                    reg.geographic_area,
-                    reg.main_sector,
-                    reg.timestamp.strftime('%d/%m/%Y %H:%M'),
-                    reg.language.upper(),
-                    reg.status.title()
-                ])
+                data.append(self.registration_to_sheets_row(reg))
             
             logger.info(f"Prepared {len(registrations)} registrations for Google Sheets")
             return data
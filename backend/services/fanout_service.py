@@ -0,0 +1,67 @@
+import os
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutService:
+    """Runs independent integrations concurrently, each under its own deadline.
+
+    Every call receives the outcomes of the calls it depends on and produces an
+    outcome dict of its own (``error_type`` holds the exception class of a
+    failed call), so one slow or failing integration never hides the
+    result of the others and the total time is that of the slowest branch.
+    """
+    
+    def __init__(self):
+        self.default_deadline = float(os.getenv('INTEGRATION_DEADLINE_SECONDS', '30'))
+    
+    def deadline_for(self, name: str) -> float:
+        """Per-integration deadline, e.g. DRIVE_DEADLINE_SECONDS, falling back to the default"""
+        return float(os.getenv(f'{name.upper()}_DEADLINE_SECONDS', self.default_deadline))
+    
+    async def run(self, calls: Dict[str, Callable[[dict], Awaitable]],
+                  depends_on: Optional[Dict[str, str]] = None) -> Dict[str, dict]:
+        """Run ``calls`` concurrently; ``depends_on`` maps a call to the call whose outcome it needs"""
+        depends_on = depends_on or {}
+        tasks = {}
+        
+        async def run_one(name: str) -> dict:
+            upstream = {}
+            dependency = depends_on.get(name)
+            if dependency in tasks:
+                upstream[dependency] = await tasks[dependency]
+            
+            deadline = self.deadline_for(name)
+            started = time.monotonic()
+            outcome = {"name": name, "ok": False, "result": None, "error": None, "error_type": None, "timed_out": False}
+            try:
+                outcome["result"] = await asyncio.wait_for(calls[name](upstream), timeout=deadline)
+                outcome["ok"] = True
+            except asyncio.TimeoutError:
+                outcome["timed_out"] = True
+                outcome["error"] = f"Deadline of {deadline:g}s exceeded"
+                outcome["error_type"] = asyncio.TimeoutError
+            except Exception as e:
+                outcome["error"] = f"{type(e).__name__}: {str(e)}"
+                outcome["error_type"] = type(e)
+            outcome["elapsed_ms"] = round((time.monotonic() - started) * 1000)
+            
+            logger.info(f"Fan-out {name}: ok={outcome['ok']} in {outcome['elapsed_ms']}ms"
+                        + (f" ({outcome['error']})" if outcome['error'] else ""))
+            return outcome
+        
+        for name in calls:
+            tasks[name] = asyncio.create_task(run_one(name))
+        
+        outcomes = await asyncio.gather(*tasks.values())
+        return {outcome["name"]: outcome for outcome in outcomes}
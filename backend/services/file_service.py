@@ -1,37 +1,135 @@
 import os
+import uuid
+import hashlib
 import aiofiles
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
+from services.metrics_service import timed_stage
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Leading bytes of the CV formats we accept
+CV_MAGIC_BYTES = {
+    b'%PDF': 'application/pdf',
+    b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1': 'application/msword',
+    b'PK\x03\x04': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+}
+
+# Largest CV accepted from the registration form and bulk imports
+MAX_CV_SIZE = 5 * 1024 * 1024
+
+def detect_cv_type(data: bytes) -> Optional[str]:
+    """Content type of a CV from its leading bytes, None if not PDF/DOC/DOCX"""
+    return next((content_type for magic, content_type in CV_MAGIC_BYTES.items() if data.startswith(magic)), None)
+
+class FileTooLargeError(Exception):
+    """Raised when an upload crosses the size limit"""
+
+class InvalidFileContentError(Exception):
+    """Raised when an upload's content is not a PDF/DOC/DOCX"""
+
 class FileService:
     def __init__(self):
         self.upload_dir = Path("uploads/cvs")
         self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = int(os.getenv('CV_UPLOAD_CHUNK_SIZE', str(64 * 1024)))
         
+    def _cv_file_path(self, filename: str, applicant_email: str) -> Path:
+        # Create safe filename
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        safe_email = applicant_email.replace("@", "_").replace(".", "_")
+        file_extension = Path(filename).suffix
+        safe_filename = f"{timestamp}_{safe_email}_cv{file_extension}"
+        
+        return self.upload_dir / safe_filename
+        
+    def _link_into_place(self, partial_path: Path, file_path: Path) -> Path:
+        """Move a finished file into place without overwriting another CV saved within the same second"""
+        base_path, suffix = file_path, 1
+        while True:
+            try:
+                os.link(partial_path, file_path)
+                break
+            except FileExistsError:
+                file_path = base_path.with_name(f"{base_path.stem}_{suffix}{base_path.suffix}")
+                suffix += 1
+        partial_path.unlink()
+        return file_path
+        
+    @timed_stage('file_save')
     async def save_cv_file(self, file_content: bytes, filename: str, applicant_email: str) -> Optional[str]:
+        partial_path = self.upload_dir / f".{uuid.uuid4().hex}.part"
         try:
-            # Create safe filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_email = applicant_email.replace("@", "_").replace(".", "_")
-            file_extension = Path(filename).suffix
-            safe_filename = f"{timestamp}_{safe_email}_cv{file_extension}"
-            
-            file_path = self.upload_dir / safe_filename
-            
             # Save file
-            async with aiofiles.open(file_path, 'wb') as f:
+            async with aiofiles.open(partial_path, 'wb') as f:
                 await f.write(file_content)
+            file_path = self._link_into_place(partial_path, self._cv_file_path(filename, applicant_email))
                 
             logger.info(f"CV file saved: {file_path}")
             return str(file_path)
             
         except Exception as e:
             logger.error(f"Failed to save CV file: {str(e)}")
+            if partial_path.exists():
+                partial_path.unlink()
             return None
+    
+    @timed_stage('file_save')
+    async def save_cv_upload(self, upload, applicant_email: str, max_bytes: int) -> dict:
+        """Stream an UploadFile to the upload directory chunk by chunk.
+
+        Aborts as soon as ``max_bytes`` is crossed and checks the magic bytes
+        of the first chunk, so only one chunk is held in memory. Returns the
+        saved path, size, sha256 and sniffed content type.
+        """
+        # Multipart parsing already knows the size: reject without reading
+        if upload.size is not None and upload.size > max_bytes:
+            raise FileTooLargeError(f"{upload.size} bytes")
+        
+        file_path = self._cv_file_path(upload.filename, applicant_email)
+        partial_path = self.upload_dir / f".{uuid.uuid4().hex}.part"
+        digest = hashlib.sha256()
+        size = 0
+        detected_type = None
+        
+        try:
+            async with aiofiles.open(partial_path, 'wb') as f:
+                while True:
+                    chunk = await upload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    
+                    if detected_type is None:
+                        detected_type = detect_cv_type(chunk)
+                        if detected_type is None:
+                            raise InvalidFileContentError(f"Unrecognised leading bytes {chunk[:8]!r}")
+                    
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FileTooLargeError(f"more than {max_bytes} bytes")
+                    
+                    digest.update(chunk)
+                    await f.write(chunk)
+            
+            if size == 0:
+                raise InvalidFileContentError("Empty file")
+            
+            file_path = self._link_into_place(partial_path, file_path)
+            
+        except Exception:
+            if partial_path.exists():
+                partial_path.unlink()
+            raise
+        
+        logger.info(f"CV file streamed: {file_path} ({size} bytes, {detected_type})")
+        return {
+            "path": str(file_path),
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "content_type": detected_type
+        }
             
     def get_cv_file_info(self, file_path: str) -> dict:
         try:
@@ -44,4 +142,4 @@ class FileService:
                 }
         except Exception as e:
             logger.error(f"Failed to get file info: {str(e)}")
-        return {}
\ No newline at end of file
+        return {}
@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+from dotenv import load_dotenv
+from models import AgentRegistration
+from services.batching import BatchCoalescer
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+class GmailBatchSender:
+    """Groups pending Gmail notifications into batch requests.
+
+    Notifications queued within GMAIL_BATCH_MAX_DELAY_MS of each other go out
+    through ``GoogleAPIsService.send_gmail_notifications``; ``send`` resolves
+    with whether that specific message was delivered.
+    """
+    
+    def __init__(self, google_service):
+        self.google_service = google_service
+        self.coalescer = BatchCoalescer(
+            'GmailBatchSender',
+            self._flush,
+            max_items=google_service.gmail_batch_size,
+            max_delay=float(os.getenv('GMAIL_BATCH_MAX_DELAY_MS', '500')) / 1000
+        )
+    
+    async def send(self, registration: AgentRegistration, drive_file_info: Optional[dict] = None) -> bool:
+        return await self.coalescer.submit((registration, drive_file_info))
+    
+    @property
+    def batch_size(self) -> int:
+        return self.coalescer.max_items
+    
+    def flush(self):
+        """Send queued notifications now rather than after GMAIL_BATCH_MAX_DELAY_MS"""
+        self.coalescer.flush()
+    
+    async def close(self):
+        """Send queued notifications"""
+        await self.coalescer.close()
+    
+    async def _flush(self, notifications: List[Tuple[AgentRegistration, Optional[dict]]]) -> List[bool]:
+        return await self.google_service.send_gmail_notifications(notifications)
@@ -2,13 +2,21 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from services.oauth_service import OAuthService
+from services.export_service import ExportService
+from services.google_executor import google_api_executor
+from services.google_rate_limiter import google_rate_limiter, retry_reason
+from services.digest_service import build_digest_message
+from services.notification_templates import notification_templates
+from services.metrics_service import timed_stage
 from models import AgentRegistration
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 import base64
-import tempfile
+import io
+from typing import AsyncIterator, List, Optional, Tuple, Union
+import asyncio
 from datetime import datetime
 import logging
 
@@ -18,186 +26,370 @@ load_dotenv(ROOT_DIR / '.env')
 
 logger = logging.getLogger(__name__)
 
+# Drive appProperties key tagging an uploaded CV with its registration id
+DRIVE_REGISTRATION_PROPERTY = 'pymetra_registration_id'
+
 class GoogleAPIsService:
     def __init__(self):
         self.oauth_service = OAuthService()
+        self.export_service = ExportService()
         self.spreadsheet_id = os.getenv('GOOGLE_SPREADSHEET_ID')
         self.drive_folder_id = os.getenv('GOOGLE_DRIVE_FOLDER_ID')
         self.recipient_email = os.getenv('RECIPIENT_EMAIL', 'joan@pymetra.com')
+        # Gmail accepts up to 100 calls per batch but recommends at most 50
+        self.gmail_batch_size = min(int(os.getenv('GMAIL_BATCH_SIZE', '50')), 100)
+        self.gmail_batch_retries = int(os.getenv('GMAIL_BATCH_RETRIES', '2'))
+        self.gmail_batch_backoff = float(os.getenv('GMAIL_BATCH_BACKOFF_SECONDS', '1'))
+        # Resumable upload chunk for large Gmail messages (multiple of 256 KB)
+        self.gmail_upload_chunk_size = int(os.getenv('GMAIL_UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+        # Bytes fetched per ranged Drive request when streaming downloads
+        self.drive_chunk_size = int(os.getenv('DRIVE_DOWNLOAD_CHUNK_SIZE', str(1024 * 1024)))
     
     def is_authenticated(self):
         """Check if Google APIs are authenticated"""
         return self.oauth_service.is_authenticated()
     
+    async def is_authenticated_async(self) -> bool:
+        """``is_authenticated`` on the Google executor: loading the credentials can
+        wait for a token refresh running in another thread"""
+        return await google_api_executor.run(self.is_authenticated, label='auth')
+    
+    async def _execute(self, request, label: str, cost: float = 1, idempotent: bool = True):
+        """Execute a googleapiclient request on the executor over a pooled transport.
+
+        Calls are paced by the per-API rate limiter (the label prefix names the
+        API) and transient failures such as 429 and 5xx are retried with backoff;
+        writes that are not ``idempotent`` are only retried after a rate limit.
+        """
+        return await google_rate_limiter.call(
+            label.split('.')[0],
+            lambda: google_api_executor.run(self._execute_pooled, request, label=label),
+            cost=cost,
+            label=label,
+            idempotent=idempotent
+        )
+    
+    def _execute_pooled(self, request):
+        with self.oauth_service.authorized_http() as http:
+            return request.execute(http=http)
+    
     async def save_to_sheets(self, registration: AgentRegistration):
         """Save registration data to Google Sheets"""
+        return await self.append_rows_to_sheets([registration])
+    
+    async def append_rows_to_sheets(self, registrations: List[AgentRegistration]):
+        """Append many registrations to Google Sheets in a single request"""
+        return await self.append_values_to_sheets(
+            [self.export_service.registration_to_sheets_row(registration) for registration in registrations]
+        )
+    
+    @timed_stage('sheets')
+    async def append_values_to_sheets(self, values: List[List]):
+        """Append prepared rows to Google Sheets in a single request"""
         try:
-            if not self.is_authenticated():
+            if not await self.is_authenticated_async():
                 raise Exception("Google APIs not authenticated")
             
-            sheets_service = self.oauth_service.get_service('sheets', 'v4')
-            
-            # Prepare data row
-            values = [[
-                registration.full_name,
-                registration.email,
-                registration.geographic_area,
-                registration.main_sector,
-                registration.timestamp.strftime('%d/%m/%Y %H:%M:%S'),
-                registration.language.upper(),
-                registration.status.title()
-            ]]
+            sheets_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'sheets', 'v4', label='build'
+            )
             
             body = {
                 'values': values
             }
             
             # Append to sheet
-            result = sheets_service.spreadsheets().values().append(
+            request = sheets_service.spreadsheets().values().append(
                 spreadsheetId=self.spreadsheet_id,
                 range='A:G',
                 valueInputOption='USER_ENTERED',
                 insertDataOption='INSERT_ROWS',
                 body=body
-            ).execute()
+            )
+            result = await self._execute(request, 'sheets.append', idempotent=False)
             
-            updated_cells = result.get('updates', {}).get('updatedCells', 0)
-            logger.info(f"Data saved to Google Sheets: {updated_cells} cells updated")
+            updated_rows = result.get('updates', {}).get('updatedRows', 0)
+            logger.info(f"Data saved to Google Sheets: {updated_rows} rows updated")
             
-            return updated_cells > 0
+            return updated_rows >= len(values)
             
         except Exception as e:
             logger.error(f"Error saving to Google Sheets: {str(e)}")
             return False
     
-    async def upload_to_drive(self, file_content: bytes, filename: str, applicant_email: str):
-        """Upload CV to Google Drive"""
+    async def find_drive_file(self, registration_id: str) -> Optional[dict]:
+        """The CV uploaded for ``registration_id``, if any, found by its appProperties tag.
+
+        Raises if Drive cannot be queried, so callers do not upload a second copy blindly.
+        """
+        drive_service = await google_api_executor.run(
+            self.oauth_service.get_service, 'drive', 'v3', label='build'
+        )
+        request = drive_service.files().list(
+            q=f"appProperties has {{ key='{DRIVE_REGISTRATION_PROPERTY}' and value='{registration_id}' }} and trashed = false",
+            fields='files(id,name,webViewLink)',
+            pageSize=1
+        )
+        files = (await self._execute(request, 'drive.list')).get('files', [])
+        if not files:
+            return None
+        return {
+            'file_id': files[0].get('id'),
+            'filename': files[0].get('name'),
+            'web_link': files[0].get('webViewLink')
+        }
+    
+    @timed_stage('drive')
+    async def upload_to_drive(self, file_content: Union[bytes, str, Path], filename: str, applicant_email: str,
+                              registration_id: Optional[str] = None):
+        """Upload CV to Google Drive
+
+        ``file_content`` is either the CV bytes, streamed from memory, or the
+        path of a CV already on disk, uploaded in place. The file is tagged
+        with ``registration_id`` so ``find_drive_file`` can find it again.
+        """
         try:
-            if not self.is_authenticated():
+            if not await self.is_authenticated_async():
                 raise Exception("Google APIs not authenticated")
             
-            drive_service = self.oauth_service.get_service('drive', 'v3')
+            drive_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'drive', 'v3', label='build'
+            )
             
-            # Create temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=f"_{filename}") as temp_file:
-                temp_file.write(file_content)
-                temp_file_path = temp_file.name
+            # Prepare file metadata
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_email = applicant_email.replace("@", "_").replace(".", "_")
+            drive_filename = f"{timestamp}_{safe_email}_{filename}"
             
-            try:
-                # Prepare file metadata
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                safe_email = applicant_email.replace("@", "_").replace(".", "_")
-                drive_filename = f"{timestamp}_{safe_email}_{filename}"
-                
-                file_metadata = {
-                    'name': drive_filename,
-                    'parents': [self.drive_folder_id] if self.drive_folder_id else [],
-                    'description': f'CV from {applicant_email} - {datetime.now().strftime("%d/%m/%Y %H:%M")}'
-                }
-                
-                # Upload file
+            file_metadata = {
+                'name': drive_filename,
+                'parents': [self.drive_folder_id] if self.drive_folder_id else [],
+                'description': f'CV from {applicant_email} - {datetime.now().strftime("%d/%m/%Y %H:%M")}'
+            }
+            if registration_id:
+                file_metadata['appProperties'] = {DRIVE_REGISTRATION_PROPERTY: registration_id}
+            
+            # Upload file
+            if isinstance(file_content, (str, Path)):
                 media = MediaFileUpload(
-                    temp_file_path,
+                    str(file_content),
                     mimetype='application/octet-stream',
                     resumable=True
                 )
-                
-                file_result = drive_service.files().create(
+            else:
+                media = MediaIoBaseUpload(
+                    io.BytesIO(file_content),
+                    mimetype='application/octet-stream',
+                    resumable=True
+                )
+            
+            try:
+                request = drive_service.files().create(
                     body=file_metadata,
                     media_body=media,
                     fields='id,name,webViewLink'
-                ).execute()
-                
-                logger.info(f"File uploaded to Google Drive: {file_result.get('name')}")
-                
-                return {
-                    'file_id': file_result.get('id'),
-                    'filename': file_result.get('name'),
-                    'web_link': file_result.get('webViewLink')
-                }
-                
+                )
+                file_result = await self._execute(request, 'drive.create', idempotent=False)
             finally:
-                # Clean up temp file
-                os.unlink(temp_file_path)
+                media.stream().close()
+            
+            logger.info(f"File uploaded to Google Drive: {file_result.get('name')}")
+            
+            return {
+                'file_id': file_result.get('id'),
+                'filename': file_result.get('name'),
+                'web_link': file_result.get('webViewLink')
+            }
                 
         except Exception as e:
             logger.error(f"Error uploading to Google Drive: {str(e)}")
             return None
     
+    def _build_gmail_message(self, registration: AgentRegistration, drive_file_info: dict = None) -> str:
+        """Notification email for a registration, base64url-encoded for the Gmail API"""
+        subject, body_text = notification_templates.registration(registration, drive_file_info=drive_file_info)
+        
+        # Create email message
+        message = MIMEMultipart()
+        message['to'] = self.recipient_email
+        message['subject'] = subject
+        message.attach(MIMEText(body_text, 'plain', 'utf-8'))
+        
+        # Encode message
+        return base64.urlsafe_b64encode(
+            message.as_bytes()
+        ).decode('utf-8')
+    
     async def send_gmail_notification(self, registration: AgentRegistration, drive_file_info: dict = None):
         """Send email notification via Gmail API"""
+        results = await self.send_gmail_notifications([(registration, drive_file_info)])
+        return results[0]
+    
+    @timed_stage('gmail', succeeded=all)
+    async def send_gmail_notifications(self, notifications: List[Tuple[AgentRegistration, Optional[dict]]]) -> List[bool]:
+        """Send many notifications through Gmail API batch requests.
+
+        ``notifications`` are (registration, drive_file_info) pairs. They are
+        grouped into batches of GMAIL_BATCH_SIZE messages; messages rejected by
+        a rate limit are retried on their own, up to GMAIL_BATCH_RETRIES times.
+        Other failures may have been sent anyway and are left to the caller.
+        Returns whether each notification was sent.
+        """
+        sent = [False] * len(notifications)
         try:
-            if not self.is_authenticated():
+            if not await self.is_authenticated_async():
                 raise Exception("Google APIs not authenticated")
             
-            gmail_service = self.oauth_service.get_service('gmail', 'v1')
+            gmail_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'gmail', 'v1', label='build'
+            )
             
-            # Create email message
-            message = MIMEMultipart()
-            message['to'] = self.recipient_email
-            message['subject'] = f'Nuevo registro Pymetra - {registration.full_name}'
-            
-            # Email body
-            body_text = f"""
-Nuevo agente registrado en Pymetra:
-
-Información del agente:
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-• Nombre: {registration.full_name}
-• Email: {registration.email}
-• Zona geográfica: {registration.geographic_area}
-• Sector principal: {registration.main_sector}
-• Idioma: {registration.language}
-• Fecha de registro: {registration.timestamp.strftime('%d/%m/%Y %H:%M')}
-
-"""
+            raw_messages = {
+                index: self._build_gmail_message(registration, drive_file_info)
+                for index, (registration, drive_file_info) in enumerate(notifications)
+            }
             
-            if drive_file_info:
-                body_text += f"""• CV en Google Drive: {drive_file_info.get('web_link', 'No disponible')}
-• Nombre del archivo: {drive_file_info.get('filename', 'No disponible')}
-
-"""
+            pending = list(raw_messages)
+            for attempt in range(self.gmail_batch_retries + 1):
+                if attempt:
+                    await asyncio.sleep(self.gmail_batch_backoff * (2 ** (attempt - 1)))
+                    logger.warning(f"Retrying {len(pending)} failed Gmail messages (attempt {attempt + 1})")
+                
+                failed = []
+                for start in range(0, len(pending), self.gmail_batch_size):
+                    chunk = pending[start:start + self.gmail_batch_size]
+                    errors = {}
+                    
+                    def callback(request_id, response, exception):
+                        index = int(request_id)
+                        if exception is not None or not (response or {}).get('id'):
+                            errors[index] = exception
+                        else:
+                            sent[index] = True
+                    
+                    batch = gmail_service.new_batch_http_request(callback=callback)
+                    for index in chunk:
+                        batch.add(
+                            gmail_service.users().messages().send(userId='me', body={'raw': raw_messages[index]}),
+                            request_id=str(index)
+                        )
+                    
+                    try:
+                        await self._execute(batch, 'gmail.batch_send', cost=len(chunk), idempotent=False)
+                    except Exception as batch_error:
+                        # The whole batch request failed: every message in it failed with it
+                        logger.error(f"Gmail batch request failed: {str(batch_error)}")
+                        errors.update({index: batch_error for index in chunk if not sent[index]})
+                    
+                    for index, error in errors.items():
+                        logger.error(f"Gmail message for {notifications[index][0].email} failed: {str(error)}")
+                    failed.extend(index for index, error in errors.items()
+                                  if error is not None and retry_reason(error, idempotent=False))
+                
+                pending = failed
+                if not pending:
+                    break
             
-            body_text += """━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-Sistema de registro automático Pymetra
-            """
+            logger.info(f"Emails sent via Gmail API: {sum(sent)}/{len(notifications)}")
+            return sent
             
-            message.attach(MIMEText(body_text, 'plain', 'utf-8'))
+        except Exception as e:
+            logger.error(f"Error sending email via Gmail API: {str(e)}")
+            return sent
+    
+    @timed_stage('gmail')
+    async def send_gmail_digest(self, registrations: List[AgentRegistration]) -> bool:
+        """Send one summary email for a digest window via Gmail API"""
+        try:
+            if not await self.is_authenticated_async():
+                raise Exception("Google APIs not authenticated")
             
-            # Encode message
-            raw_message = base64.urlsafe_b64encode(
-                message.as_bytes()
-            ).decode('utf-8')
+            gmail_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'gmail', 'v1', label='build'
+            )
             
-            # Send email
-            send_result = gmail_service.users().messages().send(
-                userId='me',
-                body={'raw': raw_message}
-            ).execute()
+            # Zipping and encoding CVs is blocking work, keep it off the event loop
+            message = await asyncio.to_thread(build_digest_message, registrations, None, self.recipient_email)
+            with message:
+                spooled = await asyncio.to_thread(message.spool)
             
-            logger.info(f"Email sent via Gmail API: {send_result.get('id')}")
+            # Uploaded as message/rfc822 media instead of one base64 'raw' string
+            with spooled:
+                media = MediaIoBaseUpload(
+                    spooled,
+                    mimetype='message/rfc822',
+                    chunksize=self.gmail_upload_chunk_size,
+                    resumable=True
+                )
+                request = gmail_service.users().messages().send(userId='me', body={}, media_body=media)
+                result = await self._execute(request, 'gmail.send', idempotent=False)
             
-            return send_result.get('id') is not None
+            logger.info(f"Gmail digest of {len(registrations)} registrations sent: {result.get('id')}")
+            return True
             
         except Exception as e:
-            logger.error(f"Error sending email via Gmail API: {str(e)}")
+            logger.error(f"Error sending Gmail digest: {str(e)}")
             return False
     
+    @timed_stage('drive_download')
     async def download_from_drive(self, file_id: str):
         """Download file from Google Drive"""
         try:
-            if not self.is_authenticated():
+            if not await self.is_authenticated_async():
                 raise Exception("Google APIs not authenticated")
             
-            drive_service = self.oauth_service.get_service('drive', 'v3')
+            drive_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'drive', 'v3', label='build'
+            )
             
             # Download file content
             request = drive_service.files().get_media(fileId=file_id)
-            file_content = request.execute()
+            file_content = await self._execute(request, 'drive.get_media')
             
             logger.info(f"File downloaded from Google Drive: {file_id}")
             return file_content
             
         except Exception as e:
             logger.error(f"Error downloading from Google Drive: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+    
+    async def get_drive_file_size(self, file_id: str) -> Optional[int]:
+        """Size in bytes of a Drive file, or None if it cannot be read"""
+        try:
+            if not await self.is_authenticated_async():
+                raise Exception("Google APIs not authenticated")
+            
+            drive_service = await google_api_executor.run(
+                self.oauth_service.get_service, 'drive', 'v3', label='build'
+            )
+            
+            request = drive_service.files().get(fileId=file_id, fields='id,size')
+            file_result = await self._execute(request, 'drive.get')
+            return int(file_result['size'])
+            
+        except Exception as e:
+            logger.error(f"Error reading Google Drive file {file_id}: {str(e)}")
+            return None
+    
+    async def iter_drive_content(self, file_id: str, start: int, end: int) -> AsyncIterator[bytes]:
+        """Stream bytes ``start``..``end`` (inclusive) of a Drive file.
+
+        Each chunk is a separate ranged ``get_media`` request of at most
+        DRIVE_DOWNLOAD_CHUNK_SIZE bytes, so memory stays bounded by the chunk
+        size whatever the file size. Errors are raised to the caller.
+        """
+        drive_service = await google_api_executor.run(
+            self.oauth_service.get_service, 'drive', 'v3', label='build'
+        )
+        
+        position = start
+        while position <= end:
+            chunk_end = min(position + self.drive_chunk_size, end + 1) - 1
+            request = drive_service.files().get_media(fileId=file_id)
+            request.headers['Range'] = f'bytes={position}-{chunk_end}'
+            chunk = await self._execute(request, 'drive.get_media_range')
+            if not chunk:
+                raise Exception(f"Google Drive returned no data at byte {position} of {file_id}")
+            
+            yield chunk
+            position += len(chunk)
\ No newline at end of file
@@ -0,0 +1,52 @@
+import json
+import threading
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleClientRegistry:
+    """Google API clients built once per (service, version, credential generation).
+
+    Clients are built from the discovery documents bundled with
+    google-api-python-client (pinned in requirements.txt), parsed once per
+    process, so building never touches the network. A client is rebuilt only
+    when the credential generation changes.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._clients = {}
+    
+    def _document(self, service_name: str, version: str) -> dict:
+        key = (service_name, version)
+        if key not in self._documents:
+            content = get_static_doc(service_name, version)
+            if content is None:
+                raise Exception(f"No bundled discovery document for {service_name} {version}")
+            self._documents[key] = json.loads(content)
+        return self._documents[key]
+    
+    def get(self, service_name: str, version: str, credentials, generation: int):
+        key = (service_name, version, generation)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = build_from_document(self._document(service_name, version), credentials=credentials)
+                
+                # Drop clients built for rotated credentials
+                for stale_key in [k for k in self._clients if k[:2] == (service_name, version)]:
+                    del self._clients[stale_key]
+                self._clients[key] = client
+                logger.info(f"Built Google API client {service_name} {version} (credentials generation {generation})")
+            return client
+
+
+google_client_registry = GoogleClientRegistry()
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+executor_queue_depth = metrics.gauge(
+    'pymetra_google_api_queue_depth',
+    'Google API calls waiting for a free executor thread'
+)
+executor_active = metrics.gauge(
+    'pymetra_google_api_active_calls',
+    'Google API calls currently running on the executor'
+)
+executor_wait = metrics.histogram(
+    'pymetra_google_api_wait_seconds',
+    'Time Google API calls waited for an executor thread',
+    ['call']
+)
+executor_run = metrics.histogram(
+    'pymetra_google_api_call_seconds',
+    'Time Google API calls spent running on the executor',
+    ['call']
+)
+
+
+class GoogleAPIExecutor:
+    """Bounded thread pool for blocking googleapiclient calls.
+
+    googleapiclient's ``execute()`` does blocking network I/O; running it here
+    keeps the event loop free. Calls beyond ``GOOGLE_API_MAX_WORKERS`` wait in
+    the pool queue, and queue depth and wait time are tracked per label.
+    """
+    
+    def __init__(self):
+        self.max_workers = int(os.getenv('GOOGLE_API_MAX_WORKERS', '8'))
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='google-api')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._stats = {}
+    
+    async def run(self, fn, *args, label: str = 'google', **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result"""
+        submitted = time.monotonic()
+        with self._lock:
+            self._queued += 1
+        executor_queue_depth.inc()
+        
+        def call():
+            started = time.monotonic()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            executor_queue_depth.dec()
+            executor_active.inc()
+            executor_wait.observe(started - submitted, call=label)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                finished = time.monotonic()
+                executor_active.dec()
+                executor_run.observe(finished - started, call=label)
+                with self._lock:
+                    self._active -= 1
+                    stats = self._stats.setdefault(label, {
+                        "calls": 0, "wait_seconds_total": 0.0, "wait_seconds_max": 0.0, "run_seconds_total": 0.0
+                    })
+                    stats["calls"] += 1
+                    stats["wait_seconds_total"] += started - submitted
+                    stats["wait_seconds_max"] = max(stats["wait_seconds_max"], started - submitted)
+                    stats["run_seconds_total"] += finished - started
+        
+        return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+    
+    def stats(self) -> dict:
+        """Snapshot of pool usage: queue depth, active calls and per-label wait times"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "active": self._active,
+                "calls": {label: dict(stats) for label, stats in self._stats.items()}
+            }
+    
+    def shutdown(self):
+        """Wait for running calls and stop the pool"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        logger.info("Google API executor stopped")
+
+
+# Shared by every GoogleAPIsService instance so the bound is process-wide
+google_api_executor = GoogleAPIExecutor()
@@ -0,0 +1,107 @@
+import os
+import time
+import queue
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from dotenv import load_dotenv
+from services.metrics_service import metrics
+import httplib2
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+google_http_requests = metrics.counter(
+    'pymetra_google_http_requests_total',
+    'Google API calls by whether they reused a kept-alive connection or opened a new one',
+    ['connection']
+)
+http_pool_idle = metrics.gauge(
+    'pymetra_google_http_pool_idle',
+    'Idle keep-alive transports in the Google HTTP pool'
+)
+http_pool_wait = metrics.histogram(
+    'pymetra_google_http_pool_wait_seconds',
+    'Time Google API calls waited for a pooled transport'
+)
+
+
+def _sockets(http: httplib2.Http) -> dict:
+    return {key: id(conn.sock) for key, conn in http.connections.items() if conn.sock is not None}
+
+
+class GoogleHTTPPool:
+    """Pool of keep-alive httplib2 transports shared by every Google API client.
+
+    httplib2.Http is not thread-safe, so each executor call checks one out for
+    its duration and returns it afterwards with its connections still open;
+    the next call to googleapis.com skips the TCP and TLS handshakes. Sizes and
+    timeouts come from GOOGLE_HTTP_POOL_SIZE, GOOGLE_HTTP_TIMEOUT_SECONDS and
+    GOOGLE_HTTP_MAX_IDLE_SECONDS.
+    """
+
+    def __init__(self):
+        self.size = int(os.getenv('GOOGLE_HTTP_POOL_SIZE', os.getenv('GOOGLE_API_MAX_WORKERS', '8')))
+        self.timeout = float(os.getenv('GOOGLE_HTTP_TIMEOUT_SECONDS', '60'))
+        # Google's front ends drop idle connections; don't hand out ones likely closed
+        self.max_idle = float(os.getenv('GOOGLE_HTTP_MAX_IDLE_SECONDS', '240'))
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()
+
+    def _checkout(self) -> httplib2.Http:
+        while True:
+            try:
+                http, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return httplib2.Http(timeout=self.timeout)
+            if time.monotonic() - last_used <= self.max_idle:
+                return http
+            self._close(http)
+
+    @staticmethod
+    def _close(http: httplib2.Http):
+        for conn in list(http.connections.values()):
+            try:
+                conn.close()
+            except Exception:
+                pass
+        http.connections.clear()
+
+    @contextmanager
+    def connection(self):
+        """Check out a transport for one call, blocking while all are in use"""
+        started = time.monotonic()
+        self._slots.acquire()
+        http_pool_wait.observe(time.monotonic() - started)
+        http = None
+        try:
+            http = self._checkout()
+            before = _sockets(http)
+            yield http
+            after = _sockets(http)
+            reused = bool(after) and all(before.get(key) == sock for key, sock in after.items())
+            google_http_requests.inc(connection='reused' if reused else 'new')
+        finally:
+            if http is not None:
+                self._idle.put((http, time.monotonic()))
+            http_pool_idle.set(self._idle.qsize())
+            self._slots.release()
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                http, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close(http)
+        http_pool_idle.set(0)
+        logger.info("Google HTTP pool closed")
+
+
+# Shared by every Google API call in the process
+google_http_pool = GoogleHTTPPool()
@@ -0,0 +1,215 @@
+import os
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from googleapiclient.errors import HttpError
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+throttle_wait = metrics.histogram(
+    'pymetra_google_api_throttle_wait_seconds',
+    'Time Google API calls waited for a rate limiter token',
+    ['api']
+)
+retries_total = metrics.counter(
+    'pymetra_google_api_retries_total',
+    'Google API calls retried after a transient failure',
+    ['api', 'reason']
+)
+retry_budget_exhausted = metrics.counter(
+    'pymetra_google_api_retry_budget_exhausted_total',
+    'Transient Google API failures not retried because the retry budget was spent',
+    ['api']
+)
+
+# Default per-user quotas, in requests per second and burst size
+DEFAULT_RATES = {
+    'sheets': (1.0, 10),   # 60 write requests per minute per user
+    'drive': (10.0, 20),
+    'gmail': (2.5, 10),    # 250 quota units per second, 100 per message sent
+}
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+class TokenBucket:
+    """Async token bucket; waiters are served in arrival order"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1) -> float:
+        """Take ``cost`` tokens, sleeping until available; returns seconds waited.
+
+        Costs larger than the bucket go into debt once it is full, so the
+        average rate still holds.
+        """
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                needed = min(cost, self.capacity)
+                if now >= self.paused_until and self.tokens >= needed:
+                    self.tokens -= cost
+                    return now - started
+                delay = max(self.paused_until - now, (needed - self.tokens) / self.rate)
+                await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. while honoring Retry-After"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent traffic so outages don't multiply load"""
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.max_tokens = reserve * 10
+        self.tokens = reserve
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Delay requested by a Retry-After header (seconds or HTTP date), if any"""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_reason(error: Exception, idempotent: bool = True) -> Optional[str]:
+    """Why ``error`` is worth retrying, or None if it is permanent.
+
+    A non-idempotent call (an append, a file create, a send) is only retried
+    when the request was rejected by a rate limit: after a 5xx or a transport
+    error it may already have been applied.
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429:
+            return '429'
+        content = error.content.decode('utf-8', 'replace') if isinstance(error.content, bytes) else str(error.content)
+        if status == 403 and any(reason in content for reason in RATE_LIMIT_REASONS):
+            return 'rate_limit'
+        if status in RETRYABLE_STATUSES and idempotent:
+            return str(status)
+        return None
+    if isinstance(error, (ConnectionError, TimeoutError)) and idempotent:
+        return 'transport'
+    return None
+
+
+class GoogleAPIRateLimiter:
+    """Per-API token buckets plus retries with exponential backoff and jitter.
+
+    Limits come from GOOGLE_<API>_RATE_PER_SECOND / GOOGLE_<API>_BURST and
+    should match the project's quotas. 429, 5xx, rate-limit 403s and transport
+    errors are retried up to GOOGLE_API_MAX_RETRIES times with full-jitter
+    backoff, honoring Retry-After, while the shared retry budget allows it.
+    Non-idempotent calls are only retried after 429 and rate-limit 403s;
+    other failures are left to the caller (e.g. the outbox retry).
+    """
+
+    def __init__(self):
+        self.max_retries = int(os.getenv('GOOGLE_API_MAX_RETRIES', '5'))
+        self.backoff_base = float(os.getenv('GOOGLE_API_BACKOFF_BASE_SECONDS', '1'))
+        self.backoff_max = float(os.getenv('GOOGLE_API_BACKOFF_MAX_SECONDS', '32'))
+        self.max_retry_after = float(os.getenv('GOOGLE_API_MAX_RETRY_AFTER_SECONDS', '120'))
+        self.retry_budget = RetryBudget(
+            ratio=float(os.getenv('GOOGLE_API_RETRY_BUDGET_RATIO', '0.2')),
+            reserve=float(os.getenv('GOOGLE_API_RETRY_BUDGET_RESERVE', '10'))
+        )
+        self._buckets = {}
+
+    def bucket(self, api: str) -> TokenBucket:
+        if api not in self._buckets:
+            default_rate, default_burst = DEFAULT_RATES.get(api, (10.0, 20))
+            self._buckets[api] = TokenBucket(
+                rate=float(os.getenv(f'GOOGLE_{api.upper()}_RATE_PER_SECOND', str(default_rate))),
+                capacity=float(os.getenv(f'GOOGLE_{api.upper()}_BURST', str(default_burst)))
+            )
+        return self._buckets[api]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, api: str, fn: Callable[[], Awaitable], cost: float = 1, label: str = None,
+                   idempotent: bool = True):
+        """Await ``fn()`` under the ``api`` rate limit, retrying transient failures"""
+        bucket = self.bucket(api)
+        label = label or api
+        self.retry_budget.deposit()
+
+        attempt = 0
+        while True:
+            throttle_wait.observe(await bucket.acquire(cost), api=api)
+            try:
+                return await fn()
+            except Exception as e:
+                reason = retry_reason(e, idempotent)
+                if reason is None or attempt >= self.max_retries:
+                    raise
+
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    raise
+                if not self.retry_budget.withdraw():
+                    retry_budget_exhausted.inc(api=api)
+                    logger.warning(f"Retry budget exhausted, not retrying {label}: {str(e)}")
+                    raise
+
+                delay = self._backoff(attempt)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                if reason in ('429', 'rate_limit'):
+                    # The quota applies to every caller of this API
+                    bucket.pause(delay)
+
+                attempt += 1
+                retries_total.inc(api=api, reason=reason)
+                logger.warning(f"{label} failed ({reason}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+# Shared by every Google API call in the process
+google_rate_limiter = GoogleAPIRateLimiter()
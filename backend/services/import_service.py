@@ -0,0 +1,196 @@
+import os
+import csv
+import io
+import json
+import asyncio
+import zipfile
+from itertools import islice
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from pydantic import ValidationError
+from models import AgentRegistration
+from services.file_service import MAX_CV_SIZE, detect_cv_type
+from services.outbox_service import JOB_DRIVE, JOB_SHEETS_BATCH, NOTIFICATION_JOB_TYPES, REGISTRATION_JOB_DEPENDENCIES
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Column names accepted besides the AgentRegistration field names
+FIELD_ALIASES = {
+    'fullName': 'full_name',
+    'geographicArea': 'geographic_area',
+    'mainSector': 'main_sector',
+    'cv': 'cv_filename'
+}
+
+IMPORT_FIELDS = ['full_name', 'email', 'geographic_area', 'main_sector', 'language', 'cv_filename']
+
+class ImportFileError(Exception):
+    """Raised when a rows file or CV archive cannot be read at all"""
+
+def _take(rows: Iterator, count: int) -> List:
+    return list(islice(rows, count))
+
+class ImportService:
+    def __init__(self, db_service, file_service):
+        self.db_service = db_service
+        self.file_service = file_service
+        self.batch_size = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+    
+    def iter_rows(self, rows_file, filename: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        """Yield (row number, fields, parse error) from a CSV or NDJSON file.
+
+        Malformed rows are yielded as errors. Raises ImportFileError if the
+        file is not UTF-8 text; a decoding error further in ends the rows
+        with an error row instead.
+        """
+        text = io.TextIOWrapper(rows_file, encoding='utf-8-sig', newline='')
+        rows = self._iter_csv_rows(text) if filename.lower().endswith('.csv') else self._iter_ndjson_rows(text)
+        last_row = 0
+        try:
+            for row_number, row, parse_error in rows:
+                last_row = row_number
+                yield row_number, row, parse_error
+        except UnicodeDecodeError as e:
+            if not last_row:
+                raise ImportFileError(f"Rows file is not UTF-8: {str(e)}")
+            yield last_row + 1, None, f"Invalid UTF-8, rest of the file skipped: {str(e)}"
+    
+    def _iter_ndjson_rows(self, text) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        for row_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row is not a JSON object")
+                yield row_number, row, None
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {str(e)}"
+    
+    def _iter_csv_rows(self, text) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+        reader = csv.DictReader(text)
+        row_number = 0
+        while True:
+            row_number += 1
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # The reader resumes at the next line
+                yield row_number, None, f"Invalid CSV: {str(e)}"
+                continue
+            yield row_number, row, None
+    
+    def _open_archive(self, cvs_file) -> Tuple[zipfile.ZipFile, dict]:
+        try:
+            archive = zipfile.ZipFile(cvs_file)
+        except zipfile.BadZipFile as e:
+            raise ImportFileError(f"CV archive is not a valid zip: {str(e)}")
+        members = {Path(info.filename).name: info for info in archive.infolist() if not info.is_dir()}
+        return archive, members
+    
+    def _read_cv(self, archive: Optional[zipfile.ZipFile], members: dict, cv_filename: str) -> bytes:
+        info = members.get(Path(cv_filename).name)
+        if not archive or not info:
+            raise ValueError(f"CV not found in zip: {cv_filename}")
+        if info.file_size > MAX_CV_SIZE:
+            raise ValueError(f"CV too large: {cv_filename}")
+        
+        try:
+            content = archive.read(info)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError) as e:
+            raise ValueError(f"Could not extract CV {cv_filename}: {str(e)}")
+        if not detect_cv_type(content):
+            raise ValueError(f"CV is not a PDF, DOC or DOCX: {cv_filename}")
+        return content
+    
+    async def import_registrations(self, rows_file, rows_filename: str, cvs_file=None, notify: bool = False) -> dict:
+        """Validate, store and enqueue side effects for a bulk list of agents, batch by batch.
+
+        Parsing and CV extraction run in worker threads, one batch of rows at
+        a time, so a large import does not stall the event loop. Raises
+        ImportFileError if the rows file or the zip cannot be read at all.
+        """
+        archive, members = None, {}
+        if cvs_file:
+            archive, members = await asyncio.to_thread(self._open_archive, cvs_file)
+        
+        job_types = [JOB_DRIVE] + (NOTIFICATION_JOB_TYPES if notify else [])
+        results = []
+        batch = []
+        
+        async def flush():
+            registrations = [registration for _, registration in batch]
+            errors = await self.db_service.save_registrations_bulk(
+                registrations, job_types, [JOB_SHEETS_BATCH], REGISTRATION_JOB_DEPENDENCIES
+            )
+            for (row_number, registration), error in zip(batch, errors):
+                if error:
+                    if registration.cv_file_path and os.path.exists(registration.cv_file_path):
+                        os.remove(registration.cv_file_path)
+                    results.append({"row": row_number, "status": "error", "error": error})
+                else:
+                    results.append({"row": row_number, "status": "imported", "registration_id": registration.id})
+            batch.clear()
+        
+        try:
+            rows = self.iter_rows(rows_file, rows_filename)
+            while True:
+                chunk = await asyncio.to_thread(_take, rows, self.batch_size)
+                if not chunk:
+                    break
+                for row_number, row, parse_error in chunk:
+                    await self._import_row(row_number, row, parse_error, archive, members, results, batch)
+                    if len(batch) >= self.batch_size:
+                        await flush()
+            
+            if batch:
+                await flush()
+        finally:
+            if archive:
+                archive.close()
+        
+        imported = sum(1 for result in results if result["status"] == "imported")
+        logger.info(f"Bulk import finished: {imported}/{len(results)} rows imported")
+        return {
+            "total_rows": len(results),
+            "imported": imported,
+            "failed": len(results) - imported,
+            "results": sorted(results, key=lambda result: result["row"])
+        }
+    
+    async def _import_row(self, row_number: int, row: Optional[dict], parse_error: Optional[str],
+                          archive: Optional[zipfile.ZipFile], members: dict, results: List[dict], batch: List):
+        """Validate one row and store its CV; appends it to ``batch`` or its error to ``results``"""
+        if parse_error:
+            results.append({"row": row_number, "status": "error", "error": parse_error})
+            return
+        
+        try:
+            fields = {FIELD_ALIASES.get(key, key): value for key, value in row.items()}
+            fields = {key: fields[key] for key in IMPORT_FIELDS if fields.get(key)}
+            registration = AgentRegistration(**fields)
+            
+            if registration.cv_filename:
+                cv_content = await asyncio.to_thread(self._read_cv, archive, members, registration.cv_filename)
+                registration.cv_file_path = await self.file_service.save_cv_file(
+                    cv_content, registration.cv_filename, registration.email
+                )
+                if not registration.cv_file_path:
+                    raise ValueError(f"Could not store CV: {registration.cv_filename}")
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            results.append({"row": row_number, "status": "error", "error": errors})
+            return
+        except ValueError as e:
+            results.append({"row": row_number, "status": "error", "error": str(e)})
+            return
+        
+        batch.append((row_number, registration))
@@ -0,0 +1,195 @@
+import os
+import time
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from dotenv import load_dotenv
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Index options compared with the declared ones, with MongoDB's defaults
+COMPARED_OPTIONS = {'unique': False, 'sparse': False, 'partialFilterExpression': None, 'expireAfterSeconds': None}
+
+
+def declared_indexes(idempotency_ttl_seconds: int) -> List[dict]:
+    """Indexes the DatabaseService queries rely on, by collection"""
+    return [
+        # get_registration, update_registration_drive_info, get_registrations_by_ids
+        {'collection': 'agent_registrations', 'name': 'id_unique',
+         'keys': [('id', ASCENDING)], 'options': {'unique': True}},
+        # Listings, exports and keyset pages, newest first
+        {'collection': 'agent_registrations', 'name': 'timestamp_id_desc',
+         'keys': [('timestamp', DESCENDING), ('id', DESCENDING)]},
+        # Registrations whose outbox jobs still have to be enqueued (recovery sweep)
+        {'collection': 'agent_registrations', 'name': 'pending_outbox_jobs',
+         'keys': [('timestamp', ASCENDING)],
+         'options': {'partialFilterExpression': {'pending_outbox_jobs': {'$exists': True}}}},
+        {'collection': 'agent_registrations', 'name': 'email',
+         'keys': [('email', ASCENDING)]},
+        # Registrations are saved with cv_drive_id=None until uploaded, so a
+        # sparse index would still hold every document; only index real ids
+        {'collection': 'agent_registrations', 'name': 'cv_drive_id_set',
+         'keys': [('cv_drive_id', ASCENDING)],
+         'options': {'partialFilterExpression': {'cv_drive_id': {'$type': 'string'}}}},
+
+        # Outbox: job updates by id, claiming, per-registration fan-out, digests
+        {'collection': 'registration_jobs', 'name': 'id_unique',
+         'keys': [('id', ASCENDING)], 'options': {'unique': True}},
+        {'collection': 'registration_jobs', 'name': 'status_next_attempt',
+         'keys': [('status', ASCENDING), ('next_attempt_at', ASCENDING)]},
+        {'collection': 'registration_jobs', 'name': 'status_lease',
+         'keys': [('status', ASCENDING), ('lease_expires_at', ASCENDING)]},
+        {'collection': 'registration_jobs', 'name': 'claim_id',
+         'keys': [('claim_id', ASCENDING)], 'options': {'sparse': True}},
+        {'collection': 'registration_jobs', 'name': 'registration_status',
+         'keys': [('registration_id', ASCENDING), ('status', ASCENDING)]},
+        {'collection': 'registration_jobs', 'name': 'type_created_desc',
+         'keys': [('type', ASCENDING), ('created_at', DESCENDING)]},
+        {'collection': 'registration_jobs', 'name': 'type_digest_job',
+         'keys': [('type', ASCENDING), ('digest_job_id', ASCENDING)]},
+
+        # Idempotency records expire after IDEMPOTENCY_TTL_SECONDS
+        {'collection': 'registration_idempotency', 'name': 'created_at_ttl',
+         'keys': [('created_at', ASCENDING)], 'options': {'expireAfterSeconds': idempotency_ttl_seconds}},
+    ]
+
+
+class IndexManager:
+    """Creates the declared MongoDB indexes in the background at startup.
+
+    Each index is reported as ``pending``, ``exists``, ``created``,
+    ``updated``, ``mismatched``, ``rebuilt`` or ``failed`` (with the error); a
+    failed build is logged and left for the next start instead of stopping
+    the app. An index already present under another name with the same keys
+    counts as existing if its options match. A changed TTL is applied in
+    place; other option changes are reported as ``mismatched`` with the
+    differences, or dropped and rebuilt when MONGO_REBUILD_MISMATCHED_INDEXES=true.
+    """
+
+    def __init__(self, db_service, idempotency_ttl_seconds: int):
+        self.db = db_service.db
+        self.enabled = os.getenv('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
+        self.rebuild_mismatched = os.getenv('MONGO_REBUILD_MISMATCHED_INDEXES', 'false').lower() == 'true'
+        self.indexes = declared_indexes(idempotency_ttl_seconds)
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._results = {self._key(spec): self._result(spec, 'pending') for spec in self.indexes}
+        self._task = None
+
+    @staticmethod
+    def _key(spec: dict):
+        return spec['collection'], spec['name']
+
+    @staticmethod
+    def _result(spec: dict, status: str, **extra) -> dict:
+        return {'collection': spec['collection'], 'name': spec['name'],
+                'keys': [list(key) for key in spec['keys']], 'status': status, **extra}
+
+    async def start(self):
+        """Start building missing indexes (no-op if MONGO_ENSURE_INDEXES=false)"""
+        if not self.enabled:
+            logger.info("Index provisioning disabled (MONGO_ENSURE_INDEXES=false)")
+            return
+        self._task = asyncio.create_task(self.ensure_indexes())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def ensure_indexes(self) -> dict:
+        """Create every declared index that is missing and return the status report"""
+        self.started_at = datetime.utcnow()
+        self.finished_at = None
+        existing = {}
+        for spec in self.indexes:
+            collection = spec['collection']
+            try:
+                if collection not in existing:
+                    existing[collection] = await self.db[collection].index_information()
+                self._results[self._key(spec)] = await self._ensure(spec, existing[collection])
+            except PyMongoError as e:
+                logger.error(f"Failed to build index {collection}.{spec['name']}: {str(e)}")
+                self._results[self._key(spec)] = self._result(spec, 'failed', error=str(e))
+        self.finished_at = datetime.utcnow()
+
+        report = self.status()
+        logger.info(f"MongoDB indexes ready: {report['counts']}")
+        return report
+
+    @staticmethod
+    def _differences(spec: dict, info: dict) -> dict:
+        """Options of an existing index that differ from the declared ones"""
+        declared = spec.get('options', {})
+        differences = {}
+        for option, default in COMPARED_OPTIONS.items():
+            existing_value, declared_value = info.get(option, default), declared.get(option, default)
+            if existing_value != declared_value:
+                differences[option] = {'existing': existing_value, 'declared': declared_value}
+        return differences
+
+    async def _ensure(self, spec: dict, existing: dict) -> dict:
+        keys = [tuple(key) for key in spec['keys']]
+        for name, info in existing.items():
+            if [tuple(key) for key in info['key']] == keys:
+                differences = self._differences(spec, info)
+                if not differences:
+                    return self._result(spec, 'exists', existing_name=name)
+                return await self._reconcile(spec, name, differences)
+
+        build_ms = await self._create(spec)
+        logger.info(f"Created index {spec['collection']}.{spec['name']} in {build_ms}ms")
+        return self._result(spec, 'created', build_ms=build_ms)
+
+    async def _create(self, spec: dict) -> int:
+        started = time.monotonic()
+        await self.db[spec['collection']].create_index(
+            [tuple(key) for key in spec['keys']], name=spec['name'], **spec.get('options', {})
+        )
+        return int((time.monotonic() - started) * 1000)
+
+    async def _reconcile(self, spec: dict, name: str, differences: dict) -> dict:
+        """Bring an existing index whose options changed in line with its declaration"""
+        collection = spec['collection']
+        ttl = differences.get('expireAfterSeconds')
+        if set(differences) == {'expireAfterSeconds'} and ttl['existing'] is not None and ttl['declared'] is not None:
+            # A TTL change does not need a rebuild
+            await self.db.command('collMod', collection, index={'name': name, 'expireAfterSeconds': ttl['declared']})
+            logger.info(f"Updated TTL of index {collection}.{name} to {ttl['declared']}s")
+            return self._result(spec, 'updated', existing_name=name, differences=differences)
+
+        if not self.rebuild_mismatched:
+            logger.warning(f"Index {collection}.{name} differs from its declaration: {differences} "
+                           f"(set MONGO_REBUILD_MISMATCHED_INDEXES=true to rebuild it)")
+            return self._result(spec, 'mismatched', existing_name=name, differences=differences)
+
+        await self.db[collection].drop_index(name)
+        build_ms = await self._create(spec)
+        logger.info(f"Rebuilt index {collection}.{spec['name']} in {build_ms}ms: {differences}")
+        return self._result(spec, 'rebuilt', existing_name=name, differences=differences, build_ms=build_ms)
+
+    def status(self) -> dict:
+        """Per-index build status with totals by status"""
+        indexes = list(self._results.values())
+        counts = {}
+        for result in indexes:
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+        return {
+            'enabled': self.enabled,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'counts': counts,
+            'indexes': indexes
+        }
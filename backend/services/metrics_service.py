@@ -0,0 +1,221 @@
+import time
+import threading
+import functools
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._values: Dict[Tuple[str, ...], object] = {}
+    
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    
+    def __init__(self, name, documentation, labelnames, lock):
+        super().__init__(name, documentation, labelnames, lock)
+        if not self.labelnames:
+            self._values[()] = 0.0
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+    
+    def __init__(self, name, documentation, labelnames, lock):
+        super().__init__(name, documentation, labelnames, lock)
+        if not self.labelnames:
+            self._values[()] = 0.0
+    
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+    
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+    
+    def render(self) -> List[str]:
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, documentation, labelnames, lock, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+    
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+    
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state["counts"]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state["sum"])}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {state["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+    
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, self._lock))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, self._lock))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, self._lock, buckets))
+    
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback that refreshes gauges right before each scrape"""
+        self._collectors.append(collector)
+    
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+        
+        lines = []
+        with self._lock:
+            for metric in self._metrics.values():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+stage_duration = metrics.histogram(
+    'pymetra_stage_duration_seconds',
+    'Duration of registration pipeline stages (file save, Mongo, Sheets, Drive, Gmail, SMTP)',
+    ['stage', 'outcome']
+)
+stages_in_flight = metrics.gauge(
+    'pymetra_stage_in_flight',
+    'Stage calls currently running',
+    ['stage']
+)
+http_requests_total = metrics.counter(
+    'pymetra_http_requests_total',
+    'HTTP requests by route and status code',
+    ['method', 'route', 'status']
+)
+http_request_duration = metrics.histogram(
+    'pymetra_http_request_duration_seconds',
+    'HTTP request latency by route',
+    ['method', 'route']
+)
+http_requests_in_flight = metrics.gauge(
+    'pymetra_http_requests_in_flight',
+    'HTTP requests currently being served',
+    ['method', 'route']
+)
+
+
+def timed_stage(stage: str, succeeded: Optional[Callable[[Any], bool]] = None):
+    """Time an async stage; raising or returning False/None counts as an error outcome.
+
+    ``succeeded`` judges the result instead, e.g. ``all`` for per-item results.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            outcome = 'error'
+            started = time.monotonic()
+            stages_in_flight.inc(stage=stage)
+            try:
+                result = await fn(*args, **kwargs)
+                if succeeded is not None:
+                    ok = succeeded(result)
+                else:
+                    ok = result is not None and result is not False
+                if ok:
+                    outcome = 'ok'
+                return result
+            finally:
+                stages_in_flight.dec(stage=stage)
+                stage_duration.observe(time.monotonic() - started, stage=stage, outcome=outcome)
+        return wrapper
+    return decorator
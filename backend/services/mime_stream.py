@@ -0,0 +1,146 @@
+import os
+import base64
+import uuid
+import tempfile
+from email.header import Header
+from email.mime.text import MIMEText
+from email.policy import SMTP
+from email.utils import encode_rfc2231, formatdate, make_msgid
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple, Union
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Attachments larger than this are replaced by a link in the email body. Kept
+# below MAX_CV_SIZE (5 MB) so large CVs are linked; base64 adds a third on the wire
+ATTACHMENT_MAX_BYTES = int(os.getenv('EMAIL_ATTACHMENT_MAX_BYTES', str(3 * 1024 * 1024)))
+
+# Base URL of this API, used to link CVs too large to attach that are not in Drive
+PUBLIC_BASE_URL = os.getenv('PUBLIC_BASE_URL', '').rstrip('/')
+
+# Messages spill from memory to a temporary file past this size
+SPOOL_MAX_MEMORY = int(os.getenv('EMAIL_SPOOL_MAX_MEMORY', str(1024 * 1024)))
+
+# 57 input bytes encode to one 76-character base64 line
+_BASE64_READ_SIZE = 57 * 1024
+
+
+def attachment_fits(path: Optional[str]) -> bool:
+    """Whether a local file exists and is small enough to attach"""
+    return bool(path) and os.path.exists(path) and os.path.getsize(path) <= ATTACHMENT_MAX_BYTES
+
+
+def cv_link(registration) -> Optional[str]:
+    """Where to fetch a CV that is not attached: Drive, else the admin download route"""
+    if registration.cv_drive_link:
+        return registration.cv_drive_link
+    if PUBLIC_BASE_URL and registration.cv_file_path:
+        return f"{PUBLIC_BASE_URL}/admin/download-cv/{registration.id}"
+    return None
+
+
+def _header(value: str) -> str:
+    try:
+        value.encode('ascii')
+        return value
+    except UnicodeEncodeError:
+        return Header(value, 'utf-8').encode(linesep='\r\n')
+
+
+def _filename_param(filename: str) -> str:
+    filename = filename.replace('"', '').replace('\r', '').replace('\n', '')
+    try:
+        filename.encode('ascii')
+        return f'filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"filename*={encode_rfc2231(filename, 'utf-8')}"
+
+
+class StreamedMIMEMessage:
+    """multipart/mixed email written straight to a stream.
+
+    Attachments are read from disk and base64-encoded chunk by chunk while the
+    message is written, so building a message never holds a whole attachment
+    (or its encoded copy) in memory. Lines end in CRLF, ready for SMTP.
+    """
+
+    def __init__(self, headers: List[Tuple[str, str]], body_text: str):
+        self.headers = headers
+        self.body_text = body_text
+        self.attachments = []
+        self.boundary = f"=={uuid.uuid4().hex}=="
+
+    def attach(self, source: Union[str, BinaryIO], filename: str, mimetype: str = 'application/octet-stream'):
+        """Attach a file path or a readable binary file object (closed by ``close``)"""
+        self.attachments.append((source, filename, mimetype))
+    
+    def close(self):
+        for source, _, _ in self.attachments:
+            if not isinstance(source, (str, Path)):
+                source.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_attachment(self, fp: BinaryIO, source: Union[str, BinaryIO]):
+        handle = open(source, 'rb') if isinstance(source, (str, Path)) else source
+        handle.seek(0)
+        try:
+            while True:
+                chunk = handle.read(_BASE64_READ_SIZE)
+                if not chunk:
+                    break
+                fp.write(base64.encodebytes(chunk).replace(b'\n', b'\r\n'))
+        finally:
+            if handle is not source:
+                handle.close()
+
+    def write_to(self, fp: BinaryIO):
+        headers = [
+            ('Date', formatdate(localtime=True)),
+            ('Message-ID', make_msgid(domain='pymetra.com')),
+            *self.headers,
+            ('MIME-Version', '1.0'),
+            ('Content-Type', f'multipart/mixed; boundary="{self.boundary}"')
+        ]
+        for name, value in headers:
+            fp.write(f"{name}: {_header(value)}\r\n".encode('ascii'))
+        fp.write(b"\r\n")
+
+        boundary = f"--{self.boundary}\r\n".encode('ascii')
+        fp.write(boundary)
+        text_part = MIMEText(self.body_text, 'plain', 'utf-8')
+        del text_part['MIME-Version']
+        fp.write(text_part.as_bytes(policy=SMTP))
+        fp.write(b"\r\n")
+
+        for source, filename, mimetype in self.attachments:
+            fp.write(boundary)
+            fp.write((
+                f"Content-Type: {mimetype}\r\n"
+                f"Content-Transfer-Encoding: base64\r\n"
+                f"Content-Disposition: attachment; {_filename_param(filename)}\r\n\r\n"
+            ).encode('ascii'))
+            self._write_attachment(fp, source)
+
+        fp.write(f"--{self.boundary}--\r\n".encode('ascii'))
+
+    def spool(self) -> tempfile.SpooledTemporaryFile:
+        """The whole message in a rewound spooled file (on disk past EMAIL_SPOOL_MAX_MEMORY)"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        try:
+            self.write_to(spooled)
+            spooled.seek(0)
+        except Exception:
+            spooled.close()
+            raise
+        return spooled
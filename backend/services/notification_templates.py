@@ -0,0 +1,233 @@
+import os
+from string import Formatter
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+from models import AgentRegistration
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "━" * 40
+
+# Language used when a registration's language has no templates, and for digests
+DEFAULT_LANGUAGE = os.getenv('NOTIFICATION_DEFAULT_LANGUAGE', 'es')
+
+TEMPLATES = {
+    'es': {
+        'registration_subject': 'Nuevo registro Pymetra - {full_name}',
+        'registration_body': """
+Nuevo agente registrado en Pymetra:
+
+Información del agente:
+{separator}
+• Nombre: {full_name}
+• Email: {email}
+• Zona geográfica: {geographic_area}
+• Sector principal: {main_sector}
+• Idioma: {language}
+• Fecha de registro: {timestamp}
+
+{cv_section}{separator}
+Sistema de registro automático Pymetra
+""",
+        'cv_drive': """• CV en Google Drive: {web_link}
+• Nombre del archivo: {filename}
+
+""",
+        'cv_attached': """El CV se encuentra adjunto a este correo.
+
+""",
+        'cv_link': """• CV (demasiado grande para adjuntar): {link}
+
+""",
+        'digest_subject': 'Resumen de registros Pymetra - {count} nuevos agentes',
+        'digest_body': """
+Nuevos agentes registrados en Pymetra ({period}):
+
+{separator}
+{entries}
+{separator}
+
+Total: {count} registros
+Sistema de registro automático Pymetra
+""",
+        'digest_entry': """• {full_name} <{email}>
+  Zona geográfica: {geographic_area}
+  Sector principal: {main_sector}
+  Idioma: {language}
+  Fecha de registro: {timestamp}
+  CV: {cv}""",
+        'digest_cv_attached': 'Adjunto en cvs.zip',
+        'not_available': 'No disponible',
+    },
+    'en': {
+        'registration_subject': 'New Pymetra registration - {full_name}',
+        'registration_body': """
+New agent registered on Pymetra:
+
+Agent details:
+{separator}
+• Name: {full_name}
+• Email: {email}
+• Geographic area: {geographic_area}
+• Main sector: {main_sector}
+• Language: {language}
+• Registered on: {timestamp}
+
+{cv_section}{separator}
+Pymetra automatic registration system
+""",
+        'cv_drive': """• CV on Google Drive: {web_link}
+• File name: {filename}
+
+""",
+        'cv_attached': """The CV is attached to this email.
+
+""",
+        'cv_link': """• CV (too large to attach): {link}
+
+""",
+        'digest_subject': 'Pymetra registrations summary - {count} new agents',
+        'digest_body': """
+New agents registered on Pymetra ({period}):
+
+{separator}
+{entries}
+{separator}
+
+Total: {count} registrations
+Pymetra automatic registration system
+""",
+        'digest_entry': """• {full_name} <{email}>
+  Geographic area: {geographic_area}
+  Main sector: {main_sector}
+  Language: {language}
+  Registered on: {timestamp}
+  CV: {cv}""",
+        'digest_cv_attached': 'Attached in cvs.zip',
+        'not_available': 'Not available',
+    }
+}
+
+TIMESTAMP_FORMAT = '%d/%m/%Y %H:%M'
+
+
+class CompiledTemplate:
+    """A template parsed once into literal chunks and field slots.
+
+    ``render`` only looks fields up and joins; constants such as the
+    separator are folded into the literals at compile time.
+    """
+
+    def __init__(self, text: str, constants: Optional[dict] = None):
+        constants = constants or {}
+        parts = []
+        literal = []
+        for text_chunk, field, _, _ in Formatter().parse(text):
+            literal.append(text_chunk)
+            if field is None:
+                continue
+            if field in constants:
+                literal.append(constants[field])
+            else:
+                parts.append((''.join(literal), field))
+                literal = []
+        self._parts = tuple(parts)
+        self._tail = ''.join(literal)
+        self.fields = frozenset(field for _, field in parts)
+
+    def render(self, values: dict) -> str:
+        chunks = []
+        for literal, field in self._parts:
+            chunks.append(literal)
+            chunks.append(values[field])
+        chunks.append(self._tail)
+        return ''.join(chunks)
+
+
+class NotificationTemplates:
+    """Notification texts compiled per language, shared by SMTP, Gmail and digests"""
+
+    def __init__(self, templates: dict = TEMPLATES):
+        constants = {'separator': SEPARATOR}
+        self._compiled = {
+            language: {name: CompiledTemplate(text, constants) for name, text in texts.items()}
+            for language, texts in templates.items()
+        }
+        if DEFAULT_LANGUAGE not in self._compiled:
+            raise ValueError(f"No notification templates for default language {DEFAULT_LANGUAGE}")
+        logger.info(f"Notification templates compiled for: {', '.join(self._compiled)}")
+
+    @property
+    def languages(self) -> List[str]:
+        return list(self._compiled)
+
+    def _language(self, language: Optional[str]) -> dict:
+        return self._compiled.get(language) or self._compiled[DEFAULT_LANGUAGE]
+
+    @staticmethod
+    def _registration_values(registration: AgentRegistration) -> dict:
+        return {
+            'full_name': registration.full_name,
+            'email': registration.email,
+            'geographic_area': registration.geographic_area,
+            'main_sector': registration.main_sector,
+            'language': registration.language,
+            'timestamp': registration.timestamp.strftime(TIMESTAMP_FORMAT)
+        }
+
+    def registration(self, registration: AgentRegistration, drive_file_info: Optional[dict] = None,
+                     cv_attached: bool = False, cv_link: Optional[str] = None) -> Tuple[str, str]:
+        """(subject, body) of a single registration notification, in the agent's language.
+
+        The CV is described by its Drive file, as attached, or by ``cv_link``
+        when it was too large to attach, in that order.
+        """
+        templates = self._language(registration.language)
+        values = self._registration_values(registration)
+        if drive_file_info:
+            not_available = templates['not_available'].render({})
+            values['cv_section'] = templates['cv_drive'].render({
+                'web_link': drive_file_info.get('web_link') or not_available,
+                'filename': drive_file_info.get('filename') or not_available
+            })
+        elif cv_attached:
+            values['cv_section'] = templates['cv_attached'].render({})
+        elif cv_link:
+            values['cv_section'] = templates['cv_link'].render({'link': cv_link})
+        else:
+            values['cv_section'] = ''
+        return templates['registration_subject'].render(values), templates['registration_body'].render(values)
+
+    def digest(self, registrations: Iterable[AgentRegistration], period: str,
+               attached_ids: Iterable[str] = (), links: Optional[dict] = None) -> Tuple[str, str]:
+        """(subject, body) of a digest summary listing ``registrations``.
+
+        ``links`` maps registration ids to CV links for CVs not in the attachment.
+        """
+        links = links or {}
+        templates = self._language(DEFAULT_LANGUAGE)
+        attached = set(attached_ids)
+        attached_text = templates['digest_cv_attached'].render({})
+        not_available = templates['not_available'].render({})
+
+        entries = []
+        for registration in registrations:
+            values = self._registration_values(registration)
+            if registration.id in attached:
+                values['cv'] = attached_text
+            else:
+                values['cv'] = links.get(registration.id) or not_available
+            entries.append(templates['digest_entry'].render(values))
+
+        values = {'count': str(len(entries)), 'period': period, 'entries': '\n'.join(entries)}
+        return templates['digest_subject'].render(values), templates['digest_body'].render(values)
+
+
+# Compiled once at import, i.e. at startup
+notification_templates = NotificationTemplates()
@@ -1,11 +1,17 @@
 import os
 import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+from services.google_client_registry import google_client_registry
+from services.google_http_pool import google_http_pool
 import logging
 
 # Load environment variables
@@ -14,6 +20,52 @@ load_dotenv(ROOT_DIR / '.env')
 
 logger = logging.getLogger(__name__)
 
+class CredentialCache:
+    """Process-wide credentials shared by every OAuthService instance.
+
+    The credentials file is re-read only when its mtime changes, and its mtime
+    is checked at most every ``check_interval`` seconds, so the hot path is an
+    attribute read. ``generation`` increases every time different credentials
+    are published. ``lock`` serialises reloads and refreshes (single flight).
+    """
+    
+    def __init__(self):
+        self.check_interval = float(os.getenv('OAUTH_CREDENTIALS_CHECK_SECONDS', '5'))
+        self.lock = threading.RLock()
+        self.credentials = None
+        self.generation = 0
+        self._mtime = None
+        self._checked_at = None
+    
+    def get(self, credentials_file: Path, loader):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return self.credentials
+        
+        with self.lock:
+            try:
+                mtime = credentials_file.stat().st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+            
+            if mtime != self._mtime:
+                self.credentials = loader() if mtime is not None else None
+                self._mtime = mtime
+                self.generation += 1
+                logger.info(f"OAuth credentials (re)loaded, generation {self.generation}")
+            self._checked_at = now
+            return self.credentials
+    
+    def publish(self, credentials, credentials_file: Path):
+        """Atomically replace the cached credentials after they were written to disk"""
+        with self.lock:
+            self.credentials = credentials
+            self._mtime = credentials_file.stat().st_mtime_ns
+            self._checked_at = time.monotonic()
+            self.generation += 1
+
+credential_cache = CredentialCache()
+
 class OAuthService:
     def __init__(self):
         self.client_id = os.getenv('GOOGLE_CLIENT_ID')
@@ -98,11 +150,16 @@ class OAuthService:
                 'token_uri': credentials.token_uri,
                 'client_id': credentials.client_id,
                 'client_secret': credentials.client_secret,
-                'scopes': credentials.scopes
+                'scopes': credentials.scopes,
+                'expiry': credentials.expiry.isoformat() if credentials.expiry else None
             }
             
-            with open(self.credentials_file, 'w') as f:
+            # Write then rename so readers never see a partial file
+            temp_file = self.credentials_file.with_suffix('.json.tmp')
+            with open(temp_file, 'w') as f:
                 json.dump(creds_data, f)
+            os.replace(temp_file, self.credentials_file)
+            credential_cache.publish(credentials, self.credentials_file)
                 
             logger.info("Credentials saved successfully")
             
@@ -110,28 +167,55 @@ class OAuthService:
             logger.error(f"Error saving credentials: {str(e)}")
             raise
     
+    def _read_credentials_file(self):
+        with open(self.credentials_file, 'r') as f:
+            creds_data = json.load(f)
+        
+        credentials = Credentials(
+            token=creds_data['token'],
+            refresh_token=creds_data.get('refresh_token'),
+            token_uri=creds_data['token_uri'],
+            client_id=creds_data['client_id'],
+            client_secret=creds_data['client_secret'],
+            scopes=creds_data['scopes']
+        )
+        if creds_data.get('expiry'):
+            credentials.expiry = datetime.fromisoformat(creds_data['expiry'])
+        return credentials
+    
+    def refresh_credentials(self, stale_credentials, force: bool = False):
+        """Refresh credentials; concurrent callers wait for a single refresh.
+
+        The refresh runs on a copy that is then published as a whole, so other
+        users never observe a half-updated token/expiry pair.
+        """
+        with credential_cache.lock:
+            credentials = credential_cache.credentials or stale_credentials
+            if not force and not credentials.expired:
+                # Another caller refreshed while we waited
+                return credentials
+            
+            refreshed = Credentials(
+                token=credentials.token,
+                refresh_token=credentials.refresh_token,
+                token_uri=credentials.token_uri,
+                client_id=credentials.client_id,
+                client_secret=credentials.client_secret,
+                scopes=credentials.scopes
+            )
+            refreshed.refresh(Request())
+            self.save_credentials(refreshed)
+            logger.info("OAuth access token refreshed")
+            return refreshed
+    
     def load_credentials(self):
-        """Load credentials from file"""
+        """Load credentials from the process-wide cache"""
         try:
-            if not self.credentials_file.exists():
-                return None
-                
-            with open(self.credentials_file, 'r') as f:
-                creds_data = json.load(f)
-            
-            credentials = Credentials(
-                token=creds_data['token'],
-                refresh_token=creds_data.get('refresh_token'),
-                token_uri=creds_data['token_uri'],
-                client_id=creds_data['client_id'],
-                client_secret=creds_data['client_secret'],
-                scopes=creds_data['scopes']
-            )
+            credentials = credential_cache.get(self.credentials_file, self._read_credentials_file)
             
             # Refresh token if expired
-            if credentials.expired:
-                credentials.refresh(Request())
-                self.save_credentials(credentials)
+            if credentials is not None and credentials.expired:
+                credentials = self.refresh_credentials(credentials)
             
             return credentials
             
@@ -145,9 +229,23 @@ class OAuthService:
         return credentials is not None and not credentials.expired
     
     def get_service(self, service_name, version):
-        """Get authenticated Google API service"""
+        """Get authenticated Google API service (shared client, rebuilt when credentials rotate)"""
         credentials = self.load_credentials()
         if not credentials:
             raise Exception("Not authenticated. Need to complete OAuth flow first.")
             
-        return build(service_name, version, credentials=credentials)
\ No newline at end of file
+        return google_client_registry.get(service_name, version, credentials, credential_cache.generation)
+    
+    @contextmanager
+    def authorized_http(self):
+        """Authorized keep-alive transport for executing a request of a shared client.
+
+        httplib2 is not thread-safe, so each executor call checks a transport
+        out of the shared pool instead of using the client's own.
+        """
+        credentials = self.load_credentials()
+        if not credentials:
+            raise Exception("Not authenticated. Need to complete OAuth flow first.")
+        
+        with google_http_pool.connection() as http:
+            yield AuthorizedHttp(credentials, http=http)
\ No newline at end of file
@@ -0,0 +1,382 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from services.fanout_service import FanOutService
+from services.sheets_appender import SheetsAppender
+from services.gmail_batch_sender import GmailBatchSender
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Side effects written to the outbox for every registration
+JOB_SHEETS = "sheets"
+JOB_DRIVE = "drive"
+JOB_GMAIL = "gmail"
+JOB_SMTP = "smtp"
+
+# Digest mode: registrations are queued and summarised in one email per window
+JOB_DIGEST_ENTRY = "digest_entry"
+
+# "immediate" notifies every registration through Gmail and SMTP, "digest"
+# sends one summary per DIGEST_WINDOW_MINUTES
+NOTIFICATION_MODE = os.getenv('NOTIFICATION_MODE', 'immediate')
+NOTIFICATION_JOB_TYPES = [JOB_DIGEST_ENTRY] if NOTIFICATION_MODE == 'digest' else [JOB_GMAIL, JOB_SMTP]
+
+REGISTRATION_JOB_TYPES = [JOB_SHEETS, JOB_DRIVE] + NOTIFICATION_JOB_TYPES
+
+# Jobs covering many registrations at once (bulk imports, digests)
+JOB_SHEETS_BATCH = "sheets_batch"
+JOB_DIGEST = "digest"
+
+# Notifications include the Drive link, so they wait for the upload
+REGISTRATION_JOB_DEPENDENCIES = {JOB_GMAIL: JOB_DRIVE, JOB_DIGEST_ENTRY: JOB_DRIVE}
+
+
+class OutboxJobError(Exception):
+    """Raised by a job handler when the integration did not succeed"""
+
+
+class DependencyNotReady(Exception):
+    """Raised when a job's dependency failed in this pass but will be retried"""
+
+
+class OutboxWorker:
+    """Background worker pool draining the registration_jobs outbox with retries"""
+    
+    def __init__(self, db_service, google_service, email_service):
+        self.db_service = db_service
+        self.google_service = google_service
+        self.email_service = email_service
+        self.concurrency = int(os.getenv('OUTBOX_WORKERS', '4'))
+        self.poll_interval = float(os.getenv('OUTBOX_POLL_INTERVAL_SECONDS', '2'))
+        self.lease_seconds = int(os.getenv('OUTBOX_LEASE_SECONDS', '300'))
+        self.max_attempts = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))
+        self.retry_backoff = float(os.getenv('OUTBOX_RETRY_BACKOFF_SECONDS', '10'))
+        self.max_retry_backoff = float(os.getenv('OUTBOX_MAX_RETRY_BACKOFF_SECONDS', '600'))
+        # Registrations whose jobs were saved but not enqueued are recovered after this long
+        self.recovery_interval = float(os.getenv('OUTBOX_RECOVERY_INTERVAL_SECONDS', '60'))
+        self.fanout = FanOutService()
+        self.sheets_appender = SheetsAppender(google_service)
+        self.gmail_sender = GmailBatchSender(google_service)
+        self.handlers = {
+            JOB_DRIVE: self._handle_drive,
+            JOB_SMTP: self._handle_smtp,
+            JOB_DIGEST_ENTRY: self._handle_digest_entry
+        }
+        # Claimed in bulk by one loop per type and written through a shared
+        # batch (handler, batcher), instead of one worker per registration
+        self.bulk_handlers = {
+            JOB_SHEETS: (self._handle_sheets, self.sheets_appender),
+            JOB_GMAIL: (self._handle_gmail, self.gmail_sender)
+        }
+        self.batch_handlers = {
+            JOB_SHEETS_BATCH: self._handle_sheets_batch,
+            JOB_DIGEST: self._handle_digest
+        }
+        self.digest_channel = os.getenv('DIGEST_CHANNEL', 'gmail')
+        self._tasks = []
+        self._settling = {job_type: set() for job_type in self.bulk_handlers}
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+    
+    async def start(self):
+        """Start the worker pool and the bulk loops"""
+        self._stopping = False
+        self._tasks = [
+            asyncio.create_task(self._run(worker_number))
+            for worker_number in range(self.concurrency)
+        ]
+        self._tasks += [asyncio.create_task(self._run_bulk(job_type)) for job_type in self.bulk_handlers]
+        self._tasks.append(asyncio.create_task(self._run_recovery()))
+        logger.info(f"Outbox worker pool started with {self.concurrency} workers, bulk: {', '.join(self.bulk_handlers)}")
+    
+    async def stop(self):
+        """Stop the worker pool; interrupted jobs are reclaimed once their lease expires"""
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Send what the bulk loops already queued and record the outcomes
+        await self.sheets_appender.close()
+        await self.gmail_sender.close()
+        settling = [task for tasks in self._settling.values() for task in tasks]
+        await asyncio.gather(*settling, return_exceptions=True)
+        logger.info("Outbox worker pool stopped")
+    
+    def notify(self):
+        """Wake idle workers after new jobs were enqueued"""
+        self._wakeup.set()
+    
+    async def _run(self, worker_number: int):
+        while not self._stopping:
+            try:
+                job = await self.db_service.claim_next_job(self.lease_seconds, exclude_types=list(self.bulk_handlers))
+                if job:
+                    await self._process(job)
+                    continue
+                await self._idle()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker {worker_number} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+    
+    async def _run_recovery(self):
+        """Enqueue the jobs of registrations whose outbox insert failed after they were saved"""
+        while not self._stopping:
+            await asyncio.sleep(self.recovery_interval)
+            try:
+                recovered = await self.db_service.enqueue_embedded_jobs(self.recovery_interval)
+                if recovered:
+                    logger.warning(f"Enqueued missing outbox jobs for {recovered} registrations")
+                    self.notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox recovery error: {str(e)}")
+    
+    async def _idle(self):
+        # Nothing to do: sleep until notified or the next poll
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _run_bulk(self, job_type: str):
+        """Claim runnable ``job_type`` jobs in bulk and hand them to the type's batcher.
+
+        Up to two batches are kept in flight, so the next batch fills while the
+        previous one is being written; each job is settled from its own result
+        without tying up a worker.
+        """
+        handler, batcher = self.bulk_handlers[job_type]
+        settling = self._settling[job_type]
+        max_in_flight = batcher.batch_size * 2
+        while not self._stopping:
+            try:
+                if len(settling) >= max_in_flight:
+                    await asyncio.wait(settling, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                
+                wanted = max_in_flight - len(settling)
+                jobs = await self.db_service.claim_jobs(job_type, wanted, self.lease_seconds)
+                if not jobs:
+                    await self._idle()
+                    continue
+                
+                registrations = await self.db_service.get_registrations_by_ids([job["registration_id"] for job in jobs])
+                registrations = {registration.id: registration for registration in registrations}
+                for job in jobs:
+                    task = asyncio.create_task(self._settle_bulk(job, registrations.get(job["registration_id"]), handler))
+                    settling.add(task)
+                    task.add_done_callback(settling.discard)
+                if len(jobs) < wanted:
+                    # Queue drained: write now rather than wait for a full batch
+                    batcher.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox {job_type} bulk loop error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+    
+    async def _settle_bulk(self, job: dict, registration, handler):
+        # Same per-integration deadline as the fan-out: a cancelled item is
+        # withdrawn from its batch if the batch has not been sent yet
+        deadline = self.fanout.deadline_for(job["type"])
+        started = time.monotonic()
+        outcome = {"name": job["type"], "ok": False, "result": None, "error": None, "error_type": None, "timed_out": False}
+        try:
+            if not registration:
+                raise OutboxJobError(f"Registration not found: {job['registration_id']}")
+            outcome["result"] = await asyncio.wait_for(handler(registration), timeout=deadline)
+            outcome["ok"] = True
+        except asyncio.TimeoutError:
+            outcome["timed_out"] = True
+            outcome["error"] = f"Deadline of {deadline:g}s exceeded"
+            outcome["error_type"] = asyncio.TimeoutError
+        except Exception as e:
+            outcome["error"] = f"{type(e).__name__}: {str(e)}"
+            outcome["error_type"] = type(e)
+        outcome["elapsed_ms"] = round((time.monotonic() - started) * 1000)
+        
+        try:
+            if await self._record_outcome(job, outcome):
+                if await self.db_service.release_blocked_jobs(job["registration_id"], job["type"]):
+                    self.notify()
+        except Exception as e:
+            # The lease expires and the job is claimed again
+            logger.error(f"Failed to record outbox job {job['id']}: {str(e)}")
+    
+    async def _process(self, job: dict):
+        if job.get("registration_ids") is not None:
+            await self._process_batch(job)
+            return
+        
+        registration_id = job["registration_id"]
+        
+        # Claim the registration's other runnable jobs (and the jobs blocked on
+        # them) so all of its integrations fan out together
+        bulk_types = list(self.bulk_handlers)
+        jobs = [job]
+        jobs += await self.db_service.claim_registration_jobs(
+            registration_id, self.lease_seconds, [job["type"]], exclude_types=bulk_types
+        )
+        jobs += await self.db_service.claim_registration_jobs(
+            registration_id, self.lease_seconds, [claimed["type"] for claimed in jobs], exclude_types=bulk_types
+        )
+        jobs_by_type = {claimed["type"]: claimed for claimed in jobs}
+        logger.info(f"Outbox fan-out for {registration_id}: {', '.join(jobs_by_type)}")
+        
+        registration = await self.db_service.get_registration(registration_id)
+        
+        def make_call(job_type):
+            async def call(upstream):
+                if not registration:
+                    raise OutboxJobError(f"Registration not found: {registration_id}")
+                for dependency, outcome in upstream.items():
+                    if not outcome["ok"] and jobs_by_type[dependency]["attempts"] < self.max_attempts:
+                        raise DependencyNotReady(f"{dependency} will be retried")
+                handler = self.handlers.get(job_type)
+                if not handler:
+                    raise OutboxJobError(f"Unknown job type: {job_type}")
+                return await handler(registration, upstream)
+            return call
+        
+        outcomes = await self.fanout.run(
+            {job_type: make_call(job_type) for job_type in jobs_by_type},
+            {job_type: dependency for job_type, dependency in REGISTRATION_JOB_DEPENDENCIES.items()
+             if job_type in jobs_by_type and dependency in jobs_by_type}
+        )
+        
+        settled_types = [
+            job_type for job_type, claimed in jobs_by_type.items()
+            if await self._record_outcome(claimed, outcomes[job_type])
+        ]
+        
+        for job_type in settled_types:
+            if await self.db_service.release_blocked_jobs(registration_id, job_type):
+                self.notify()
+    
+    async def _process_batch(self, job: dict):
+        registration_ids = job["registration_ids"]
+        logger.info(f"Outbox batch job {job['id']} ({job['type']}) for {len(registration_ids)} registrations")
+        
+        async def call(upstream):
+            handler = self.batch_handlers.get(job["type"])
+            if not handler:
+                raise OutboxJobError(f"Unknown batch job type: {job['type']}")
+            registrations = await self.db_service.get_registrations_by_ids(registration_ids)
+            return await handler(registrations)
+        
+        outcomes = await self.fanout.run({job["type"]: call})
+        await self._record_outcome(job, outcomes[job["type"]])
+    
+    async def _record_outcome(self, job: dict, outcome: dict) -> bool:
+        """Persist a job's fan-out outcome; returns whether the job is settled (done or given up)"""
+        if outcome["ok"]:
+            await self.db_service.complete_job(job["id"], outcome["result"], outcome["elapsed_ms"])
+            return True
+        
+        if outcome["error_type"] is not None and issubclass(outcome["error_type"], DependencyNotReady):
+            # Its dependency will be retried: wait for it again
+            await self.db_service.reblock_job(job["id"])
+            return False
+        
+        if job["attempts"] < self.max_attempts:
+            delay = min(self.retry_backoff * (2 ** (job["attempts"] - 1)), self.max_retry_backoff)
+            await self.db_service.fail_job(
+                job["id"], outcome["error"],
+                datetime.utcnow() + timedelta(seconds=delay), outcome["elapsed_ms"]
+            )
+            logger.warning(f"Outbox job {job['id']} ({job['type']}) failed, retrying in {delay:.0f}s: {outcome['error']}")
+            return False
+        
+        await self.db_service.fail_job(job["id"], outcome["error"], elapsed_ms=outcome["elapsed_ms"])
+        logger.error(f"Outbox job {job['id']} ({job['type']}) gave up after {job['attempts']} attempts: {outcome['error']}")
+        return True
+    
+    async def _handle_sheets(self, registration):
+        # Coalesced with other registrations' rows into a single append
+        await self.sheets_appender.append(registration)
+        return None
+    
+    async def _handle_sheets_batch(self, registrations):
+        if registrations and not await self.google_service.append_rows_to_sheets(registrations):
+            raise OutboxJobError(f"Google Sheets batch append of {len(registrations)} rows failed")
+        return {"rows": len(registrations)}
+    
+    async def _handle_drive(self, registration, upstream):
+        if registration.cv_drive_id:
+            return {"file_id": registration.cv_drive_id, "web_link": registration.cv_drive_link}
+        if not registration.cv_file_path or not os.path.exists(registration.cv_file_path):
+            # Nothing to upload, retrying will not help
+            logger.warning(f"No local CV to upload for {registration.id}")
+            return None
+        
+        # A previous attempt cut short by its deadline may have finished the
+        # upload on the executor thread anyway: reuse that file
+        drive_result = await self.google_service.find_drive_file(registration.id)
+        if drive_result:
+            logger.info(f"CV of {registration.id} already in Drive, not uploading again")
+        else:
+            # Uploaded in place, straight from uploads/cvs
+            drive_result = await self.google_service.upload_to_drive(
+                registration.cv_file_path,
+                registration.cv_filename or Path(registration.cv_file_path).name,
+                registration.email,
+                registration_id=registration.id
+            )
+        if not drive_result:
+            raise OutboxJobError("Google Drive upload failed")
+        
+        await self.db_service.update_registration_drive_info(
+            registration.id,
+            drive_result['file_id'],
+            drive_result['web_link']
+        )
+        return drive_result
+    
+    async def _handle_gmail(self, registration):
+        # Released once the drive job settled, so the registration carries its Drive link
+        drive_file_info = None
+        if registration.cv_drive_link:
+            drive_file_info = {
+                'web_link': registration.cv_drive_link,
+                'filename': registration.cv_filename
+            }
+        
+        # Batched with other pending notifications into one Gmail batch request
+        if not await self.gmail_sender.send(registration, drive_file_info):
+            raise OutboxJobError("Gmail API notification failed")
+        return None
+    
+    async def _handle_smtp(self, registration, upstream):
+        if not await self.email_service.send_registration_notification(registration, registration.cv_file_path):
+            raise OutboxJobError("SMTP notification failed")
+        return None
+    
+    async def _handle_digest_entry(self, registration, upstream):
+        # Nothing to send yet: DigestScheduler picks settled entries up at the end of the window
+        return {"queued": True}
+    
+    async def _handle_digest(self, registrations):
+        if not registrations:
+            return {"registrations": 0}
+        
+        if self.digest_channel == 'smtp':
+            sent = await self.email_service.send_digest_notification(registrations)
+        else:
+            sent = await self.google_service.send_gmail_digest(registrations)
+        if not sent:
+            raise OutboxJobError(f"Digest notification via {self.digest_channel} failed")
+        return {"registrations": len(registrations), "channel": self.digest_channel}
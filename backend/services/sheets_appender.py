@@ -0,0 +1,60 @@
+import os
+from pathlib import Path
+from typing import List
+from dotenv import load_dotenv
+from models import AgentRegistration
+from services.batching import BatchCoalescer
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+sheets_batch_rows = metrics.histogram(
+    'pymetra_sheets_append_batch_rows',
+    'Rows written per coalesced Google Sheets append',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+)
+
+
+class SheetsAppender:
+    """Coalesces registration rows into one Sheets append every N rows or T milliseconds.
+
+    Rows use the ExportService Google Sheets mapping; ``append`` resolves once
+    the batch containing the row has been confirmed by the Sheets API.
+    """
+    
+    def __init__(self, google_service):
+        self.google_service = google_service
+        self.coalescer = BatchCoalescer(
+            'SheetsAppender',
+            self._flush,
+            max_items=int(os.getenv('SHEETS_APPEND_MAX_ROWS', '50')),
+            max_delay=float(os.getenv('SHEETS_APPEND_MAX_DELAY_MS', '500')) / 1000
+        )
+    
+    async def append(self, registration: AgentRegistration) -> bool:
+        """Queue a registration's row; True once Sheets confirmed it"""
+        row = self.google_service.export_service.registration_to_sheets_row(registration)
+        return await self.coalescer.submit(row)
+    
+    @property
+    def batch_size(self) -> int:
+        return self.coalescer.max_items
+    
+    def flush(self):
+        """Append queued rows now rather than after SHEETS_APPEND_MAX_DELAY_MS"""
+        self.coalescer.flush()
+    
+    async def close(self):
+        """Flush queued rows"""
+        await self.coalescer.close()
+    
+    async def _flush(self, rows: List[List]) -> List[bool]:
+        sheets_batch_rows.observe(len(rows))
+        if not await self.google_service.append_values_to_sheets(rows):
+            raise Exception(f"Google Sheets append of {len(rows)} rows failed")
+        return [True] * len(rows)
@@ -0,0 +1,218 @@
+import os
+import time
+import queue
+import smtplib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, List, Optional
+from dotenv import load_dotenv
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+smtp_sessions_total = metrics.counter(
+    'pymetra_smtp_sessions_total',
+    'SMTP sends by whether they reused an authenticated session or opened a new one',
+    ['session']
+)
+smtp_pool_idle = metrics.gauge(
+    'pymetra_smtp_pool_idle',
+    'Idle authenticated SMTP sessions in the pool'
+)
+smtp_reconnects_total = metrics.counter(
+    'pymetra_smtp_reconnects_total',
+    'Pooled SMTP sessions found dead and replaced',
+    ['reason']
+)
+
+
+# Bytes written to the socket per send() while streaming DATA
+STREAM_SEND_SIZE = 64 * 1024
+
+
+class SMTPSendCancelled(Exception):
+    """The caller gave up on the send before it reached the server"""
+    pass
+
+
+def _send_stream(server: smtplib.SMTP, from_addr: str, to_addrs: List[str], stream: BinaryIO):
+    """MAIL/RCPT/DATA with the message body streamed from ``stream``"""
+    stream.seek(0)
+    server.ehlo_or_helo_if_needed()
+    code, response = server.mail(from_addr)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, response, from_addr)
+    refused = {}
+    for to_addr in to_addrs:
+        code, response = server.rcpt(to_addr)
+        if code not in (250, 251):
+            refused[to_addr] = (code, response)
+    if len(refused) == len(to_addrs):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    
+    code, response = server.docmd('data')
+    if code != 354:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+    
+    pending = []
+    pending_size = 0
+    for line in stream:
+        if line.startswith(b'.'):
+            # Dot-stuffing (RFC 5321 4.5.2)
+            line = b'.' + line
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= STREAM_SEND_SIZE:
+            server.send(b''.join(pending))
+            pending = []
+            pending_size = 0
+    pending.append(b'.\r\n')
+    server.send(b''.join(pending))
+    
+    code, response = server.getreply()
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+
+
+class SMTPConnectionPool:
+    """Pool of logged-in SMTP sessions reused across emails.
+
+    A session idle for longer than SMTP_IDLE_TIMEOUT_SECONDS is closed instead
+    of reused; one idle for longer than SMTP_HEALTH_CHECK_SECONDS is probed
+    with NOOP first. Sessions are retired after SMTP_MAX_MESSAGES_PER_SESSION
+    messages, and a send that finds its session disconnected is retried once
+    on a fresh one.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = int(os.getenv('SMTP_POOL_SIZE', '2'))
+        self.timeout = float(os.getenv('SMTP_TIMEOUT_SECONDS', '30'))
+        self.idle_timeout = float(os.getenv('SMTP_IDLE_TIMEOUT_SECONDS', '60'))
+        self.health_check_after = float(os.getenv('SMTP_HEALTH_CHECK_SECONDS', '5'))
+        self.max_messages = int(os.getenv('SMTP_MAX_MESSAGES_PER_SESSION', '90'))
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()  # (server, last_used, messages_sent)
+
+    def _connect(self) -> smtplib.SMTP:
+        logger.info(f"Opening SMTP session to {self.host}:{self.port}")
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()
+            server.login(self.username, self.password)
+        except Exception:
+            self._quit(server)
+            raise
+        return server
+
+    @staticmethod
+    def _quit(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _healthy(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _checkout(self):
+        """An idle session that is still usable, or a new one"""
+        while True:
+            try:
+                server, last_used, sent = self._idle.get_nowait()
+            except queue.Empty:
+                smtp_sessions_total.inc(session='new')
+                return self._connect(), 0
+
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_timeout:
+                smtp_reconnects_total.inc(reason='idle_timeout')
+                self._quit(server)
+            elif idle_for > self.health_check_after and not self._healthy(server):
+                smtp_reconnects_total.inc(reason='health_check')
+                server.close()
+            else:
+                smtp_sessions_total.inc(session='reused')
+                return server, sent
+
+    def _checkin(self, server: smtplib.SMTP, sent: int):
+        if sent >= self.max_messages:
+            self._quit(server)
+        else:
+            self._idle.put((server, time.monotonic(), sent))
+
+    def send_stream(self, from_addr: str, to_addrs: List[str], stream: BinaryIO,
+                    cancelled: Optional[threading.Event] = None):
+        """Send a CRLF-terminated message read from ``stream`` over a pooled session.
+
+        The DATA phase copies the stream to the socket in chunks, so the
+        message is never held in memory as a whole.
+        """
+        self._send(lambda server: _send_stream(server, from_addr, to_addrs, stream), cancelled)
+    
+    def _send(self, deliver: Callable[[smtplib.SMTP], None], cancelled: Optional[threading.Event]):
+        """Run ``deliver(server)`` on a pooled session, blocking while all are in use.
+
+        Raises SMTPSendCancelled if ``cancelled`` is set before the message is
+        handed to the server.
+        """
+        with self._slot():
+            if cancelled is not None and cancelled.is_set():
+                raise SMTPSendCancelled()
+            server, sent = self._checkout()
+            try:
+                if cancelled is not None and cancelled.is_set():
+                    raise SMTPSendCancelled()
+                try:
+                    deliver(server)
+                except smtplib.SMTPServerDisconnected:
+                    # Dropped by the server since its last use
+                    smtp_reconnects_total.inc(reason='disconnected')
+                    server.close()
+                    smtp_sessions_total.inc(session='new')
+                    server, sent = self._connect(), 0
+                    deliver(server)
+            except (SMTPSendCancelled, smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # Cancelled or rejected message, the session itself is still good
+                self._checkin(server, sent)
+                raise
+            except Exception:
+                server.close()
+                raise
+            self._checkin(server, sent + 1)
+    
+    @contextmanager
+    def _slot(self):
+        self._slots.acquire()
+        try:
+            yield
+        finally:
+            smtp_pool_idle.set(self._idle.qsize())
+            self._slots.release()
+
+    def close(self):
+        """Log out of every idle session"""
+        while True:
+            try:
+                server, _, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(server)
+        smtp_pool_idle.set(0)
+        logger.info("SMTP pool closed")
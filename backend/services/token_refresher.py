@@ -0,0 +1,87 @@
+import os
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+from services.oauth_service import credential_cache
+from services.google_executor import google_api_executor
+from services.metrics_service import metrics
+import logging
+
+# Load environment variables
+ROOT_DIR = Path(__file__).parent.parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+token_remaining_seconds = metrics.gauge(
+    'pymetra_oauth_token_remaining_seconds',
+    'Seconds until the cached Google access token expires'
+)
+token_refreshes_total = metrics.counter(
+    'pymetra_oauth_token_refreshes_total',
+    'Proactive Google access token refreshes',
+    ['outcome']
+)
+
+
+def token_remaining(credentials) -> float:
+    """Seconds of validity left on the access token (0 when unknown or expired)"""
+    if credentials is None or credentials.expiry is None:
+        return 0.0
+    return max((credentials.expiry - datetime.utcnow()).total_seconds(), 0.0)
+
+
+class TokenRefresher:
+    """Lifespan task refreshing the Google access token a margin before it expires,
+    so user-facing requests never wait on the token endpoint"""
+    
+    def __init__(self, oauth_service):
+        self.oauth_service = oauth_service
+        self.margin = float(os.getenv('OAUTH_REFRESH_MARGIN_SECONDS', '600'))
+        self.idle_interval = float(os.getenv('OAUTH_REFRESH_IDLE_SECONDS', '60'))
+        self.retry_interval = float(os.getenv('OAUTH_REFRESH_RETRY_SECONDS', '30'))
+        self._task = None
+        metrics.add_collector(lambda: token_remaining_seconds.set(token_remaining(credential_cache.credentials)))
+    
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"OAuth token refresher started (margin {self.margin:g}s)")
+    
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        logger.info("OAuth token refresher stopped")
+    
+    async def _run(self):
+        while True:
+            try:
+                delay = await self._refresh_if_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"OAuth token refresh failed: {str(e)}")
+                token_refreshes_total.inc(outcome='error')
+                delay = self.retry_interval
+            await asyncio.sleep(delay)
+    
+    async def _refresh_if_due(self) -> float:
+        """Refresh when within the margin; returns seconds until the next check"""
+        credentials = await google_api_executor.run(self.oauth_service.load_credentials, label='oauth.load')
+        if credentials is None or not credentials.refresh_token:
+            # Not authenticated yet
+            return self.idle_interval
+        
+        remaining = token_remaining(credentials)
+        if remaining > self.margin:
+            return remaining - self.margin
+        
+        credentials = await google_api_executor.run(
+            self.oauth_service.refresh_credentials, credentials, True, label='oauth.refresh'
+        )
+        token_refreshes_total.inc(outcome='ok')
+        remaining = token_remaining(credentials)
+        logger.info(f"OAuth token proactively refreshed, valid for {remaining:.0f}s")
+        return max(remaining - self.margin, self.retry_interval)
@@ -1,10 +1,15 @@
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 import { Upload } from "lucide-react";
 import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const RegistrationSection = ({ language }) => {
   const [formData, setFormData] = useState({
     fullName: '',
@@ -16,6 +21,8 @@ const RegistrationSection = ({ language }) => {
 
   const [loading, setLoading] = useState(false);
   const [message, setMessage] = useState('');
+  // Same key for retries and double-clicks of one submission
+  const idempotencyKey = useRef(newIdempotencyKey());
 
   const content = {
     es: {
@@ -74,6 +81,8 @@ const RegistrationSection = ({ language }) => {
 
   const handleInputChange = (e) => {
     const { name, value, type, files } = e.target;
+    // Edited data is a new submission
+    idempotencyKey.current = newIdempotencyKey();
     setFormData(prev => ({
       ...prev,
       [name]: type === 'file' ? files[0] : value
@@ -99,6 +108,7 @@ const RegistrationSection = ({ language }) => {
       const response = await axios.post(`${API}/register-agent`, submitData, {
         headers: {
           'Content-Type': 'multipart/form-data',
+          'Idempotency-Key': idempotencyKey.current,
         },
         timeout: 30000 // 30 second timeout
       });
@@ -107,6 +117,7 @@ const RegistrationSection = ({ language }) => {
       setMessage(content[language].successMessage);
       
       // Reset form
+      idempotencyKey.current = newIdempotencyKey();
       setFormData({
         fullName: '',
         email: '',
@@ -0,0 +1,26 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend modules import each other as top-level packages (services, models, routes)
+BACKEND_DIR = Path(__file__).parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture
+def db_service(monkeypatch):
+    """DatabaseService backed by an in-memory MongoDB"""
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    import services.database_service as database_service
+
+    monkeypatch.setattr(database_service, 'AsyncIOMotorClient', mongomock_motor.AsyncMongoMockClient)
+    return database_service.DatabaseService()
+
+
+@pytest.fixture
+def admin_routes(tmp_path, monkeypatch):
+    """The routes.admin module; importing it creates the uploads directory in the working directory"""
+    monkeypatch.chdir(tmp_path)
+    import routes.admin
+    return routes.admin
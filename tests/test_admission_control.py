@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+from starlette.responses import PlainTextResponse
+
+import middleware.admission_control as admission_control
+from middleware.admission_control import AdmissionControlMiddleware
+
+ROUTE = '/api/register-agent'
+
+
+class SlowApp:
+    """ASGI app whose responses wait until the test releases them"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.started = 0
+
+    async def __call__(self, scope, receive, send):
+        self.started += 1
+        await self.release.wait()
+        await PlainTextResponse('ok')(scope, receive, send)
+
+
+def shed_count(reason: str) -> float:
+    return admission_control.admission_shed_total._values.get((ROUTE, reason), 0.0)
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def client_for(middleware) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=middleware), base_url='http://test')
+
+
+def test_requests_beyond_the_queue_are_shed_immediately():
+    async def scenario():
+        app = SlowApp()
+        middleware = AdmissionControlMiddleware(app, max_concurrency=1, max_queue=1,
+                                                queue_timeout=5, retry_after=7)
+        async with client_for(middleware) as client:
+            running = asyncio.create_task(client.post(ROUTE))
+            queued = asyncio.create_task(client.post(ROUTE))
+            await settle()
+            shed = await client.post(ROUTE)
+            started_before_release = app.started
+            app.release.set()
+            return shed, started_before_release, await running, await queued, app.started
+
+    shed_before = shed_count('queue_full')
+    shed, started_before_release, running, queued, started = asyncio.run(scenario())
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '7'
+    assert started_before_release == 1
+    assert (running.status_code, queued.status_code) == (200, 200)
+    assert started == 2
+    assert shed_count('queue_full') == shed_before + 1
+
+
+def test_queued_request_is_shed_after_the_queue_timeout():
+    async def scenario():
+        app = SlowApp()
+        middleware = AdmissionControlMiddleware(app, max_concurrency=1, max_queue=1,
+                                                queue_timeout=0.05, retry_after=5)
+        async with client_for(middleware) as client:
+            running = asyncio.create_task(client.post(ROUTE))
+            await settle()
+            timed_out = await client.post(ROUTE)
+            app.release.set()
+            return timed_out, await running, middleware._queued
+
+    shed_before = shed_count('queue_timeout')
+    timed_out, running, queued = asyncio.run(scenario())
+
+    assert timed_out.status_code == 503
+    assert running.status_code == 200
+    assert queued == 0
+    assert shed_count('queue_timeout') == shed_before + 1
+
+
+def test_other_routes_and_methods_are_not_limited():
+    async def scenario():
+        app = SlowApp()
+        middleware = AdmissionControlMiddleware(app, max_concurrency=1, max_queue=0,
+                                                queue_timeout=5, retry_after=5)
+        async with client_for(middleware) as client:
+            requests = [asyncio.create_task(client.post(ROUTE))]
+            await settle()
+            requests += [asyncio.create_task(client.get(ROUTE)),
+                         asyncio.create_task(client.post('/api/admin/import'))]
+            await settle()
+            started = app.started
+            app.release.set()
+            return started, [response.status_code for response in await asyncio.gather(*requests)]
+
+    started, statuses = asyncio.run(scenario())
+
+    assert started == 3
+    assert statuses == [200, 200, 200]
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from services.batching import BatchCoalescer
+
+
+class RecordingFlush:
+    """flush_fn that records every batch and answers each item with its double"""
+
+    def __init__(self, delay: float = 0, fail: bool = False):
+        self.batches = []
+        self.delay = delay
+        self.fail = fail
+
+    async def __call__(self, items):
+        self.batches.append(list(items))
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("batch rejected")
+        return [item * 2 for item in items]
+
+
+def test_full_batch_is_flushed_without_waiting():
+    flush = RecordingFlush()
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=3, max_delay=60)
+        return await asyncio.wait_for(asyncio.gather(*(coalescer.submit(n) for n in range(3))), timeout=1)
+
+    assert asyncio.run(scenario()) == [0, 2, 4]
+    assert flush.batches == [[0, 1, 2]]
+
+
+def test_partial_batch_is_flushed_after_max_delay():
+    flush = RecordingFlush()
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=10, max_delay=0.05)
+        return await asyncio.gather(coalescer.submit(1), coalescer.submit(2))
+
+    assert asyncio.run(scenario()) == [2, 4]
+    assert flush.batches == [[1, 2]]
+
+
+def test_failed_batch_fails_every_caller():
+    flush = RecordingFlush(fail=True)
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=2, max_delay=60)
+        return await asyncio.gather(coalescer.submit(1), coalescer.submit(2), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [RuntimeError, RuntimeError]
+
+
+def test_items_queued_during_a_flush_go_out_together():
+    flush = RecordingFlush(delay=0.05)
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=3, max_delay=60)
+        first = [asyncio.create_task(coalescer.submit(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        # A burst while the first batch is in flight: one full batch and a
+        # remainder, not one flush per item
+        burst = [asyncio.create_task(coalescer.submit(n)) for n in range(3, 8)]
+        await asyncio.sleep(0)
+        coalescer.flush()
+        await coalescer.close()
+        return await asyncio.gather(*first, *burst)
+
+    assert asyncio.run(scenario()) == [n * 2 for n in range(8)]
+    assert flush.batches == [[0, 1, 2], [3, 4, 5], [6, 7]]
+
+
+def test_cancelled_submit_is_withdrawn_from_pending_batch():
+    flush = RecordingFlush()
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=10, max_delay=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(coalescer.submit(1), timeout=0.01)
+        result = await coalescer.submit(2)
+        await coalescer.close()
+        return result
+
+    assert asyncio.run(scenario()) == 4
+    assert flush.batches == [[2]]
+
+
+def test_cancelling_the_only_item_stops_the_timer():
+    flush = RecordingFlush()
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=10, max_delay=0.01)
+        task = asyncio.create_task(coalescer.submit(1))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert flush.batches == []
+
+
+def test_close_flushes_what_is_pending():
+    flush = RecordingFlush()
+
+    async def scenario():
+        coalescer = BatchCoalescer('test', flush, max_items=10, max_delay=60)
+        tasks = [asyncio.create_task(coalescer.submit(n)) for n in range(4)]
+        await asyncio.sleep(0)
+        await coalescer.close()
+        return [task.result() for task in tasks]
+
+    assert asyncio.run(scenario()) == [0, 2, 4, 6]
+    assert flush.batches == [[0, 1, 2, 3]]
@@ -0,0 +1,32 @@
+import pytest
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def parse_byte_range(admin_routes):
+    return admin_routes._parse_byte_range
+
+
+@pytest.mark.parametrize('header', [None, '', 'items=0-10', 'bytes=0-1,4-5', 'bytes=a-b', 'bytes=1-x', 'bytes=20-10'])
+def test_whole_file_when_range_is_missing_invalid_or_not_served(parse_byte_range, header):
+    assert parse_byte_range(header, 100) is None
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-9', (0, 9)),
+    ('bytes=10-', (10, 99)),
+    ('bytes=90-200', (90, 99)),
+    ('bytes=-10', (90, 99)),
+    ('bytes=-500', (0, 99)),
+    ('bytes=99-99', (99, 99)),
+])
+def test_satisfiable_ranges(parse_byte_range, header, expected):
+    assert parse_byte_range(header, 100) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=100-', 'bytes=100-150', 'bytes=-0'])
+def test_unsatisfiable_ranges(parse_byte_range, header):
+    with pytest.raises(HTTPException) as raised:
+        parse_byte_range(header, 100)
+    assert raised.value.status_code == 416
+    assert raised.value.headers['Content-Range'] == 'bytes */100'
@@ -0,0 +1,130 @@
+import asyncio
+import os
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models import AgentRegistration
+from services.drive_cache import DriveCVCache
+
+
+class FakeDrive:
+    def __init__(self, files: dict):
+        self.files = files
+        self.downloads = []
+
+    async def get_drive_file_size(self, drive_id):
+        return len(self.files[drive_id]) if drive_id in self.files else None
+
+    async def iter_drive_content(self, drive_id, start, end):
+        self.downloads.append(drive_id)
+        content = self.files[drive_id][start:end + 1]
+        for offset in range(0, len(content), 4):
+            yield content[offset:offset + 4]
+
+
+def test_miss_downloads_once_then_hits(tmp_path):
+    drive = FakeDrive({'a': b'cv-a' * 10})
+    cache = DriveCVCache(cache_dir=str(tmp_path), max_bytes=1000)
+
+    async def scenario():
+        first = await cache.get('a', drive)
+        second = await cache.get('a', drive)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert first.read_bytes() == b'cv-a' * 10
+    assert drive.downloads == ['a']
+
+
+def test_concurrent_misses_share_one_download(tmp_path):
+    drive = FakeDrive({'a': b'cv-a' * 10})
+    cache = DriveCVCache(cache_dir=str(tmp_path), max_bytes=1000)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get('a', drive) for _ in range(5)))
+
+    paths = asyncio.run(scenario())
+    assert len(set(paths)) == 1
+    assert drive.downloads == ['a']
+
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    drive = FakeDrive({name: name.encode() * 40 for name in 'abc'})
+    cache = DriveCVCache(cache_dir=str(tmp_path), max_bytes=100)
+
+    async def scenario():
+        await cache.get('a', drive)
+        await cache.get('b', drive)
+        # 'a' becomes the most recently used, so filling 'c' evicts 'b'
+        await cache.get('a', drive)
+        await cache.get('c', drive)
+
+    asyncio.run(scenario())
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['a', 'c']
+    assert list(cache._entries) == ['a', 'c']
+
+
+def test_file_larger_than_the_cache_is_not_cached(tmp_path):
+    drive = FakeDrive({'big': b'x' * 200})
+    cache = DriveCVCache(cache_dir=str(tmp_path), max_bytes=100)
+
+    assert asyncio.run(cache.get('big', drive)) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_recency_is_restored_from_disk(tmp_path):
+    for age, name in enumerate(['new', 'old']):
+        path = tmp_path / name
+        path.write_bytes(b'x' * 40)
+        os.utime(path, (1_000_000 - age, 1_000_000 - age))
+    (tmp_path / 'cut.1234.part').write_bytes(b'x')
+    drive = FakeDrive({'c': b'c' * 40})
+    cache = DriveCVCache(cache_dir=str(tmp_path), max_bytes=100)
+
+    asyncio.run(cache.get('c', drive))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['c', 'new']
+
+
+def test_open_cached_file_keeps_streaming_after_eviction(admin_routes, tmp_path):
+    path = tmp_path / 'cached'
+    path.write_bytes(b'0123456789')
+
+    async def scenario():
+        opened = await admin_routes._open_local_file(path)
+        # Evicted by a concurrent fill before streaming starts
+        path.unlink()
+        handle, size = opened
+        chunks = [chunk async for chunk in admin_routes._iter_local_file(handle, 2, 5)]
+        return size, b''.join(chunks), await admin_routes._open_local_file(path)
+
+    size, content, reopened = asyncio.run(scenario())
+    assert size == 10
+    assert content == b'2345'
+    assert reopened is None
+
+
+def test_local_cv_download_honors_range(admin_routes, tmp_path, monkeypatch):
+    cv_path = tmp_path / 'cv.pdf'
+    cv_path.write_bytes(b'%PDF-1.4 contenido')
+    registration = AgentRegistration(
+        full_name="Agente Prueba", email="agente@example.com", geographic_area="Madrid",
+        main_sector="Tecnología", cv_filename='cv.pdf', cv_file_path=str(cv_path)
+    )
+
+    class FakeDB:
+        async def get_registration(self, registration_id):
+            return registration if registration_id == registration.id else None
+
+    monkeypatch.setattr(admin_routes, 'db_service', FakeDB())
+    app = FastAPI()
+    app.include_router(admin_routes.router)
+    client = TestClient(app)
+
+    full = client.get(f'/admin/download-cv/{registration.id}')
+    partial = client.get(f'/admin/download-cv/{registration.id}', headers={'Range': 'bytes=0-7'})
+
+    assert (full.status_code, full.content) == (200, b'%PDF-1.4 contenido')
+    assert (partial.status_code, partial.content) == (206, b'%PDF-1.4')
+    assert partial.headers['Content-Range'] == 'bytes 0-7/18'
@@ -0,0 +1,78 @@
+import email
+import io
+import threading
+
+import pytest
+
+import services.mime_stream as mime_stream
+from models import AgentRegistration
+from services.email_service import EmailService
+
+
+@pytest.fixture
+def sent_messages(monkeypatch):
+    """Messages the EmailService would have sent, parsed back"""
+    monkeypatch.setenv('GMAIL_SENDER_EMAIL', 'avisos@example.com')
+    monkeypatch.setenv('RECIPIENT_EMAIL', 'equipo@example.com')
+    messages = []
+
+    def capture(self, message, cancelled):
+        buffer = io.BytesIO()
+        message.write_to(buffer)
+        messages.append(email.message_from_bytes(buffer.getvalue()))
+
+    monkeypatch.setattr(EmailService, '_send_streamed', capture)
+    return messages
+
+
+def registration_with_cv(tmp_path, size: int, **fields) -> AgentRegistration:
+    cv_path = tmp_path / 'cv.pdf'
+    cv_path.write_bytes(b'%PDF-1.4\n' + b'0' * (size - 9))
+    return AgentRegistration(
+        full_name="Agente Prueba",
+        email="agente@example.com",
+        geographic_area="Madrid",
+        main_sector="Tecnología",
+        cv_filename='cv.pdf',
+        cv_file_path=str(cv_path),
+        **fields
+    )
+
+
+def attachments(message) -> list:
+    return [part.get_filename() for part in message.walk() if part.get_filename()]
+
+
+def body(message) -> str:
+    return message.get_payload()[0].get_payload(decode=True).decode('utf-8')
+
+
+def send(registration) -> bool:
+    service = EmailService()
+    try:
+        return service._send_notification(registration, registration.cv_file_path, threading.Event())
+    finally:
+        service.close()
+
+
+def test_small_cv_is_attached(tmp_path, monkeypatch, sent_messages):
+    monkeypatch.setattr(mime_stream, 'ATTACHMENT_MAX_BYTES', 1024)
+    assert send(registration_with_cv(tmp_path, 512))
+    assert attachments(sent_messages[0]) == ['cv.pdf']
+
+
+def test_large_cv_in_drive_is_linked(tmp_path, monkeypatch, sent_messages):
+    monkeypatch.setattr(mime_stream, 'ATTACHMENT_MAX_BYTES', 1024)
+    registration = registration_with_cv(tmp_path, 4096, cv_drive_link='https://drive.google.com/file/d/abc')
+
+    assert send(registration)
+    assert attachments(sent_messages[0]) == []
+    assert 'https://drive.google.com/file/d/abc' in body(sent_messages[0])
+
+
+def test_large_cv_without_a_link_is_still_attached(tmp_path, monkeypatch, sent_messages):
+    monkeypatch.setattr(mime_stream, 'ATTACHMENT_MAX_BYTES', 1024)
+    monkeypatch.setattr(mime_stream, 'PUBLIC_BASE_URL', '')
+
+    assert send(registration_with_cv(tmp_path, 4096))
+    assert attachments(sent_messages[0]) == ['cv.pdf']
@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+
+import pytest
+
+from services.file_service import FileService, FileTooLargeError, InvalidFileContentError, detect_cv_type
+
+
+class FakeUpload:
+    """UploadFile stand-in that counts how much of the body was read"""
+
+    def __init__(self, content: bytes, filename: str = 'cv.pdf', size_known: bool = True):
+        self.content = content
+        self.filename = filename
+        self.size = len(content) if size_known else None
+        self.read_bytes = 0
+
+    async def read(self, size: int) -> bytes:
+        chunk = self.content[self.read_bytes:self.read_bytes + size]
+        self.read_bytes += len(chunk)
+        return chunk
+
+
+@pytest.fixture
+def file_service(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    service = FileService()
+    service.chunk_size = 16
+    return service
+
+
+def upload_dir_contents(file_service) -> list:
+    return sorted(path.name for path in file_service.upload_dir.iterdir())
+
+
+@pytest.mark.parametrize('data, expected', [
+    (b'%PDF-1.7', 'application/pdf'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1rest', 'application/msword'),
+    (b'PK\x03\x04rest', 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    (b'MZ\x90\x00', None),
+    (b'', None),
+])
+def test_detect_cv_type(data, expected):
+    assert detect_cv_type(data) == expected
+
+
+def test_upload_is_streamed_to_disk(file_service):
+    content = b'%PDF-1.4\n' + b'x' * 100
+
+    saved = asyncio.run(file_service.save_cv_upload(FakeUpload(content), 'agente@example.com', max_bytes=1024))
+
+    assert saved['size'] == len(content)
+    assert saved['sha256'] == hashlib.sha256(content).hexdigest()
+    assert saved['content_type'] == 'application/pdf'
+    with open(saved['path'], 'rb') as f:
+        assert f.read() == content
+    assert not any(name.endswith('.part') for name in upload_dir_contents(file_service))
+
+
+def test_declared_size_over_the_limit_is_rejected_without_reading(file_service):
+    upload = FakeUpload(b'%PDF' + b'x' * 2000)
+
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(file_service.save_cv_upload(upload, 'agente@example.com', max_bytes=1024))
+    assert upload.read_bytes == 0
+
+
+def test_streaming_stops_once_the_limit_is_crossed(file_service):
+    upload = FakeUpload(b'%PDF' + b'x' * 5000, size_known=False)
+
+    with pytest.raises(FileTooLargeError):
+        asyncio.run(file_service.save_cv_upload(upload, 'agente@example.com', max_bytes=64))
+    assert upload.read_bytes <= 64 + file_service.chunk_size
+    assert upload_dir_contents(file_service) == []
+
+
+@pytest.mark.parametrize('content', [b'MZ\x90\x00 not a cv at all', b''])
+def test_unrecognised_or_empty_content_is_rejected(file_service, content):
+    upload = FakeUpload(content, filename='cv.pdf', size_known=False)
+
+    with pytest.raises(InvalidFileContentError):
+        asyncio.run(file_service.save_cv_upload(upload, 'agente@example.com', max_bytes=1024))
+    assert upload.read_bytes <= file_service.chunk_size
+    assert upload_dir_contents(file_service) == []
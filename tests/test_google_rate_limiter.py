@@ -0,0 +1,141 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from services.google_rate_limiter import (
+    GoogleAPIRateLimiter, RetryBudget, TokenBucket, retry_after_seconds, retry_reason
+)
+
+
+def http_error(status: int, content: bytes = b'{}', **headers) -> HttpError:
+    return HttpError(httplib2.Response({'status': status, **headers}), content)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    monkeypatch.setenv('GOOGLE_API_BACKOFF_BASE_SECONDS', '0')
+    limiter = GoogleAPIRateLimiter()
+    limiter.max_retries = 3
+    return limiter
+
+
+def failing_then_ok(*errors):
+    """An API call failing with ``errors`` in turn, then returning 'ok'; counts its attempts"""
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return 'ok'
+    return call, attempts
+
+
+def test_token_bucket_serves_the_burst_then_paces_callers():
+    async def scenario():
+        bucket = TokenBucket(rate=50, capacity=2)
+        waits = [await bucket.acquire() for _ in range(4)]
+        return waits
+
+    waits = asyncio.run(scenario())
+    assert waits[:2] == [pytest.approx(0, abs=0.005)] * 2
+    # One token every 20ms once the burst is spent
+    assert all(0.01 <= wait < 0.1 for wait in waits[2:])
+
+
+def test_token_bucket_pause_holds_every_caller():
+    async def scenario():
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(scenario()) >= 0.045
+
+
+def test_retry_budget_allows_a_fraction_of_traffic():
+    budget = RetryBudget(ratio=0.5, reserve=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({}, None),
+    ({'retry-after': '7'}, 7.0),
+    ({'retry-after': '-3'}, 0.0),
+    ({'retry-after': 'pronto'}, None),
+])
+def test_retry_after_seconds(headers, expected):
+    assert retry_after_seconds(http_error(429, **headers)) == expected
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = retry_after_seconds(http_error(503, **{'retry-after': format_datetime(when, usegmt=True)}))
+    assert delay == pytest.approx(30, abs=2)
+
+
+@pytest.mark.parametrize('error, idempotent, expected', [
+    (http_error(429), False, '429'),
+    (http_error(403, b'{"reason": "userRateLimitExceeded"}'), False, 'rate_limit'),
+    (http_error(403, b'{"reason": "insufficientPermissions"}'), True, None),
+    (http_error(503), True, '503'),
+    (http_error(503), False, None),
+    (http_error(404), True, None),
+    (ConnectionResetError(), True, 'transport'),
+    (ConnectionResetError(), False, None),
+    (ValueError(), True, None),
+])
+def test_retry_reason(error, idempotent, expected):
+    assert retry_reason(error, idempotent) == expected
+
+
+def test_transient_failures_are_retried(limiter):
+    call, attempts = failing_then_ok(http_error(503), ConnectionResetError())
+
+    assert asyncio.run(limiter.call('drive', call)) == 'ok'
+    assert len(attempts) == 3
+
+
+def test_non_idempotent_call_is_not_retried_after_an_ambiguous_failure(limiter):
+    call, attempts = failing_then_ok(http_error(503))
+
+    with pytest.raises(HttpError):
+        asyncio.run(limiter.call('sheets', call, idempotent=False))
+    assert len(attempts) == 1
+
+
+def test_non_idempotent_call_is_retried_after_a_rate_limit(limiter):
+    call, attempts = failing_then_ok(http_error(429, **{'retry-after': '0'}))
+
+    assert asyncio.run(limiter.call('sheets', call, idempotent=False)) == 'ok'
+    assert len(attempts) == 2
+
+
+def test_retries_stop_when_the_budget_is_spent(limiter):
+    limiter.retry_budget = RetryBudget(ratio=0, reserve=1)
+    call, attempts = failing_then_ok(http_error(500), http_error(500))
+
+    with pytest.raises(HttpError):
+        asyncio.run(limiter.call('drive', call))
+    assert len(attempts) == 2
+
+
+def test_retry_after_beyond_the_limit_is_not_waited_for(limiter):
+    limiter.max_retry_after = 10
+    call, attempts = failing_then_ok(http_error(429, **{'retry-after': '3600'}))
+
+    with pytest.raises(HttpError):
+        asyncio.run(limiter.call('drive', call))
+    assert len(attempts) == 1
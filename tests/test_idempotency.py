@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+LEASE_SECONDS = 120
+PDF = b'%PDF-1.4\n' + b'x' * 64
+
+
+@pytest.fixture
+def registration_routes(db_service, tmp_path, monkeypatch):
+    """routes.registration on the in-memory database, storing CVs under tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    import routes.registration as registration_routes
+    from services.file_service import FileService
+
+    monkeypatch.setattr(registration_routes, 'db_service', db_service)
+    monkeypatch.setattr(registration_routes, 'file_service', FileService())
+    return registration_routes
+
+
+@pytest.fixture
+def client(registration_routes):
+    app = FastAPI()
+    app.include_router(registration_routes.router)
+    return TestClient(app)
+
+
+def register(client, cv: bytes = PDF, **headers):
+    return client.post(
+        '/api/register-agent',
+        data={'fullName': 'Agente Prueba', 'email': 'agente@example.com',
+              'geographicArea': 'Madrid', 'mainSector': 'Tecnología'},
+        files={'cv': ('cv.pdf', cv, 'application/pdf')},
+        headers=headers
+    )
+
+
+def registration_count(db_service) -> int:
+    return asyncio.run(db_service.db.agent_registrations.count_documents({}))
+
+
+def test_reserve_returns_the_existing_record(db_service):
+    async def scenario():
+        first = await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        second = await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        await db_service.complete_idempotency_key('key', {'registration_id': 'abc'})
+        third = await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        return first, second, third
+
+    first, second, third = asyncio.run(scenario())
+    assert first is None
+    assert second['status'] == 'in_progress'
+    assert (third['status'], third['response']) == ('completed', {'registration_id': 'abc'})
+
+
+def test_released_key_can_be_reserved_again(db_service):
+    async def scenario():
+        await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        await db_service.release_idempotency_key('key')
+        return await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_abandoned_reservation_is_taken_over_once(db_service):
+    async def scenario():
+        await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        await db_service.db.registration_idempotency.update_one(
+            {'_id': 'key'}, {'$set': {'created_at': datetime.utcnow() - timedelta(seconds=LEASE_SECONDS + 1)}}
+        )
+        takeover = await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        # The takeover renewed the lease, so a concurrent retry does not get it too
+        concurrent = await db_service.reserve_idempotency_key('key', LEASE_SECONDS)
+        return takeover, concurrent
+
+    takeover, concurrent = asyncio.run(scenario())
+    assert takeover is None
+    assert concurrent['status'] == 'in_progress'
+
+
+def test_retry_with_the_same_key_replays_the_response(client, db_service):
+    first = register(client, **{'Idempotency-Key': 'envio-1'})
+    retry = register(client, **{'Idempotency-Key': 'envio-1'})
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert registration_count(db_service) == 1
+
+
+def test_same_cv_without_a_key_is_deduplicated(client, db_service):
+    first = register(client)
+    double_click = register(client)
+    other_cv = register(client, cv=PDF + b'otro')
+
+    assert double_click.json()['registration_id'] == first.json()['registration_id']
+    assert other_cv.json()['registration_id'] != first.json()['registration_id']
+    assert registration_count(db_service) == 2
+
+
+def test_submission_in_progress_gets_409(client, db_service, registration_routes):
+    key = registration_routes.idempotency_key_for('agente@example.com', client_key='envio-1')
+    asyncio.run(db_service.reserve_idempotency_key(key, LEASE_SECONDS))
+
+    response = register(client, **{'Idempotency-Key': 'envio-1'})
+
+    assert response.status_code == 409
+    assert registration_count(db_service) == 0
+
+
+def test_abandoned_submission_is_processed_by_the_retry(client, db_service, registration_routes):
+    key = registration_routes.idempotency_key_for('agente@example.com', client_key='envio-1')
+
+    async def abandon():
+        await db_service.reserve_idempotency_key(key, LEASE_SECONDS)
+        await db_service.db.registration_idempotency.update_one(
+            {'_id': key}, {'$set': {'created_at': datetime.utcnow() - timedelta(hours=1)}}
+        )
+
+    asyncio.run(abandon())
+    response = register(client, **{'Idempotency-Key': 'envio-1'})
+
+    assert response.status_code == 200
+    assert registration_count(db_service) == 1
@@ -0,0 +1,159 @@
+import asyncio
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models import AgentRegistration
+from services.import_service import ImportFileError, ImportService
+from services.outbox_service import JOB_DRIVE, JOB_SHEETS_BATCH, REGISTRATION_JOB_DEPENDENCIES
+
+
+class FakeFileService:
+    async def save_cv_file(self, content, filename, email):
+        return None
+
+
+def make_registrations(count: int):
+    return [AgentRegistration(
+        full_name=f"Agente {number}",
+        email=f"agente{number}@example.com",
+        geographic_area="Madrid",
+        main_sector="Tecnología"
+    ) for number in range(count)]
+
+
+async def save_bulk(db_service, registrations):
+    return await db_service.save_registrations_bulk(
+        registrations, [JOB_DRIVE], [JOB_SHEETS_BATCH], REGISTRATION_JOB_DEPENDENCIES
+    )
+
+
+async def all_jobs(db_service):
+    return await db_service.db.registration_jobs.find().to_list(length=None)
+
+
+def test_bulk_save_enqueues_jobs_and_one_batch_job(db_service):
+    registrations = make_registrations(3)
+
+    async def scenario():
+        errors = await save_bulk(db_service, registrations)
+        embedded = await db_service.db.agent_registrations.count_documents({'pending_outbox_jobs': {'$exists': True}})
+        return errors, embedded, await all_jobs(db_service)
+
+    errors, embedded, jobs = asyncio.run(scenario())
+    assert errors == [None] * 3
+    assert embedded == 0
+    assert sorted(job['type'] for job in jobs) == [JOB_DRIVE] * 3 + [JOB_SHEETS_BATCH]
+    batch_job, = [job for job in jobs if job['type'] == JOB_SHEETS_BATCH]
+    assert batch_job['registration_ids'] == [registration.id for registration in registrations]
+
+
+def test_bulk_jobs_are_recovered_when_the_outbox_insert_fails(db_service, monkeypatch):
+    registrations = make_registrations(3)
+
+    async def scenario():
+        collection_type = type(db_service.db.registration_jobs)
+        insert_many = collection_type.insert_many
+
+        async def failing_insert_many(self, *args, **kwargs):
+            # Registrations and outbox jobs share the collection class
+            if self.name == 'registration_jobs':
+                raise RuntimeError("outbox unavailable")
+            return await insert_many(self, *args, **kwargs)
+
+        monkeypatch.setattr(collection_type, 'insert_many', failing_insert_many)
+        errors = await save_bulk(db_service, registrations)
+        monkeypatch.setattr(collection_type, 'insert_many', insert_many)
+        assert await all_jobs(db_service) == []
+
+        await db_service.db.agent_registrations.update_many(
+            {}, {'$set': {'timestamp': datetime.utcnow() - timedelta(minutes=5)}}
+        )
+        recovered = await db_service.enqueue_embedded_jobs(older_than_seconds=60)
+        return errors, recovered, await all_jobs(db_service)
+
+    errors, recovered, jobs = asyncio.run(scenario())
+    assert errors == [None] * 3
+    assert recovered == 3
+    assert sorted(job['type'] for job in jobs) == [JOB_DRIVE] * 3 + [JOB_SHEETS_BATCH]
+
+
+def test_failed_bulk_insert_is_reported_per_registration(db_service, monkeypatch):
+    async def scenario():
+        collection_type = type(db_service.db.agent_registrations)
+        insert_many = collection_type.insert_many
+
+        async def failing_insert_many(self, *args, **kwargs):
+            if self.name == 'agent_registrations':
+                raise RuntimeError("connection reset")
+            return await insert_many(self, *args, **kwargs)
+
+        monkeypatch.setattr(collection_type, 'insert_many', failing_insert_many)
+        return await save_bulk(db_service, make_registrations(2)), await all_jobs(db_service)
+
+    errors, jobs = asyncio.run(scenario())
+    assert errors == ['connection reset', 'connection reset']
+    assert jobs == []
+
+
+def rows_file(lines) -> io.BytesIO:
+    return io.BytesIO(''.join(lines).encode('utf-8'))
+
+
+def test_malformed_rows_are_reported_per_row(db_service):
+    service = ImportService(db_service, FakeFileService())
+    ndjson = rows_file([
+        json.dumps({'full_name': 'Ana', 'email': 'ana@example.com', 'geographic_area': 'Madrid',
+                    'main_sector': 'Tecnología'}) + '\n',
+        '{no es json\n',
+        '[1, 2]\n',
+        json.dumps({'full_name': 'Luis', 'email': 'no-es-un-email', 'geographic_area': 'Madrid',
+                    'main_sector': 'Tecnología'}) + '\n',
+    ])
+
+    report = asyncio.run(service.import_registrations(ndjson, 'agentes.ndjson'))
+
+    assert report['imported'] == 1
+    assert [(result['row'], result['status']) for result in report['results']] == [
+        (1, 'imported'), (2, 'error'), (3, 'error'), (4, 'error')
+    ]
+    assert report['results'][1]['error'].startswith('Invalid JSON')
+
+
+def test_csv_rows_are_imported(db_service):
+    service = ImportService(db_service, FakeFileService())
+    csv_file = rows_file([
+        'fullName,email,geographicArea,mainSector\r\n',
+        'Ana,ana@example.com,Madrid,Tecnología\r\n',
+        'Luis,,Madrid,Tecnología\r\n',
+    ])
+
+    report = asyncio.run(service.import_registrations(csv_file, 'agentes.csv'))
+
+    assert report['imported'] == 1
+    assert report['results'][1]['status'] == 'error'
+
+
+def test_non_utf8_rows_file_is_rejected(db_service):
+    service = ImportService(db_service, FakeFileService())
+
+    with pytest.raises(ImportFileError):
+        asyncio.run(service.import_registrations(io.BytesIO(b'full_name\n\xff\xfe\n'), 'agentes.csv'))
+
+
+@pytest.mark.parametrize('files', [
+    {'rows': ('agentes.csv', b'\xff\xfe\x00 binario', 'text/csv')},
+    {'rows': ('agentes.csv', b'full_name\n', 'text/csv'), 'cvs': ('cvs.zip', b'no es un zip', 'application/zip')},
+])
+def test_unreadable_import_files_get_400(admin_routes, files):
+    app = FastAPI()
+    app.include_router(admin_routes.router)
+
+    response = TestClient(app).post('/admin/import-registrations', files=files)
+
+    assert response.status_code == 400
+    assert response.json()['detail'].startswith('Archivo de importación no válido')
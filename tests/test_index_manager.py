@@ -0,0 +1,76 @@
+import asyncio
+
+from services.index_manager import IndexManager
+
+
+def statuses(report: dict) -> dict:
+    return {(index['collection'], index['name']): index for index in report['indexes']}
+
+
+def test_missing_indexes_are_created_once(db_service):
+    async def scenario():
+        first = await IndexManager(db_service, 3600).ensure_indexes()
+        second = await IndexManager(db_service, 3600).ensure_indexes()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert set(first['counts']) == {'created'}
+    assert set(second['counts']) == {'exists'}
+
+
+def test_changed_ttl_is_updated_in_place(db_service, monkeypatch):
+    commands = []
+
+    async def command(*args, **kwargs):
+        commands.append((args, kwargs))
+        return {'ok': 1}
+
+    async def scenario():
+        await IndexManager(db_service, 3600).ensure_indexes()
+        manager = IndexManager(db_service, 7200)
+        monkeypatch.setattr(manager.db, 'command', command)
+        return await manager.ensure_indexes()
+
+    report = asyncio.run(scenario())
+    ttl_index = statuses(report)[('registration_idempotency', 'created_at_ttl')]
+    assert ttl_index['status'] == 'updated'
+    assert ttl_index['differences'] == {'expireAfterSeconds': {'existing': 3600, 'declared': 7200}}
+    assert commands == [(('collMod', 'registration_idempotency'),
+                         {'index': {'name': 'created_at_ttl', 'expireAfterSeconds': 7200}})]
+    assert report['counts'] == {'exists': len(report['indexes']) - 1, 'updated': 1}
+
+
+def changed_partial_filter(manager: IndexManager):
+    for spec in manager.indexes:
+        if spec['name'] == 'cv_drive_id_set':
+            spec['options'] = {'partialFilterExpression': {'cv_drive_id': {'$exists': True}}}
+
+
+def test_other_option_changes_are_reported_as_mismatched(db_service):
+    async def scenario():
+        await IndexManager(db_service, 3600).ensure_indexes()
+        manager = IndexManager(db_service, 3600)
+        changed_partial_filter(manager)
+        report = await manager.ensure_indexes()
+        return report, await db_service.db.agent_registrations.index_information()
+
+    report, indexes = asyncio.run(scenario())
+    index = statuses(report)[('agent_registrations', 'cv_drive_id_set')]
+    assert index['status'] == 'mismatched'
+    assert set(index['differences']) == {'partialFilterExpression'}
+    assert indexes['cv_drive_id_set']['partialFilterExpression'] == {'cv_drive_id': {'$type': 'string'}}
+
+
+def test_mismatched_index_is_rebuilt_when_enabled(db_service, monkeypatch):
+    monkeypatch.setenv('MONGO_REBUILD_MISMATCHED_INDEXES', 'true')
+
+    async def scenario():
+        await IndexManager(db_service, 3600).ensure_indexes()
+        manager = IndexManager(db_service, 3600)
+        changed_partial_filter(manager)
+        report = await manager.ensure_indexes()
+        return report, await db_service.db.agent_registrations.index_information()
+
+    report, indexes = asyncio.run(scenario())
+    assert statuses(report)[('agent_registrations', 'cv_drive_id_set')]['status'] == 'rebuilt'
+    assert indexes['cv_drive_id_set']['partialFilterExpression'] == {'cv_drive_id': {'$exists': True}}
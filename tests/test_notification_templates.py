@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+
+from models import AgentRegistration
+from services.notification_templates import SEPARATOR, CompiledTemplate, NotificationTemplates
+
+
+@pytest.fixture
+def templates():
+    return NotificationTemplates()
+
+
+def agent(language: str = 'es', **fields) -> AgentRegistration:
+    values = {'full_name': 'Ana García', 'email': 'ana@example.com', 'geographic_area': 'Madrid',
+              'main_sector': 'Tecnología', 'language': language,
+              'timestamp': datetime(2024, 3, 5, 9, 7)}
+    values.update(fields)
+    return AgentRegistration(**values)
+
+
+def test_compiled_template_folds_constants_and_fills_fields():
+    template = CompiledTemplate('{separator}\n{name} <{email}>{{literal}}', {'separator': '---'})
+
+    assert template.fields == {'name', 'email'}
+    assert template.render({'name': 'Ana', 'email': 'ana@example.com'}) == '---\nAna <ana@example.com>{literal}'
+
+
+@pytest.mark.parametrize('language, subject, labels', [
+    ('es', 'Nuevo registro Pymetra - Ana García', ['• Nombre: Ana García', '• Zona geográfica: Madrid',
+                                                   '• Fecha de registro: 05/03/2024 09:07']),
+    ('en', 'New Pymetra registration - Ana García', ['• Name: Ana García', '• Geographic area: Madrid',
+                                                     '• Registered on: 05/03/2024 09:07']),
+])
+def test_registration_is_rendered_in_the_agent_language(templates, language, subject, labels):
+    rendered_subject, body = templates.registration(agent(language))
+
+    assert rendered_subject == subject
+    for label in labels:
+        assert label in body
+    assert body.count(SEPARATOR) == 2
+    assert '{' not in body
+
+
+def test_unknown_language_falls_back_to_the_default(templates):
+    subject, body = templates.registration(agent('fr'))
+
+    assert subject == templates.registration(agent('es'))[0]
+    assert '• Idioma: fr' in body
+
+
+@pytest.mark.parametrize('language, kwargs, expected', [
+    ('es', {'drive_file_info': {'web_link': 'https://drive/cv', 'filename': 'cv.pdf'}},
+     '• CV en Google Drive: https://drive/cv\n• Nombre del archivo: cv.pdf'),
+    ('en', {'drive_file_info': {'web_link': None, 'filename': 'cv.pdf'}}, '• CV on Google Drive: Not available'),
+    ('es', {'cv_attached': True}, 'El CV se encuentra adjunto a este correo.'),
+    ('en', {'cv_attached': True}, 'The CV is attached to this email.'),
+    ('en', {'cv_link': 'https://drive/big'}, '• CV (too large to attach): https://drive/big'),
+])
+def test_cv_section(templates, language, kwargs, expected):
+    _, body = templates.registration(agent(language), **kwargs)
+
+    assert expected in body
+
+
+def test_registration_without_cv_has_no_cv_section(templates):
+    _, body = templates.registration(agent('en'))
+
+    assert 'CV' not in body
+
+
+def test_digest_is_rendered_in_the_default_language(templates):
+    registrations = [agent('en', id='attached'), agent('es', id='linked', full_name='Luis Pérez'),
+                     agent('es', id='missing', full_name='Eva Ruiz')]
+
+    subject, body = templates.digest(registrations, 'última hora', attached_ids=['attached'],
+                                     links={'linked': 'https://drive/luis'})
+
+    assert subject == 'Resumen de registros Pymetra - 3 nuevos agentes'
+    assert 'Nuevos agentes registrados en Pymetra (última hora):' in body
+    assert 'CV: Adjunto en cvs.zip' in body
+    assert 'CV: https://drive/luis' in body
+    assert 'CV: No disponible' in body
+    assert 'Total: 3 registros' in body
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+import services.oauth_service as oauth_service
+from services.google_apis_service import GoogleAPIsService
+from services.oauth_service import CredentialCache, OAuthService
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = CredentialCache()
+    monkeypatch.setattr(oauth_service, 'credential_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def oauth(tmp_path, cache):
+    service = OAuthService()
+    service.credentials_file = tmp_path / 'oauth_credentials.json'
+    return service
+
+
+def write_credentials(path, token: str, expiry: datetime):
+    path.write_text(json.dumps({
+        'token': token,
+        'refresh_token': 'refresh',
+        'token_uri': 'https://oauth2.googleapis.com/token',
+        'client_id': 'client',
+        'client_secret': 'secret',
+        'scopes': ['https://www.googleapis.com/auth/drive.file'],
+        'expiry': expiry.isoformat()
+    }))
+
+
+def test_credentials_file_is_reread_only_when_it_changes(tmp_path, cache):
+    path = tmp_path / 'oauth_credentials.json'
+    path.write_text('v1')
+    loads = []
+
+    def loader():
+        loads.append(path.read_text())
+        return path.read_text()
+
+    cache.check_interval = 0
+    assert cache.get(path, loader) == 'v1'
+    assert cache.get(path, loader) == 'v1'
+    assert loads == ['v1']
+
+    path.write_text('v2')
+    new_mtime = path.stat().st_mtime_ns + 1_000_000
+    os.utime(path, ns=(new_mtime, new_mtime))
+    assert cache.get(path, loader) == 'v2'
+    assert loads == ['v1', 'v2']
+    assert cache.generation == 2
+
+    path.unlink()
+    assert cache.get(path, loader) is None
+
+
+def test_mtime_is_not_checked_within_the_interval(tmp_path, cache):
+    path = tmp_path / 'oauth_credentials.json'
+    path.write_text('v1')
+    cache.check_interval = 60
+
+    assert cache.get(path, path.read_text) == 'v1'
+    path.unlink()
+    assert cache.get(path, path.read_text) == 'v1'
+
+
+def test_concurrent_callers_share_one_refresh(oauth, monkeypatch):
+    write_credentials(oauth.credentials_file, 'old', datetime.utcnow() - timedelta(minutes=5))
+    refreshes = []
+
+    def fake_refresh(self, request):
+        refreshes.append(self.token)
+        time.sleep(0.05)
+        self.token = 'new'
+        self.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(Credentials, 'refresh', fake_refresh)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(oauth.load_credentials())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert refreshes == ['old']
+    assert {credentials.token for credentials in results} == {'new'}
+    assert json.loads(oauth.credentials_file.read_text())['token'] == 'new'
+
+
+def test_authentication_check_does_not_block_the_event_loop(oauth, cache):
+    write_credentials(oauth.credentials_file, 'token', datetime.utcnow() + timedelta(hours=1))
+    google_service = GoogleAPIsService()
+    google_service.oauth_service = oauth
+    release = threading.Event()
+
+    def hold_lock():
+        # A refresh in progress in another thread
+        with cache.lock:
+            release.wait(5)
+
+    holder = threading.Thread(target=hold_lock)
+    holder.start()
+
+    async def scenario():
+        check = asyncio.create_task(google_service.is_authenticated_async())
+        await asyncio.sleep(0.05)
+        # The loop keeps serving other requests while the check waits
+        assert not check.done()
+        release.set()
+        return await check
+
+    try:
+        assert asyncio.run(scenario())
+    finally:
+        release.set()
+        holder.join()
@@ -0,0 +1,354 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import AgentRegistration
+from services.export_service import ExportService
+from services.outbox_service import (
+    JOB_DIGEST_ENTRY, JOB_DRIVE, JOB_GMAIL, JOB_SHEETS, REGISTRATION_JOB_DEPENDENCIES,
+    DependencyNotReady, OutboxWorker
+)
+
+LEASE_SECONDS = 300
+
+
+class FakeGoogleService:
+    gmail_batch_size = 50
+
+    def __init__(self, upload_ok: bool = True):
+        self.export_service = ExportService()
+        self.upload_ok = upload_ok
+        self.uploads = 0
+        self.sheet_rows = []
+
+    async def find_drive_file(self, registration_id):
+        return None
+
+    async def upload_to_drive(self, file_path, filename, email, registration_id=None):
+        self.uploads += 1
+        if not self.upload_ok:
+            return None
+        return {'file_id': f'drive-{registration_id}', 'web_link': f'https://drive/{registration_id}'}
+
+    async def append_values_to_sheets(self, rows):
+        self.sheet_rows += rows
+        return True
+
+    async def send_gmail_notifications(self, notifications):
+        return [True] * len(notifications)
+
+
+class FakeEmailService:
+    async def send_registration_notification(self, registration, cv_file_path):
+        return True
+
+
+def make_registration(tmp_path=None) -> AgentRegistration:
+    registration = AgentRegistration(
+        full_name="Agente Prueba",
+        email="agente@example.com",
+        geographic_area="Madrid",
+        main_sector="Tecnología"
+    )
+    if tmp_path is not None:
+        cv_path = tmp_path / f"{registration.id}.pdf"
+        cv_path.write_bytes(b'%PDF-1.4')
+        registration.cv_filename = 'cv.pdf'
+        registration.cv_file_path = str(cv_path)
+    return registration
+
+
+def make_worker(db_service, google_service=None) -> OutboxWorker:
+    worker = OutboxWorker(db_service, google_service or FakeGoogleService(), FakeEmailService())
+    worker.max_attempts = 3
+    worker.retry_backoff = 10
+    worker.max_retry_backoff = 15
+    return worker
+
+
+def failed_outcome(error_type=RuntimeError) -> dict:
+    return {'ok': False, 'result': None, 'error': f'{error_type.__name__}: boom',
+            'error_type': error_type, 'timed_out': False, 'elapsed_ms': 5}
+
+
+async def jobs_by_type(db_service, registration_id) -> dict:
+    jobs = await db_service.db.registration_jobs.find({'registration_id': registration_id}).to_list(length=None)
+    return {job['type']: job for job in jobs}
+
+
+async def save(db_service, registration, job_types) -> dict:
+    await db_service.save_registration_with_jobs(registration, job_types, REGISTRATION_JOB_DEPENDENCIES)
+    return await jobs_by_type(db_service, registration.id)
+
+
+def test_saved_registration_gets_pending_and_blocked_jobs(db_service):
+    async def scenario():
+        registration = make_registration()
+        jobs = await save(db_service, registration, [JOB_SHEETS, JOB_DRIVE, JOB_GMAIL])
+        saved = await db_service.db.agent_registrations.find_one({'id': registration.id})
+        return jobs, saved
+
+    jobs, saved = asyncio.run(scenario())
+    assert {job_type: job['status'] for job_type, job in jobs.items()} == {
+        JOB_SHEETS: 'pending', JOB_DRIVE: 'pending', JOB_GMAIL: 'blocked'
+    }
+    assert jobs[JOB_GMAIL]['depends_on'] == JOB_DRIVE
+    assert 'pending_outbox_jobs' not in saved
+
+
+def test_embedded_jobs_are_recovered_when_the_copy_failed(db_service):
+    async def scenario():
+        registration = make_registration()
+        jobs = db_service._registration_jobs(registration.id, [JOB_SHEETS, JOB_DRIVE], {})
+        doc = registration.dict()
+        doc['pending_outbox_jobs'] = jobs
+        doc['timestamp'] = datetime.utcnow() - timedelta(minutes=5)
+        await db_service.db.agent_registrations.insert_one(doc)
+
+        recovered = await db_service.enqueue_embedded_jobs(older_than_seconds=60)
+        again = await db_service.enqueue_embedded_jobs(older_than_seconds=60)
+        return recovered, again, await jobs_by_type(db_service, registration.id)
+
+    recovered, again, jobs = asyncio.run(scenario())
+    assert recovered == 1
+    assert again == 0
+    assert set(jobs) == {JOB_SHEETS, JOB_DRIVE}
+
+
+def test_claim_next_job_leases_the_oldest_runnable_job(db_service):
+    async def scenario():
+        first = await save(db_service, make_registration(), [JOB_DRIVE])
+        await save(db_service, make_registration(), [JOB_DRIVE])
+        claimed = await db_service.claim_next_job(LEASE_SECONDS)
+        return first[JOB_DRIVE], claimed
+
+    first, claimed = asyncio.run(scenario())
+    assert claimed['id'] == first['id']
+    assert claimed['status'] == 'running'
+    assert claimed['attempts'] == 1
+    assert claimed['lease_expires_at'] > datetime.utcnow() + timedelta(seconds=LEASE_SECONDS - 60)
+
+
+def test_claimed_job_is_not_claimed_twice_until_its_lease_expires(db_service):
+    async def scenario():
+        await save(db_service, make_registration(), [JOB_DRIVE])
+        claimed = await db_service.claim_next_job(LEASE_SECONDS)
+        while_leased = await db_service.claim_next_job(LEASE_SECONDS)
+        await db_service.db.registration_jobs.update_one(
+            {'id': claimed['id']}, {'$set': {'lease_expires_at': datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        reclaimed = await db_service.claim_next_job(LEASE_SECONDS)
+        return claimed, while_leased, reclaimed
+
+    claimed, while_leased, reclaimed = asyncio.run(scenario())
+    assert while_leased is None
+    assert reclaimed['id'] == claimed['id']
+    assert reclaimed['attempts'] == 2
+
+
+def test_claim_skips_blocked_future_and_excluded_jobs(db_service):
+    async def scenario():
+        jobs = await save(db_service, make_registration(), [JOB_SHEETS, JOB_DRIVE, JOB_GMAIL])
+        await db_service.db.registration_jobs.update_one(
+            {'id': jobs[JOB_DRIVE]['id']}, {'$set': {'next_attempt_at': datetime.utcnow() + timedelta(minutes=5)}}
+        )
+        return await db_service.claim_next_job(LEASE_SECONDS, exclude_types=[JOB_SHEETS])
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_claim_registration_jobs_includes_jobs_blocked_on_claimed_types(db_service):
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_SHEETS, JOB_DRIVE, JOB_DIGEST_ENTRY])
+        first = await db_service.claim_next_job(LEASE_SECONDS, exclude_types=[JOB_SHEETS])
+        claimed = await db_service.claim_registration_jobs(
+            registration.id, LEASE_SECONDS, [first['type']], exclude_types=[JOB_SHEETS]
+        )
+        return first, claimed
+
+    first, claimed = asyncio.run(scenario())
+    assert first['type'] == JOB_DRIVE
+    assert [(job['type'], job['status']) for job in claimed] == [(JOB_DIGEST_ENTRY, 'running')]
+
+
+def test_claim_jobs_takes_one_type_in_bulk(db_service):
+    async def scenario():
+        for _ in range(5):
+            await save(db_service, make_registration(), [JOB_SHEETS, JOB_DRIVE])
+        first = await db_service.claim_jobs(JOB_SHEETS, limit=3, lease_seconds=LEASE_SECONDS)
+        rest = await db_service.claim_jobs(JOB_SHEETS, limit=3, lease_seconds=LEASE_SECONDS)
+        none_left = await db_service.claim_jobs(JOB_SHEETS, limit=3, lease_seconds=LEASE_SECONDS)
+        return first, rest, none_left
+
+    first, rest, none_left = asyncio.run(scenario())
+    assert len(first) == 3 and len(rest) == 2 and none_left == []
+    assert {job['type'] for job in first + rest} == {JOB_SHEETS}
+    assert {job['status'] for job in first + rest} == {'running'}
+    assert len({job['id'] for job in first + rest}) == 5
+
+
+def test_release_blocked_jobs_makes_dependents_runnable(db_service):
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_DRIVE, JOB_GMAIL])
+        released = await db_service.release_blocked_jobs(registration.id, JOB_DRIVE)
+        return released, await jobs_by_type(db_service, registration.id)
+
+    released, jobs = asyncio.run(scenario())
+    assert released == 1
+    assert jobs[JOB_GMAIL]['status'] == 'pending'
+    assert jobs[JOB_DRIVE]['status'] == 'pending'
+
+
+def test_failures_back_off_exponentially_up_to_the_cap(db_service):
+    worker = make_worker(db_service)
+
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_DRIVE])
+        delays = []
+        for attempts in (1, 2):
+            job = await db_service.claim_next_job(LEASE_SECONDS)
+            assert job['attempts'] == attempts
+            before = datetime.utcnow()
+            settled = await worker._record_outcome(job, failed_outcome())
+            stored = (await jobs_by_type(db_service, registration.id))[JOB_DRIVE]
+            assert not settled
+            assert stored['status'] == 'pending'
+            assert stored['last_error'] == 'RuntimeError: boom'
+            delays.append((stored['next_attempt_at'] - before).total_seconds())
+            # Make the retry due now
+            await db_service.db.registration_jobs.update_one(
+                {'id': job['id']}, {'$set': {'next_attempt_at': datetime.utcnow()}}
+            )
+        return delays
+
+    first_delay, second_delay = asyncio.run(scenario())
+    assert first_delay == pytest.approx(10, abs=1)
+    # 20s doubled, capped at max_retry_backoff
+    assert second_delay == pytest.approx(15, abs=1)
+
+
+def test_job_gives_up_after_max_attempts(db_service):
+    worker = make_worker(db_service)
+
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_DRIVE])
+        job = await db_service.claim_next_job(LEASE_SECONDS)
+        job['attempts'] = worker.max_attempts
+        settled = await worker._record_outcome(job, failed_outcome())
+        return settled, (await jobs_by_type(db_service, registration.id))[JOB_DRIVE]
+
+    settled, stored = asyncio.run(scenario())
+    assert settled
+    assert stored['status'] == 'failed'
+
+
+def test_unready_dependency_reblocks_without_counting_the_attempt(db_service):
+    worker = make_worker(db_service)
+
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_DRIVE, JOB_DIGEST_ENTRY])
+        # Claimed alongside its dependency, which then fails and will be retried
+        claimed = await db_service.claim_registration_jobs(registration.id, LEASE_SECONDS, [JOB_DRIVE],
+                                                           exclude_types=[JOB_DRIVE])
+        settled = await worker._record_outcome(claimed[0], failed_outcome(DependencyNotReady))
+        return settled, (await jobs_by_type(db_service, registration.id))[JOB_DIGEST_ENTRY]
+
+    settled, stored = asyncio.run(scenario())
+    assert not settled
+    assert stored['status'] == 'blocked'
+    assert stored['attempts'] == 0
+
+
+def test_fan_out_retries_a_failed_upload_and_keeps_dependents_blocked(db_service, tmp_path):
+    google_service = FakeGoogleService(upload_ok=False)
+    worker = make_worker(db_service, google_service)
+
+    async def scenario():
+        registration = make_registration(tmp_path)
+        await save(db_service, registration, [JOB_DRIVE, JOB_DIGEST_ENTRY, JOB_GMAIL])
+        job = await db_service.claim_next_job(LEASE_SECONDS, exclude_types=list(worker.bulk_handlers))
+        await worker._process(job)
+        return await jobs_by_type(db_service, registration.id)
+
+    jobs = asyncio.run(scenario())
+    assert google_service.uploads == 1
+    assert jobs[JOB_DRIVE]['status'] == 'pending'
+    assert jobs[JOB_DRIVE]['next_attempt_at'] > datetime.utcnow()
+    assert jobs[JOB_DIGEST_ENTRY]['status'] == 'blocked'
+    assert jobs[JOB_DIGEST_ENTRY]['attempts'] == 0
+    assert jobs[JOB_GMAIL]['status'] == 'blocked'
+
+
+def test_fan_out_success_completes_jobs_and_releases_dependents(db_service, tmp_path):
+    google_service = FakeGoogleService()
+    worker = make_worker(db_service, google_service)
+
+    async def scenario():
+        registration = make_registration(tmp_path)
+        await save(db_service, registration, [JOB_DRIVE, JOB_DIGEST_ENTRY, JOB_GMAIL])
+        job = await db_service.claim_next_job(LEASE_SECONDS, exclude_types=list(worker.bulk_handlers))
+        await worker._process(job)
+        saved = await db_service.get_registration(registration.id)
+        return await jobs_by_type(db_service, registration.id), saved
+
+    jobs, saved = asyncio.run(scenario())
+    assert jobs[JOB_DRIVE]['status'] == 'done'
+    assert jobs[JOB_DIGEST_ENTRY]['status'] == 'done'
+    # Gmail is sent by its bulk loop, released once drive settled
+    assert jobs[JOB_GMAIL]['status'] == 'pending'
+    assert saved.cv_drive_id == f'drive-{saved.id}'
+
+
+def test_bulk_loop_settles_sheets_jobs(db_service, monkeypatch):
+    monkeypatch.setenv('SHEETS_APPEND_MAX_DELAY_MS', '10')
+    google_service = FakeGoogleService()
+    worker = make_worker(db_service, google_service)
+    worker.poll_interval = 0.01
+
+    async def scenario():
+        registrations = [make_registration() for _ in range(3)]
+        for registration in registrations:
+            await save(db_service, registration, [JOB_SHEETS])
+        task = asyncio.create_task(worker._run_bulk(JOB_SHEETS))
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            counts = await db_service.db.registration_jobs.count_documents({'status': 'done'})
+            if counts == len(registrations):
+                break
+        worker._stopping = True
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await worker.sheets_appender.close()
+        return await db_service.db.registration_jobs.find().to_list(length=None)
+
+    jobs = asyncio.run(scenario())
+    assert [job['status'] for job in jobs] == ['done'] * 3
+    assert len(google_service.sheet_rows) == 3
+
+
+def test_bulk_job_past_its_deadline_is_withdrawn_and_retried(db_service, monkeypatch):
+    monkeypatch.setenv('SHEETS_DEADLINE_SECONDS', '0.05')
+    monkeypatch.setenv('SHEETS_APPEND_MAX_DELAY_MS', '60000')
+    google_service = FakeGoogleService()
+    worker = make_worker(db_service, google_service)
+
+    async def scenario():
+        registration = make_registration()
+        await save(db_service, registration, [JOB_SHEETS])
+        job, = await db_service.claim_jobs(JOB_SHEETS, limit=1, lease_seconds=LEASE_SECONDS)
+        handler, _ = worker.bulk_handlers[JOB_SHEETS]
+        await worker._settle_bulk(job, registration, handler)
+        await worker.sheets_appender.close()
+        return (await jobs_by_type(db_service, registration.id))[JOB_SHEETS]
+
+    stored = asyncio.run(scenario())
+    assert stored['status'] == 'pending'
+    assert stored['last_error'] == 'Deadline of 0.05s exceeded'
+    # The row never left the batch, so the retry will not append it twice
+    assert google_service.sheet_rows == []
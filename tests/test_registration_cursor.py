@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import AgentRegistration
+from services.database_service import decode_registration_cursor, encode_registration_cursor
+
+
+def make_registration(number: int, timestamp: datetime) -> AgentRegistration:
+    return AgentRegistration(
+        full_name=f"Agente {number}",
+        email=f"agente{number}@example.com",
+        geographic_area="Madrid",
+        main_sector="Tecnología",
+        timestamp=timestamp
+    )
+
+
+def test_cursor_round_trip():
+    registration = make_registration(1, datetime(2024, 5, 17, 9, 30, 15, 123000))
+    cursor = encode_registration_cursor(registration)
+
+    assert '=' not in cursor
+    assert decode_registration_cursor(cursor) == (registration.timestamp, registration.id)
+
+
+@pytest.mark.parametrize('cursor', ['', 'no es base64!', 'e30', 'bnVsbA', 'eyJ0IjogIm1hbCIsICJpIjogIngifQ'])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_registration_cursor(cursor)
+
+
+def test_pages_cover_every_registration_once(db_service):
+    # Several registrations share a timestamp, so the id has to break the tie
+    start = datetime(2024, 1, 1)
+    registrations = [make_registration(number, start + timedelta(minutes=number // 3)) for number in range(10)]
+
+    async def scenario():
+        for registration in registrations:
+            await db_service.save_registration(registration)
+
+        seen = []
+        cursor = None
+        while True:
+            page, cursor = await db_service.get_registrations_page(limit=4, cursor=cursor)
+            seen += [registration.id for registration in page]
+            if not cursor:
+                return seen
+
+    seen = asyncio.run(scenario())
+    expected = sorted(registrations, key=lambda registration: (registration.timestamp, registration.id), reverse=True)
+    assert seen == [registration.id for registration in expected]
@@ -0,0 +1,82 @@
+import io
+import smtplib
+
+import pytest
+
+import services.smtp_pool as smtp_pool
+from services.smtp_pool import _send_stream
+
+
+class FakeSMTP:
+    """Records what _send_stream puts on the wire; replies are configurable per command"""
+
+    def __init__(self, mail=250, rcpt=250, data=354, reply=250):
+        self.codes = {'mail': mail, 'rcpt': rcpt, 'data': data, 'reply': reply}
+        self.sent = []
+        self.reset = False
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def mail(self, from_addr):
+        return self.codes['mail'], b'mail'
+
+    def rcpt(self, to_addr):
+        return self.codes['rcpt'], b'rcpt'
+
+    def docmd(self, command):
+        assert command == 'data'
+        return self.codes['data'], b'data'
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def getreply(self):
+        return self.codes['reply'], b'queued'
+
+    def rset(self):
+        self.reset = True
+
+
+def test_lines_starting_with_a_dot_are_stuffed():
+    server = FakeSMTP()
+    message = b'Subject: hola\r\n\r\n.\r\n..dos\r\nuno.\r\n.tres\r\n'
+
+    _send_stream(server, 'from@example.com', ['to@example.com'], io.BytesIO(message))
+
+    assert b''.join(server.sent) == b'Subject: hola\r\n\r\n..\r\n...dos\r\nuno.\r\n..tres\r\n.\r\n'
+
+
+def test_stream_is_read_from_the_start():
+    server = FakeSMTP()
+    stream = io.BytesIO(b'.linea\r\n')
+    stream.read()
+
+    _send_stream(server, 'from@example.com', ['to@example.com'], stream)
+
+    assert b''.join(server.sent) == b'..linea\r\n.\r\n'
+
+
+def test_body_is_sent_in_chunks(monkeypatch):
+    monkeypatch.setattr(smtp_pool, 'STREAM_SEND_SIZE', 16)
+    server = FakeSMTP()
+    message = b''.join(b'linea %02d\r\n' % n for n in range(10))
+
+    _send_stream(server, 'from@example.com', ['to@example.com'], io.BytesIO(message))
+
+    assert len(server.sent) > 1
+    assert b''.join(server.sent) == message + b'.\r\n'
+
+
+@pytest.mark.parametrize('codes, error', [
+    ({'mail': 550}, smtplib.SMTPSenderRefused),
+    ({'rcpt': 550}, smtplib.SMTPRecipientsRefused),
+    ({'data': 451}, smtplib.SMTPDataError),
+    ({'reply': 554}, smtplib.SMTPDataError),
+])
+def test_refusals_raise_and_reset_the_session(codes, error):
+    server = FakeSMTP(**codes)
+
+    with pytest.raises(error):
+        _send_stream(server, 'from@example.com', ['to@example.com'], io.BytesIO(b'hola\r\n'))
+    assert server.reset